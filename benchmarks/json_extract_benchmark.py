@@ -0,0 +1,88 @@
+"""
+Micro-benchmark for core.utils.json_extract over recorded model outputs.
+
+Compares extract_json against the first-brace/last-brace slicing the routers
+used before, reporting correctness and time per call for each recorded output.
+
+Usage: python benchmarks/json_extract_benchmark.py [--number 2000]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import agent_prompt  # noqa: E402
+from core.utils.json_extract import extract_json  # noqa: E402
+
+RECORDED_OUTPUTS = os.path.join(os.path.dirname(__file__), "data", "recorded_outputs.jsonl")
+
+AGENT_SCHEMAS = {
+    "template_selector": agent_prompt.template_selector_schema,
+    "requirements_checklist": agent_prompt.requirements_checklist_schema,
+    "section_patch": agent_prompt.section_patch_schema,
+    "validation_prompt_suggestions": agent_prompt.validation_prompt_suggestions_schema,
+    "test_case_generator": agent_prompt.test_cases_schema,
+}
+
+
+def slice_and_parse(text: str):
+    """The previous extractor: whole text, then first '{' to last '}'."""
+    try:
+        return json.loads(text)
+    except Exception:
+        pass
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        try:
+            return json.loads(text[start : end + 1])
+        except Exception:
+            return None
+    return None
+
+
+def load_cases(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000, help="calls per case")
+    parser.add_argument("--data", default=RECORDED_OUTPUTS)
+    args = parser.parse_args()
+
+    cases = load_cases(args.data)
+    print(f"{'case':<40}{'chars':>8}{'slice us':>11}{'ok':>4}{'extract us':>12}{'ok':>4}")
+    totals = {"slice": 0.0, "extract": 0.0}
+    correct = {"slice": 0, "extract": 0}
+    for case in cases:
+        text, expected = case["output"], case["expected"]
+        schema = AGENT_SCHEMAS.get(case["agent"])
+
+        runs = {
+            "slice": lambda: slice_and_parse(text),
+            "extract": lambda: extract_json(text, schema=schema),
+        }
+        row = []
+        for name, fn in runs.items():
+            seconds = timeit.timeit(fn, number=args.number) / args.number
+            ok = fn() == expected
+            totals[name] += seconds
+            correct[name] += ok
+            row.append(f"{seconds * 1e6:>11.1f}{'y' if ok else 'n':>4}")
+        print(f"{case['name']:<40}{len(text):>8}" + "".join(row))
+
+    print()
+    for name in totals:
+        print(
+            f"{name:<8} correct {correct[name]}/{len(cases)}, "
+            f"total {totals[name] * 1e6:.1f} us per pass"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -27,7 +27,8 @@ import {
 import ReactMarkdown from "react-markdown";
 import ThinkingProcess from "./ThinkingProcess";
 import AnalysisDisplay from "./AnalysisDisplay";
-import ChatTestWindow from "./ChatTestWindow";
+import ChatTestWindow, { BroadcastTurn } from "./ChatTestWindow";
+import apiService from "../services/api";
 import databaseService, { PromptTemplate } from "../services/databaseService";
 import {
   getFunctionalStepName,
@@ -163,6 +164,9 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({
   const [rightSelectedMessageIds, setRightSelectedMessageIds] = useState<
     number[]
   >([]);
+  const [broadcastTurn, setBroadcastTurn] = useState<BroadcastTurn | null>(
+    null,
+  );
 
   const getAdaptiveHeight = (panelKey: string, siblingKey: string) => {
     const isCollapsed = collapsedPanels[panelKey];
@@ -357,6 +361,40 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({
     }
   };
 
+  // Both comparison windows share one request so the versions answer the same turn
+  const sendComparisonTest = async (content: string) => {
+    if (!comparisonData || broadcastTurn?.status === "pending") return;
+
+    const leftId = comparisonData.versions[comparisonData.currentLeftIndex]?.id;
+    const rightId =
+      comparisonData.versions[comparisonData.currentRightIndex]?.id;
+    if (!leftId || !rightId) return;
+
+    const turn: BroadcastTurn = {
+      id: Date.now().toString(),
+      userMessage: content,
+      status: "pending",
+      results: {},
+    };
+    setBroadcastTurn(turn);
+
+    try {
+      const response = await apiService.chatTestBroadcast(
+        sessionId,
+        [leftId, rightId],
+        content,
+      );
+      const results: BroadcastTurn["results"] = {};
+      (response?.result?.results || []).forEach((r: any) => {
+        results[r.version_id] = r;
+      });
+      setBroadcastTurn({ ...turn, status: "done", results });
+    } catch (e) {
+      setBroadcastTurn({ ...turn, status: "error" });
+      message.error("Network error, please try again");
+    }
+  };
+
   const runDiffExplain = async () => {
     if (!comparisonData) return;
 
@@ -2191,6 +2229,8 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({
                                     comparisonData.currentLeftIndex
                                   ]?.id || 1
                                 }
+                                broadcastTurn={broadcastTurn}
+                                onBroadcastSend={sendComparisonTest}
                                 height={getAdaptiveHeight("2", "1")}
                                 className="shadow-inner"
                               />
@@ -2496,6 +2536,8 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({
                                     comparisonData.currentRightIndex
                                   ]?.id || 1
                                 }
+                                broadcastTurn={broadcastTurn}
+                                onBroadcastSend={sendComparisonTest}
                                 height={getAdaptiveHeight("4", "3")}
                                 className="shadow-inner"
                               />
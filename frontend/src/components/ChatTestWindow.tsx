@@ -21,24 +21,40 @@ interface ChatMessage {
   }>;
 }
 
+// One message sent to several versions at once through /chat-test-broadcast
+export interface BroadcastTurn {
+  id: string;
+  userMessage: string;
+  status: 'pending' | 'done' | 'error';
+  results: { [versionId: number]: any };
+}
+
 interface ChatTestWindowProps {
   sessionId: string;
   versionNumber: number;
   height?: string;
   className?: string;
+  broadcastTurn?: BroadcastTurn | null;
+  onBroadcastSend?: (content: string) => void;
 }
 
 const ChatTestWindow: React.FC<ChatTestWindowProps> = ({
   sessionId,
   versionNumber,
   height = '300px',
-  className = ''
+  className = '',
+  broadcastTurn = null,
+  onBroadcastSend
 }) => {
   const [messages, setMessages] = useState<ChatMessage[]>([]);
   const [inputValue, setInputValue] = useState('');
   const [loading, setLoading] = useState(false);
   const [loadingHistory, setLoadingHistory] = useState(true);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  // A turn already in the history when this window mounts is not replayed
+  const shownBroadcastRef = useRef<{ id: string; status: string } | null>(
+    broadcastTurn ? { id: broadcastTurn.id, status: broadcastTurn.status } : null
+  );
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -157,9 +173,99 @@ const ChatTestWindow: React.FC<ChatTestWindowProps> = ({
     }
   };
 
+  // Suggestions are computed after the answer is returned; fetch them once ready
+  const pollSuggestions = async (
+    jobId: string,
+    messageId: string,
+    headers: { [key: string]: string },
+    attempt: number = 0,
+  ): Promise<void> => {
+    if (attempt >= 20) return;
+    try {
+      const res = await fetch(`http://localhost:8000/chat-test-suggestions/${jobId}`, { headers });
+      if (!res.ok) return;
+      const data = await res.json();
+      const job = data?.result;
+      if (job?.status === 'pending') {
+        setTimeout(() => pollSuggestions(jobId, messageId, headers, attempt + 1), 1500);
+        return;
+      }
+      const suggestions = Array.isArray(job?.suggestions) ? job.suggestions : [];
+      setMessages(prev => prev.map(m => (m.id === messageId ? { ...m, suggestions } : m)));
+    } catch (error) {
+      console.error('Failed to load suggestions:', error);
+    }
+  };
+
+  // Replay a broadcast turn into this window; the backend has already saved it
+  useEffect(() => {
+    if (!broadcastTurn) return;
+    const shown = shownBroadcastRef.current;
+    if (shown && shown.id === broadcastTurn.id && shown.status === broadcastTurn.status) return;
+
+    if (!shown || shown.id !== broadcastTurn.id) {
+      setMessages(prev => [...prev, {
+        id: `${broadcastTurn.id}-user`,
+        type: 'user',
+        content: broadcastTurn.userMessage,
+        timestamp: new Date().toISOString()
+      }]);
+    }
+    shownBroadcastRef.current = { id: broadcastTurn.id, status: broadcastTurn.status };
+
+    if (broadcastTurn.status === 'pending') {
+      setLoading(true);
+      return;
+    }
+    setLoading(false);
+
+    // A failed request is reported once by the sender, not by every window
+    if (broadcastTurn.status === 'error') return;
+    const result = broadcastTurn.results[versionNumber];
+    if (!result?.success) {
+      message.error('Test failed, please try again');
+      return;
+    }
+
+    const assistantId = result.assistant_message_id != null
+      ? result.assistant_message_id.toString()
+      : `${broadcastTurn.id}-assistant`;
+    setMessages(prev => [
+      ...prev.map(m => (
+        m.id === `${broadcastTurn.id}-user` && result.user_message_id != null
+          ? { ...m, id: result.user_message_id.toString() }
+          : m
+      )),
+      {
+        id: assistantId,
+        type: 'assistant',
+        content: result.response,
+        timestamp: new Date().toISOString(),
+        response_time_ms: result.response_time_ms,
+        suggestions: Array.isArray(result.suggestions) ? result.suggestions : []
+      }
+    ]);
+
+    if (result.suggestion_job_id) {
+      const authHeaders: { [key: string]: string } = {};
+      const userData = localStorage.getItem('user');
+      if (userData) {
+        const user = JSON.parse(userData);
+        authHeaders['Authorization'] = `Bearer ${user.id}`;
+      }
+      pollSuggestions(result.suggestion_job_id, assistantId, authHeaders);
+    }
+  }, [broadcastTurn, versionNumber]);
+
   const handleSendMessage = async () => {
     if (!inputValue.trim() || loading) return;
 
+    if (onBroadcastSend) {
+      onBroadcastSend(inputValue.trim());
+      setInputValue('');
+      return;
+    }
+
     const tempUserId = Date.now().toString();
     const userMessage: ChatMessage = {
       id: tempUserId,
@@ -214,14 +320,21 @@ const ChatTestWindow: React.FC<ChatTestWindowProps> = ({
         };
         setMessages(prev => [...prev, assistantMessage]);
 
+        const suggestionJobId: string | undefined = result.result.suggestion_job_id;
         const savedAssistantId = await saveMessageToDatabase(
           'assistant',
           assistantMessage.content,
           responseTime,
-          { suggestions: assistantMessage.suggestions }
+          suggestionJobId
+            ? { suggestion_job_id: suggestionJobId }
+            : { suggestions: assistantMessage.suggestions }
         );
+        const assistantId = savedAssistantId != null ? savedAssistantId.toString() : tempAssistantId;
         if (savedAssistantId != null) {
-          setMessages(prev => prev.map(m => (m.id === tempAssistantId ? { ...m, id: savedAssistantId.toString() } : m)));
+          setMessages(prev => prev.map(m => (m.id === tempAssistantId ? { ...m, id: assistantId } : m)));
+        }
+        if (suggestionJobId) {
+          pollSuggestions(suggestionJobId, assistantId, authHeaders);
         }
       } else {
         message.error('Test failed, please try again');
@@ -102,6 +102,19 @@ const apiService = {
     return api.post("/generate-prompt", { session_id: sessionId, content });
   },
 
+  generatePromptCandidates: (
+    sessionId: string,
+    templateKeys: string[] | null = null,
+    candidateCount: number | null = null,
+  ): Promise<ApiResponse> => {
+    return api.post("/generate-prompt-candidates", {
+      session_id: sessionId,
+      content: "",
+      template_keys: templateKeys,
+      candidate_count: candidateCount,
+    });
+  },
+
 
   sendGenerationFeedback: (
     sessionId: string,
@@ -119,8 +132,13 @@ const apiService = {
   optimizePrompt: (
     sessionId: string,
     content: string,
+    candidateCount: number | null = null,
   ): Promise<ApiResponse> => {
-    return api.post("/optimize-prompt", { session_id: sessionId, content });
+    return api.post("/optimize-prompt", {
+      session_id: sessionId,
+      content,
+      candidate_count: candidateCount,
+    });
   },
 
   sendOptimizationFeedback: (
@@ -135,6 +153,20 @@ const apiService = {
     });
   },
 
+  chatTestBroadcast: (
+    sessionId: string,
+    versionIds: number[],
+    userMessage: string,
+    multiTurn: boolean = false,
+  ): Promise<ApiResponse> => {
+    return api.post("/chat-test-broadcast", {
+      session_id: sessionId,
+      version_ids: versionIds,
+      user_message: userMessage,
+      multi_turn: multiTurn,
+    });
+  },
+
   getAgentMapping: (): Promise<ApiResponse> => {
     return api.get("/agent-mapping");
   },
@@ -590,4 +590,109 @@ DELIMITER ;
 /*!50003 SET sql_mode              = @saved_sql_mode */ ;
 /*!50003 SET character_set_client  = @saved_cs_client */ ;
 /*!50003 SET character_set_results = @saved_cs_results */ ;
-/*!50003 SET collation_connection  = @saved_col_connection */ ;
\ No newline at end of file
+/*!50003 SET collation_connection  = @saved_col_connection */ ;
+
+-- ========================================
+-- Testing and reuse tables
+-- ========================================
+-- Function: Tables of the testing, replay and result reuse features
+-- Description: Created with IF NOT EXISTS, so this section can be run on its own to upgrade an existing database
+-- ========================================
+
+--
+-- Table structure: test_case_library
+-- Function: Persisted test cases per session and prompt lineage
+-- Description: Keyed by the hash of the lineage's original prompt, so every version of a lineage is tested on the same inputs
+--
+CREATE TABLE IF NOT EXISTS `test_case_library` (
+  `id` int NOT NULL AUTO_INCREMENT,
+  `session_id` varchar(36) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `prompt_hash` char(64) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `position` int NOT NULL,
+  `content` text COLLATE utf8mb4_unicode_ci NOT NULL,
+  `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uniq_library_case` (`session_id`, `prompt_hash`, `position`),
+  CONSTRAINT `test_case_library_ibfk_1` FOREIGN KEY (`session_id`) REFERENCES `sessions` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+--
+-- Table structure: regression_replay_runs
+-- Function: Offline replays of saved chat tests against a target model and prompt version
+--
+CREATE TABLE IF NOT EXISTS `regression_replay_runs` (
+  `id` varchar(36) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `user_id` int NOT NULL,
+  `config` json DEFAULT NULL,
+  `status` varchar(20) COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT 'pending',
+  `total` int NOT NULL DEFAULT '0',
+  `completed` int NOT NULL DEFAULT '0',
+  `error` text COLLATE utf8mb4_unicode_ci,
+  `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+  `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  KEY `idx_replay_runs_user` (`user_id`, `created_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+--
+-- Table structure: regression_replay_results
+-- Function: Per-message checkpoints of a replay run
+-- Description: One row per replayed message, so an interrupted run resumes where it stopped
+--
+CREATE TABLE IF NOT EXISTS `regression_replay_results` (
+  `id` int NOT NULL AUTO_INCREMENT,
+  `run_id` varchar(36) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `session_id` varchar(36) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `source_message_id` int NOT NULL,
+  `target_version_id` int DEFAULT NULL,
+  `user_message` text COLLATE utf8mb4_unicode_ci NOT NULL,
+  `old_response` text COLLATE utf8mb4_unicode_ci,
+  `new_response` text COLLATE utf8mb4_unicode_ci,
+  `similarity` decimal(5,4) DEFAULT NULL,
+  `response_time_ms` int DEFAULT NULL,
+  `error` text COLLATE utf8mb4_unicode_ci,
+  `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uniq_replay_message` (`run_id`, `source_message_id`),
+  KEY `idx_replay_results_session` (`run_id`, `session_id`),
+  CONSTRAINT `regression_replay_results_ibfk_1` FOREIGN KEY (`run_id`) REFERENCES `regression_replay_runs` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+--
+-- Table structure: semantic_cache_entries
+-- Function: Analysis and generation results reusable for near-identical prompts
+-- Description: The MinHash signature of the normalized prompt is stored for the in-memory LSH index
+--
+CREATE TABLE IF NOT EXISTS `semantic_cache_entries` (
+  `id` int NOT NULL AUTO_INCREMENT,
+  `stage` varchar(32) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `context_key` char(64) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `text_hash` char(64) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `normalized_text` mediumtext COLLATE utf8mb4_unicode_ci NOT NULL,
+  `signature` json NOT NULL,
+  `result` json NOT NULL,
+  `user_id` int DEFAULT NULL,
+  `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uniq_semantic_entry` (`stage`, `context_key`, `text_hash`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+--
+-- Table structure: semantic_cache_hits
+-- Function: Audit log of semantic cache reuses
+--
+CREATE TABLE IF NOT EXISTS `semantic_cache_hits` (
+  `id` int NOT NULL AUTO_INCREMENT,
+  `entry_id` int NOT NULL,
+  `stage` varchar(32) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `user_id` int NOT NULL,
+  `session_id` varchar(36) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
+  `similarity` float NOT NULL,
+  `threshold` float NOT NULL,
+  `prompt` mediumtext COLLATE utf8mb4_unicode_ci NOT NULL,
+  `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  KEY `idx_semantic_hits_user` (`user_id`, `created_at`),
+  KEY `idx_semantic_hits_entry` (`entry_id`),
+  CONSTRAINT `semantic_cache_hits_ibfk_1` FOREIGN KEY (`entry_id`) REFERENCES `semantic_cache_entries` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
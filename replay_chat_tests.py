@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Replay saved chat test messages against a target model / prompt version
+and print a per-session diff report.
+
+Usage:
+    python replay_chat_tests.py --user-id 1 --session <id> [--session <id> ...]
+        [--version-number N] [--target-model NAME] [--concurrency 16]
+        [--report report.json]
+    python replay_chat_tests.py --user-id 1 --resume <run_id>
+"""
+import argparse
+import json
+import os
+import sys
+
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+from api import regression_replay  # noqa: E402
+from services.ai_services import AIServices  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--session", dest="sessions", action="append", default=[])
+    parser.add_argument("--version-number", type=int, default=None)
+    parser.add_argument("--source-version-id", type=int, default=None)
+    parser.add_argument("--target-model", default=None)
+    parser.add_argument("--resume", metavar="RUN_ID", default=None)
+    parser.add_argument(
+        "--concurrency", type=int, default=regression_replay.REPLAY_MAX_CONCURRENCY
+    )
+    parser.add_argument("--report", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    if args.resume:
+        run = regression_replay.get_run(args.resume)
+        if not run or run["user_id"] != args.user_id:
+            sys.exit(f"Replay run {args.resume} not found")
+        run_id, config = args.resume, run["config"] or {}
+    else:
+        if not args.sessions:
+            parser.error("--session is required unless --resume is given")
+        config = {
+            "session_ids": args.sessions,
+            "version_number": args.version_number,
+            "source_version_id": args.source_version_id,
+            "model_name": args.target_model,
+        }
+        run_id = regression_replay.create_run(args.user_id, config)
+    print(f"Replay run: {run_id}")
+
+    report = regression_replay.replay(
+        AIServices(user_id=args.user_id),
+        run_id,
+        session_ids=config.get("session_ids") or [],
+        version_number=config.get("version_number"),
+        source_version_id=config.get("source_version_id"),
+        model_name=config.get("model_name"),
+        max_workers=args.concurrency,
+        on_progress=lambda done, total: print(f"  {done}/{total} replayed"),
+    )
+
+    for session in report["sessions"]:
+        print(
+            f"{session['session_id']}: {session['replayed']}/{session['messages']} "
+            f"replayed, {session['changed']} changed, "
+            f"{session['errors']} errors, mean similarity {session['mean_similarity']}"
+        )
+    totals = report["totals"]
+    print(
+        f"Total: {totals['replayed']}/{totals['messages']} replayed, "
+        f"{totals['changed']} changed, {totals['errors']} errors"
+    )
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from .structure_checker_agent import check_structure, thinking_structure
-from .requirements_checklist_agent import requirements_checklist
+from .requirements_checklist_agent import requirements_checklist, requirements_checklist_schema
 from .elements_analyzer import (
     anchoring_target,
     activate_role,
@@ -8,11 +8,23 @@ from .elements_analyzer import (
     focus_subject,
     input_extract,
     examples_extract,
+    analysis_merge_prompt,
+    consolidated_analysis_prompt,
 )
 from .prompts_generator_agent import structuring_prompt
 from .prompts_generator_agent import template_selector_system_prompt
+from .prompts_generator_agent import section_patch_prompt
+from .prompts_generator_agent import template_selector_schema, section_patch_schema
 from .optimization_thinking_agent import optimization_thinking
+from .output_repair_agent import json_repair_prompt, task_objective_repair_prompt
 from .validation_chamber_agent import (
     validation_diff_explainer_system_prompt,
     validation_prompt_suggestions_system_prompt,
+    validation_prompt_suggestions_schema,
+    validation_prompt_suggestions_batch_system_prompt,
+    validation_prompt_suggestions_batch_schema,
+    chat_history_summary_system_prompt,
+    pairwise_judge_system_prompt,
+    pairwise_judge_schema,
 )
+from .test_case_generator_agent import test_cases_schema
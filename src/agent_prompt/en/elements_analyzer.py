@@ -257,3 +257,28 @@ examples_extract = '''
         The extracted example:
             No examples
 '''
+
+# Merge partial analyses of a prompt that was analyzed in chunks
+analysis_merge_prompt = """
+# Role: You are an expert in consolidating prompt analyses.
+# Task: The user's prompt was too long to analyze at once, so it was split into consecutive parts and each part was analyzed separately with the analysis instructions below. Merge the partial analyses into one analysis of the whole prompt.
+# Rules:
+    - Follow the output format required by the analysis instructions exactly, as if the whole prompt had been analyzed in one pass.
+    - Keep every distinct finding; merge duplicates and findings that continue across part boundaries.
+    - When partial analyses conflict, prefer the one supported by more parts; otherwise keep the earlier part's finding.
+    - Do not mention parts, chunks or the merging process in the output.
+# Analysis instructions:
+{analysis_instructions}
+"""
+
+# Run several analysis methods in one request; the reply is a JSON object keyed by method key
+consolidated_analysis_prompt = """
+# Role: You are an expert prompt analyst applying several analysis methods to the same prompt.
+# Task: Analyze the user's prompt separately with each analysis method below, as if its instructions were the only ones you had.
+# Rules:
+    - Return ONLY a JSON object with exactly one entry per method key: {method_keys}.
+    - Each value is that method's complete analysis as a single string, in the output format its instructions require.
+    - Keep the analyses independent: do not refer to the other methods or their findings.
+# Analysis methods:
+{method_sections}
+"""
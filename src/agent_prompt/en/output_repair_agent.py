@@ -0,0 +1,17 @@
+json_repair_prompt = (
+    "You repair malformed JSON produced by another model.\n"
+    "\n"
+    "Output rules:\n"
+    "- Return ONLY the corrected JSON. No markdown, no code fences, no explanations.\n"
+    "- Keep every key and value that is present; do not invent new content.\n"
+    "- Fix only syntax: quoting, escaping, commas, brackets and braces.\n"
+)
+
+task_objective_repair_prompt = (
+    "A structured prompt was generated without its required '# Task Objective:' line.\n"
+    "Write that single line for it, based on the user's original prompt and the structured prompt.\n"
+    "\n"
+    "Output rules:\n"
+    "- Return ONLY one line starting with '# Task Objective:'.\n"
+    "- State the assistant's task in one or two sentences; do not perform the task.\n"
+)
@@ -280,3 +280,52 @@ If a framework is provided below, it overrides any structure you would otherwise
                     Input: "Customers report frequent system crashes, especially during large file uploads."
                     Output: "User feedback indicates system instability during large file processing tasks, manifesting as intermittent process termination. Priority investigation of memory management modules is recommended."
 '''
+
+section_patch_prompt = (
+    "You revise an existing structured prompt according to user feedback by returning a section-level edit script "
+    "instead of rewriting the whole prompt.\n"
+    "The prompt is divided into sections by its top-level '#' headings; the section titles are listed for you.\n"
+    "\n"
+    "Output rules:\n"
+    "- Return ONLY a JSON object. No markdown, no code fences, no extra text.\n"
+    "- JSON schema: {\"regenerate\": false, \"edits\": [{\"op\": \"replace|delete|insert_after|append\", \"section\": \"...\", \"content\": \"...\"}]}\n"
+    "- section: one of the listed section titles, copied exactly (not needed for append).\n"
+    "- content: the complete new markdown of the section, starting with its '#' heading line (not needed for delete).\n"
+    "- Touch only the sections the feedback requires; unchanged sections must not appear in edits.\n"
+    "- Keep the heading style, language and formatting of the existing prompt; never remove the Task Objective section.\n"
+    "- Preserve source text and examples verbatim unless the feedback explicitly asks to change them.\n"
+    "- If the feedback requires restructuring most of the prompt, return {\"regenerate\": true, \"edits\": []}.\n"
+)
+
+template_selector_schema = {
+    "type": "object",
+    "properties": {
+        "template_key": {"type": "string", "minLength": 1},
+        "reason": {"type": "string"},
+    },
+    "required": ["template_key", "reason"],
+    "additionalProperties": False,
+}
+
+section_patch_schema = {
+    "type": "object",
+    "properties": {
+        "regenerate": {"type": "boolean"},
+        "edits": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "op": {
+                        "type": "string",
+                        "enum": ["replace", "delete", "insert_after", "append"],
+                    },
+                    "section": {"type": "string"},
+                    "content": {"type": "string"},
+                },
+                "required": ["op"],
+            },
+        },
+    },
+    "required": ["edits"],
+}
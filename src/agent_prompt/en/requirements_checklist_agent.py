@@ -62,3 +62,58 @@ requirements_checklist = """
 ## Required Output
 - Return ONLY the updated checklist JSON.
 """
+
+_checklist_field_schema = {
+    "type": "object",
+    "properties": {
+        "status": {"type": "string", "enum": ["missing", "partial", "filled"]},
+        "value": {"type": "string"},
+    },
+    "required": ["status", "value"],
+}
+
+requirements_checklist_schema = {
+    "type": "object",
+    "properties": {
+        "schema_version": {"type": "integer"},
+        "user_refuses_details": {"type": "boolean"},
+        "deliverable": {
+            "type": "object",
+            "properties": {
+                "prompt_type": {
+                    "type": "string",
+                    "enum": ["system_prompt", "user_prompt", "unknown"],
+                },
+                "target_assistant_name_or_role": {"type": "string"},
+            },
+        },
+        "fields": {
+            "type": "object",
+            "properties": {
+                name: _checklist_field_schema
+                for name in (
+                    "task_objective",
+                    "target_end_user",
+                    "target_assistant_role",
+                    "context",
+                    "input_data",
+                    "output_format",
+                    "constraints",
+                    "quality_criteria",
+                    "tone_style",
+                    "language",
+                )
+            },
+        },
+        "asked": {
+            "type": "object",
+            "properties": {
+                "fields": {"type": "array", "items": {"type": "string"}},
+                "questions": {"type": "array", "items": {"type": "string"}},
+            },
+        },
+        "missing_fields_ordered": {"type": "array", "items": {"type": "string"}},
+        "is_complete": {"type": "boolean"},
+    },
+    "required": ["fields", "missing_fields_ordered", "is_complete"],
+}
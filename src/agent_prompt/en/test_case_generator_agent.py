@@ -0,0 +1,17 @@
+test_cases_schema = {
+    "type": "object",
+    "properties": {
+        "test_cases": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "message": {"type": "string", "minLength": 1},
+                    "aspect": {"type": "string"},
+                },
+                "required": ["message"],
+            },
+        }
+    },
+    "required": ["test_cases"],
+}
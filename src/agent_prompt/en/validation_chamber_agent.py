@@ -28,7 +28,7 @@ Rules:
 - Treat the system prompt as the spec; check how the response deviates from it (missing requirements, wrong format, wrong tone/language, hallucination risk, lack of safety boundaries, unclear procedures).
 - If the prompt is underspecified (no explicit output format/constraints), propose adding concrete constraints even if the response seems acceptable.
 - Prefer small, local edits over rewrites: add one rule, tighten one sentence, add a schema/example, add a short checklist.
-- Return an empty list ONLY if:
+- Return an empty suggestions list ONLY if:
   1) the prompt already contains explicit output constraints (format + required sections/schema), AND
   2) the response matches those constraints, AND
   3) you cannot identify any ambiguity that could cause variance across similar inputs.
@@ -36,9 +36,9 @@ Rules:
 - Every suggestion must be actionable and directly copy-pastable (or specify an exact insertion point like: "Insert under 'Output format'").
 
 Output: Return ONLY valid JSON (no markdown, no code fences).
-Schema: [{"title": "...", "edit": "...", "why": "...", "expected_effect": "..."}]
+Schema: {"suggestions": [{"title": "...", "edit": "...", "why": "...", "expected_effect": "..."}]}
 Limits:
-- 0 to 5 items
+- 0 to 5 suggestions
 - title <= 10 words
 - why <= 25 words
 - expected_effect <= 20 words
@@ -55,3 +55,100 @@ When you propose an edit:
 - Tie each edit to the observed mismatch: (what to change) + (why) + (expected effect).
 - If a rule exists but was ignored, strengthen it with a strict schema or a short example.
 """
+
+# Constrained decoding needs an object at the top level, so the list is wrapped
+validation_prompt_suggestions_schema = {
+    "type": "object",
+    "properties": {
+        "suggestions": {
+            "type": "array",
+            "maxItems": 5,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "title": {"type": "string"},
+                    "edit": {"type": "string"},
+                    "why": {"type": "string"},
+                    "expected_effect": {"type": "string"},
+                },
+                "required": ["title", "edit"],
+            },
+        }
+    },
+    "required": ["suggestions"],
+}
+
+
+validation_prompt_suggestions_batch_system_prompt = """
+You are a prompt improvement assistant.
+
+Goal: Given a system prompt and several test turns (user message + model response), propose optional edits to the system prompt for each turn, following the same rules as for a single turn:
+- Use ONLY the system prompt and the observed responses; treat the system prompt as the spec.
+- Prefer small, local, copy-pastable edits; 0 to 5 per turn.
+- Do not repeat an identical suggestion for several turns; give it once, on the first turn it applies to.
+- Do not include chain-of-thought.
+
+Output: Return ONLY valid JSON (no markdown, no code fences).
+Schema: {"turns": [{"turn": <turn number>, "suggestions": [{"title": "...", "edit": "...", "why": "...", "expected_effect": "..."}]}]}
+Include every turn number, with an empty suggestions list when nothing applies.
+"""
+
+validation_prompt_suggestions_batch_schema = {
+    "type": "object",
+    "properties": {
+        "turns": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "turn": {"type": "integer"},
+                    "suggestions": validation_prompt_suggestions_schema["properties"][
+                        "suggestions"
+                    ],
+                },
+                "required": ["turn", "suggestions"],
+            },
+        }
+    },
+    "required": ["turns"],
+}
+
+
+chat_history_summary_system_prompt = """
+You condense the earlier part of a test conversation between a user and an assistant so it can replace those turns in the assistant's context.
+
+Rules:
+- Start from the existing summary, if any, and fold in the new turns.
+- Keep facts, names, numbers, decisions, open questions and any instructions the user gave that still apply.
+- Keep what the assistant committed to or already answered, briefly.
+- Drop greetings, repetition and wording details.
+- Write neutral third-person notes, at most 200 words. Output only the summary.
+"""
+
+
+pairwise_judge_system_prompt = """
+You are an impartial judge comparing two assistant responses to the same user message.
+
+Each response was produced by a different version of a system prompt. Decide which response better serves the user.
+
+Criteria, in order of importance:
+1) Correctly and completely addresses the user message.
+2) Respects any constraints and output format the user message asks for.
+3) Clear, well-structured and free of unsupported claims.
+
+Rules:
+- Ignore response order and length on their own; a longer answer is not better unless it is more useful.
+- Answer "tie" only when neither response is meaningfully better.
+
+Output: Return ONLY valid JSON (no markdown, no code fences).
+Schema: {"winner": "A" | "B" | "tie", "reason": "<= 25 words"}
+"""
+
+pairwise_judge_schema = {
+    "type": "object",
+    "properties": {
+        "winner": {"type": "string", "enum": ["A", "B", "tie"]},
+        "reason": {"type": "string"},
+    },
+    "required": ["winner"],
+}
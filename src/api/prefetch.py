@@ -0,0 +1,112 @@
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# user_settings key that opts a user into speculative prefetch
+PREFETCH_SETTING_KEY = "speculativePrefetch"
+PREFETCH_MAX_WORKERS = 4
+# Speculations not claimed within this many seconds are dropped, so sessions
+# abandoned mid-workflow do not keep their results in memory
+PREFETCH_TTL_SECONDS = 600
+
+_executor = ThreadPoolExecutor(
+    max_workers=PREFETCH_MAX_WORKERS, thread_name_prefix="prefetch"
+)
+
+
+def inputs_key(*inputs: Any) -> str:
+    """
+    Digest of the inputs a stage result depends on.
+    """
+    payload = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def prefetch_enabled(user_id: int) -> bool:
+    try:
+        from api.database_api import get_user_settings
+
+        return bool(get_user_settings(user_id).get(PREFETCH_SETTING_KEY))
+    except Exception:
+        return False
+
+
+class SpeculativeCache:
+    """
+    Per-session results of stages started before the user asked for them.
+    Each (session, stage) holds at most one speculation, keyed by its inputs;
+    unclaimed speculations expire after PREFETCH_TTL_SECONDS.
+    """
+
+    def __init__(self, ttl: float = PREFETCH_TTL_SECONDS):
+        self.ttl = ttl
+        # (session, stage) -> (inputs key, future, scheduled at)
+        self._entries: Dict[Tuple[str, str], Tuple[str, Future, float]] = {}
+        self._lock = threading.Lock()
+
+    def _pop_expired(self, now: float) -> List[Future]:
+        """
+        Remove expired speculations; the caller holds the lock.
+        :return: Their futures, to cancel outside the lock.
+        """
+        expired = [k for k, entry in self._entries.items() if now - entry[2] > self.ttl]
+        return [self._entries.pop(k)[1] for k in expired]
+
+    def schedule(
+        self, session_id: str, stage: str, key: str, fn: Callable, *args, **kwargs
+    ) -> None:
+        """
+        Run `fn(*args, **kwargs)` in the background, replacing any earlier
+        speculation for the same stage.
+        """
+        future = _executor.submit(fn, *args, **kwargs)
+        now = time.monotonic()
+        with self._lock:
+            stale = self._pop_expired(now)
+            previous = self._entries.get((session_id, stage))
+            if previous:
+                stale.append(previous[1])
+            self._entries[(session_id, stage)] = (key, future, now)
+        for stale_future in stale:
+            stale_future.cancel()
+
+    def take(self, session_id: str, stage: str, key: str) -> Optional[Any]:
+        """
+        Claim the speculative result for `stage` if it was computed from the
+        same inputs, waiting for it if it is still running. A speculation with
+        other inputs is discarded.
+        :return: The result, or None on a miss or a failed speculation.
+        """
+        with self._lock:
+            stale = self._pop_expired(time.monotonic())
+            entry = self._entries.pop((session_id, stage), None)
+        for stale_future in stale:
+            stale_future.cancel()
+        if entry is None:
+            return None
+        entry_key, future, _ = entry
+        if entry_key != key:
+            future.cancel()
+            return None
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"Warning: Speculative {stage} failed: {e}")
+            return None
+
+    def discard(self, session_id: str, stage: Optional[str] = None) -> None:
+        with self._lock:
+            keys = [
+                k
+                for k in self._entries
+                if k[0] == session_id and (stage is None or k[1] == stage)
+            ]
+            entries = [self._entries.pop(k) for k in keys]
+        for _, future, _ in entries:
+            future.cancel()
+
+
+speculative_cache = SpeculativeCache()
@@ -0,0 +1,190 @@
+"""
+Local similar-prompt retrieval over all prompt versions.
+
+Every row of `prompt_versions` is embedded with the hashed bag-of-words
+vectorizer the method selector uses and appended to a memory-mapped matrix
+(see core.utils.vector_store). New versions are picked up incrementally by a
+background sync keyed on the last indexed version id; queries are a single
+matrix-vector product restricted to the requesting user's rows.
+"""
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from core.processor.method_selector import hashed_bow
+from core.utils.vector_store import MemmapVectorStore
+
+PROMPT_INDEX_DIM = 1024
+PROMPT_INDEX_DIR = os.environ.get(
+    "PROMPT_INDEX_DIR",
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+        "data",
+        "prompt_index",
+    ),
+)
+SYNC_BATCH_SIZE = 500
+# Candidates fetched per requested result, since versions of one session cluster
+CANDIDATE_FACTOR = 4
+MIN_SIMILARITY = 0.2
+
+_store: Optional[MemmapVectorStore] = None
+_store_lock = threading.Lock()
+_sync_lock = threading.Lock()
+_sync_pending = False
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prompt-index")
+
+
+def _db():
+    from api.database_api import db
+
+    return db
+
+
+def _get_store() -> MemmapVectorStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MemmapVectorStore(PROMPT_INDEX_DIR, PROMPT_INDEX_DIM)
+        return _store
+
+
+def embed(texts: List[str]):
+    return hashed_bow(texts, dim=PROMPT_INDEX_DIM)
+
+
+def sync() -> int:
+    """
+    Index versions inserted since the last sync, by any process.
+    :return: Number of versions added.
+    """
+    store = _get_store()
+    added = 0
+    with _sync_lock:
+        while True:
+            store.refresh()
+            rows = _db().execute_query(
+                "SELECT v.id, v.prompt_content, s.user_id "
+                "FROM prompt_versions v JOIN sessions s ON s.id = v.session_id "
+                "WHERE v.id > %s ORDER BY v.id ASC LIMIT %s",
+                (store.cursor, SYNC_BATCH_SIZE),
+            )
+            if not rows:
+                return added
+            added += store.append(
+                [row["id"] for row in rows],
+                [row["user_id"] or 0 for row in rows],
+                embed([row["prompt_content"] or "" for row in rows]),
+                cursor=rows[-1]["id"],
+            )
+            if len(rows) < SYNC_BATCH_SIZE:
+                return added
+
+
+def _run_sync() -> None:
+    global _sync_pending
+    with _store_lock:
+        _sync_pending = False
+    try:
+        sync()
+    except Exception as e:
+        print(f"Warning: Prompt index sync failed: {e}")
+
+
+def schedule_sync() -> None:
+    """
+    Index new versions in the background; calls made while a sync is queued
+    are coalesced into it.
+    """
+    global _sync_pending
+    with _store_lock:
+        if _sync_pending:
+            return
+        _sync_pending = True
+    _executor.submit(_run_sync)
+
+
+def similar_prompts(
+    user_id: int,
+    text: str,
+    *,
+    limit: int = 5,
+    exclude_session_id: Optional[str] = None,
+    min_similarity: float = MIN_SIMILARITY,
+) -> List[Dict[str, Any]]:
+    """
+    The user's past prompt versions most similar to `text`, at most one per
+    session.
+    :param exclude_session_id: Leave out the session being worked on.
+    :return: [{"version_id", "session_id", "session_name", "version_number",
+        "version_type", "similarity", "prompt_content", "metadata", "created_at"}]
+    """
+    if not text or not text.strip():
+        return []
+    store = _get_store()
+    store.refresh()
+    # Keep the index catching up with versions written elsewhere
+    schedule_sync()
+    matches = store.search(embed([text])[0], owner=user_id, k=limit * CANDIDATE_FACTOR)
+    matches = [(key, score) for key, score in matches if score >= min_similarity]
+    if not matches:
+        return []
+
+    placeholders = ", ".join(["%s"] * len(matches))
+    # Re-check ownership and skip versions deleted since they were indexed
+    rows = _db().execute_query(
+        "SELECT v.id, v.session_id, v.version_number, v.version_type, v.prompt_content, "
+        "v.metadata, v.created_at, s.name AS session_name "
+        "FROM prompt_versions v JOIN sessions s ON s.id = v.session_id "
+        f"WHERE s.user_id = %s AND v.id IN ({placeholders})",
+        (user_id, *[key for key, _ in matches]),
+    )
+    by_id = {row["id"]: row for row in rows}
+
+    results: List[Dict[str, Any]] = []
+    seen_sessions = set()
+    for key, score in matches:
+        row = by_id.get(key)
+        if row is None or row["session_id"] in seen_sessions:
+            continue
+        if exclude_session_id and row["session_id"] == exclude_session_id:
+            continue
+        seen_sessions.add(row["session_id"])
+        metadata = row.get("metadata")
+        if isinstance(metadata, str):
+            metadata = json.loads(metadata)
+        results.append(
+            {
+                "version_id": key,
+                "session_id": row["session_id"],
+                "session_name": row["session_name"],
+                "version_number": row["version_number"],
+                "version_type": row["version_type"],
+                "similarity": round(score, 4),
+                "prompt_content": row["prompt_content"],
+                "metadata": metadata or {},
+                "created_at": row["created_at"].isoformat() if row.get("created_at") else None,
+            }
+        )
+        if len(results) >= limit:
+            break
+    return results
+
+
+def template_prior(
+    user_id: int, text: str, *, exclude_session_id: Optional[str] = None, limit: int = 10
+) -> Dict[str, float]:
+    """
+    Templates used by the user's similar past versions, weighted by similarity.
+    :return: template_key -> highest similarity of a past version generated with it.
+    """
+    prior: Dict[str, float] = {}
+    for match in similar_prompts(
+        user_id, text, limit=limit, exclude_session_id=exclude_session_id
+    ):
+        template_key = match["metadata"].get("template_key")
+        if template_key:
+            prior[template_key] = max(prior.get(template_key, 0.0), match["similarity"])
+    return prior
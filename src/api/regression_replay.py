@@ -0,0 +1,415 @@
+"""
+Offline regression replay of saved chat tests.
+
+Stored user test messages are replayed against a target (model, prompt
+version). Results are checkpointed per message in `regression_replay_results`,
+so an interrupted run resumes where it stopped. Used by the
+`/regression-replay` endpoints and by `replay_chat_tests.py`.
+"""
+import hashlib
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from core.utils.response_variance import format_signature
+from core.utils.similarity import jaccard, shingles
+
+REPLAY_MAX_CONCURRENCY = 16
+REPLAY_BATCH_SIZE = 50
+TARGET_MODEL_KEY = "replay_target"
+# Responses less similar than this to the stored one are reported as changed
+CHANGED_SIMILARITY = 0.5
+REPORT_WORST_CASES = 5
+REPORT_EXCERPT_CHARS = 300
+
+_active_runs: set = set()
+_active_runs_lock = threading.Lock()
+_background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="replay")
+
+
+def _db():
+    from api.database_api import db
+
+    return db
+
+
+def response_similarity(old: Optional[str], new: Optional[str]) -> float:
+    return round(jaccard(shingles(old or ""), shingles(new or "")), 4)
+
+
+def load_replay_items(
+    session_ids: Sequence[str], source_version_id: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Stored user test messages of the sessions, each with the assistant reply
+    that followed it.
+    :param session_ids: Sessions to replay.
+    :param source_version_id: Only replay messages sent to this version.
+    :return: [{"message_id", "session_id", "version_id", "user_message", "old_response"}]
+    """
+    if not session_ids:
+        return []
+    placeholders = ",".join(["%s"] * len(session_ids))
+    query = f"""
+        SELECT
+            u.id AS message_id,
+            cts.session_id,
+            cts.version_id,
+            u.content AS user_message,
+            (
+                SELECT a.content
+                FROM chat_test_messages a
+                WHERE a.chat_session_id = u.chat_session_id
+                    AND a.message_type = 'assistant'
+                    AND a.message_order > u.message_order
+                ORDER BY a.message_order ASC
+                LIMIT 1
+            ) AS old_response
+        FROM chat_test_messages u
+        INNER JOIN chat_test_sessions cts ON u.chat_session_id = cts.id
+        WHERE cts.session_id IN ({placeholders})
+            AND cts.is_active = 1
+            AND u.message_type = 'user'
+    """
+    params: List[Any] = list(session_ids)
+    if source_version_id is not None:
+        query += " AND cts.version_id = %s"
+        params.append(source_version_id)
+    query += " ORDER BY cts.session_id, u.message_order ASC"
+    return _db().execute_query(query, tuple(params))
+
+
+def resolve_target_versions(
+    session_ids: Sequence[str], version_number: Optional[int] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Prompt version each session is replayed against: `version_number` when
+    given, otherwise the latest version.
+    :return: session_id -> {"id", "version_number", "prompt_content"}
+    """
+    if not session_ids:
+        return {}
+    placeholders = ",".join(["%s"] * len(session_ids))
+    rows = _db().execute_query(
+        f"""
+        SELECT id, session_id, version_number, prompt_content
+        FROM prompt_versions
+        WHERE session_id IN ({placeholders})
+        ORDER BY session_id, version_number ASC
+        """,
+        tuple(session_ids),
+    )
+    targets: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        if version_number is not None and row["version_number"] != version_number:
+            continue
+        # Ascending order: the last row seen per session is the latest
+        targets[row["session_id"]] = row
+    return targets
+
+
+def create_run(user_id: int, config: Dict[str, Any]) -> str:
+    run_id = str(uuid.uuid4())
+    ok = _db().execute_update(
+        "INSERT INTO regression_replay_runs (id, user_id, config, status) "
+        "VALUES (%s, %s, %s, 'pending')",
+        (run_id, user_id, json.dumps(config, ensure_ascii=False)),
+    )
+    if not ok:
+        raise Exception("Failed to create replay run")
+    return run_id
+
+
+def get_run(run_id: str) -> Optional[Dict[str, Any]]:
+    rows = _db().execute_query(
+        "SELECT id, user_id, config, status, total, completed, error, "
+        "created_at, updated_at FROM regression_replay_runs WHERE id = %s",
+        (run_id,),
+    )
+    if not rows:
+        return None
+    run = rows[0]
+    if isinstance(run.get("config"), str):
+        run["config"] = json.loads(run["config"])
+    for field in ("created_at", "updated_at"):
+        if run.get(field):
+            run[field] = run[field].isoformat()
+    return run
+
+
+def _set_run_status(run_id: str, status: str, **fields: Any) -> None:
+    assignments = ", ".join(["status = %s"] + [f"{k} = %s" for k in fields])
+    _db().execute_update(
+        f"UPDATE regression_replay_runs SET {assignments} WHERE id = %s",
+        (status, *fields.values(), run_id),
+    )
+
+
+def _completed_message_ids(run_id: str) -> set:
+    rows = _db().execute_query(
+        "SELECT source_message_id FROM regression_replay_results "
+        "WHERE run_id = %s AND error IS NULL",
+        (run_id,),
+    )
+    return {row["source_message_id"] for row in rows}
+
+
+def _write_results(run_id: str, rows: List[Tuple]) -> None:
+    """
+    Checkpoint a batch of results in one transaction; a retried message
+    overwrites its earlier failure.
+    """
+    if not rows:
+        return
+    connection = _db().get_connection()
+    if not connection:
+        raise Exception("Failed to get database connection")
+    cursor = None
+    try:
+        cursor = connection.cursor()
+        cursor.executemany(
+            """
+            INSERT INTO regression_replay_results
+            (
+                run_id,
+                session_id,
+                source_message_id,
+                target_version_id,
+                user_message,
+                old_response,
+                new_response,
+                similarity,
+                response_time_ms,
+                error
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                target_version_id = VALUES(target_version_id),
+                new_response = VALUES(new_response),
+                similarity = VALUES(similarity),
+                response_time_ms = VALUES(response_time_ms),
+                error = VALUES(error)
+            """,
+            [(run_id, *row) for row in rows],
+        )
+        cursor.execute(
+            "UPDATE regression_replay_runs SET completed = ("
+            "SELECT COUNT(*) FROM regression_replay_results "
+            "WHERE run_id = %s AND error IS NULL) WHERE id = %s",
+            (run_id, run_id),
+        )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        connection.close()
+
+
+def replay(
+    ai_services: Any,
+    run_id: str,
+    *,
+    session_ids: Sequence[str],
+    version_number: Optional[int] = None,
+    source_version_id: Optional[int] = None,
+    model_name: Optional[str] = None,
+    max_workers: int = REPLAY_MAX_CONCURRENCY,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Replay a run's stored user messages, skipping ones already checkpointed.
+    Identical (target prompt, message) pairs are sent once.
+    :param ai_services: AIServices instance owned by the run; a target
+        model is registered on it.
+    :param on_progress: Called with (done, pending) after each batch.
+    :return: The run's diff report.
+    """
+    with _active_runs_lock:
+        if run_id in _active_runs:
+            raise Exception(f"Replay run {run_id} is already running")
+        _active_runs.add(run_id)
+    try:
+        model_key = (
+            ai_services.register_model(TARGET_MODEL_KEY, model_name=model_name)
+            if model_name
+            else None
+        )
+        targets = resolve_target_versions(session_ids, version_number)
+        items = [
+            item
+            for item in load_replay_items(session_ids, source_version_id)
+            if item["session_id"] in targets and (item["user_message"] or "").strip()
+        ]
+        done = _completed_message_ids(run_id)
+        pending = [item for item in items if item["message_id"] not in done]
+        _set_run_status(run_id, "running", total=len(items), error=None)
+
+        groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for item in pending:
+            prompt = targets[item["session_id"]]["prompt_content"]
+            key = (
+                hashlib.sha1(prompt.encode("utf-8")).hexdigest(),
+                item["user_message"],
+            )
+            groups.setdefault(key, []).append(item)
+
+        def _run(group: List[Dict[str, Any]]) -> Tuple[Optional[str], int, Optional[str]]:
+            first = group[0]
+            messages = [
+                {
+                    "role": "system",
+                    "content": targets[first["session_id"]]["prompt_content"],
+                },
+                {"role": "user", "content": first["user_message"]},
+            ]
+            started = time.perf_counter()
+            try:
+                response = ai_services.call(messages, temperature=0, model_key=model_key)
+                return response, int((time.perf_counter() - started) * 1000), None
+            except Exception as e:
+                return None, int((time.perf_counter() - started) * 1000), str(e)
+
+        batch: List[Tuple] = []
+        completed = 0
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = {executor.submit(_run, group): group for group in groups.values()}
+            for future in as_completed(futures):
+                response, elapsed_ms, error = future.result()
+                for item in futures[future]:
+                    batch.append(
+                        (
+                            item["session_id"],
+                            item["message_id"],
+                            targets[item["session_id"]]["id"],
+                            item["user_message"],
+                            item["old_response"],
+                            response,
+                            (
+                                response_similarity(item["old_response"], response)
+                                if error is None
+                                else None
+                            ),
+                            elapsed_ms,
+                            error,
+                        )
+                    )
+                if len(batch) >= REPLAY_BATCH_SIZE:
+                    _write_results(run_id, batch)
+                    completed += len(batch)
+                    batch = []
+                    if on_progress:
+                        on_progress(completed, len(pending))
+        _write_results(run_id, batch)
+        completed += len(batch)
+        if on_progress:
+            on_progress(completed, len(pending))
+
+        _set_run_status(run_id, "completed")
+        return build_report(run_id)
+    except Exception as e:
+        _set_run_status(run_id, "failed", error=str(e))
+        raise
+    finally:
+        with _active_runs_lock:
+            _active_runs.discard(run_id)
+
+
+def replay_in_background(ai_services: Any, run_id: str, **kwargs: Any) -> None:
+    def _run() -> None:
+        try:
+            replay(ai_services, run_id, **kwargs)
+        except Exception as e:
+            print(f"Warning: Replay run {run_id} failed: {e}")
+
+    _background.submit(_run)
+
+
+def _excerpt(text: Optional[str]) -> str:
+    text = text or ""
+    if len(text) <= REPORT_EXCERPT_CHARS:
+        return text
+    return text[:REPORT_EXCERPT_CHARS] + "..."
+
+
+def build_report(run_id: str) -> Dict[str, Any]:
+    """
+    Per-session comparison of stored and replayed responses.
+    :return: {"run_id", "sessions": [...], "totals": {...}}
+    """
+    rows = _db().execute_query(
+        """
+        SELECT session_id, source_message_id, target_version_id, user_message,
+            old_response, new_response, similarity, response_time_ms, error
+        FROM regression_replay_results
+        WHERE run_id = %s
+        ORDER BY session_id, source_message_id
+        """,
+        (run_id,),
+    )
+    by_session: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        by_session.setdefault(row["session_id"], []).append(row)
+
+    sessions = []
+    for session_id, results in by_session.items():
+        replayed = [r for r in results if r["error"] is None]
+        similarities = [float(r["similarity"]) for r in replayed]
+        changed = [r for r in replayed if float(r["similarity"]) < CHANGED_SIMILARITY]
+        format_changes = sum(
+            1
+            for r in replayed
+            if format_signature(r["old_response"]) != format_signature(r["new_response"])
+        )
+        length_deltas = [
+            len(r["new_response"] or "") - len(r["old_response"] or "") for r in replayed
+        ]
+        worst = sorted(replayed, key=lambda r: float(r["similarity"]))[:REPORT_WORST_CASES]
+        sessions.append(
+            {
+                "session_id": session_id,
+                "target_version_id": results[0]["target_version_id"],
+                "messages": len(results),
+                "replayed": len(replayed),
+                "errors": len(results) - len(replayed),
+                "changed": len(changed),
+                "format_changes": format_changes,
+                "mean_similarity": (
+                    round(sum(similarities) / len(similarities), 4)
+                    if similarities
+                    else None
+                ),
+                "mean_length_delta": (
+                    round(sum(length_deltas) / len(length_deltas), 1)
+                    if length_deltas
+                    else None
+                ),
+                "most_changed": [
+                    {
+                        "message_id": r["source_message_id"],
+                        "similarity": float(r["similarity"]),
+                        "user_message": _excerpt(r["user_message"]),
+                        "old_response": _excerpt(r["old_response"]),
+                        "new_response": _excerpt(r["new_response"]),
+                    }
+                    for r in worst
+                    if float(r["similarity"]) < CHANGED_SIMILARITY
+                ],
+            }
+        )
+    sessions.sort(key=lambda s: (s["mean_similarity"] is None, s["mean_similarity"] or 0))
+    return {
+        "run_id": run_id,
+        "sessions": sessions,
+        "totals": {
+            "messages": sum(s["messages"] for s in sessions),
+            "replayed": sum(s["replayed"] for s in sessions),
+            "errors": sum(s["errors"] for s in sessions),
+            "changed": sum(s["changed"] for s in sessions),
+        },
+    }
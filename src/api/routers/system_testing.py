@@ -1,24 +1,39 @@
 from fastapi import APIRouter, Depends, HTTPException
 
+import hashlib
 import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
 from core.processor.basic_handler import BasicHandler
 from core.processor.system_prompt_tester import SystemPromptTester
+from core.processor.version_judge import VersionJudge
+from core.utils.prompt_diff import prompt_diff, render_diff, transcript_diff
 from api.dependencies import get_current_user_id, get_user_ai_services
 from api.schemas import (
     ApiResponse,
     ChatMessageInput,
+    ChatTestBroadcastInput,
     ChatTestInput,
     ChatTestDiffExplainInput,
     ChatTestDiffAnalysisGetInput,
     ChatTestDiffAnalysisSaveInput,
+    RankVersionsInput,
+    RegressionReplayInput,
     SystemPromptTestInput,
     UserInput,
     VersionInput,
 )
 from api.session_store import session_store
-from api.routers.versions import add_session_version, save_chat_test_message
+from api import regression_replay, test_case_library
+from api.suggestion_queue import generate_suggestions, suggestion_batcher
+from api.routers.versions import (
+    add_session_version,
+    save_chat_test_message,
+    save_chat_test_messages,
+    set_versions_metadata_key,
+)
 
 
 router = APIRouter()
@@ -29,29 +44,6 @@ MODEL_CONFIG_MISSING_MESSAGE = (
 )
 
 
-def _parse_json_array(text: str) -> list:
-    if not text:
-        return []
-    try:
-        parsed = json.loads(text)
-        if isinstance(parsed, dict):
-            suggestions = parsed.get("suggestions")
-            return suggestions if isinstance(suggestions, list) else []
-        return parsed if isinstance(parsed, list) else []
-    except Exception:
-        pass
-
-    start = text.find("[")
-    end = text.rfind("]")
-    if start == -1 or end == -1 or end <= start:
-        return []
-    try:
-        parsed = json.loads(text[start: end + 1])
-        return parsed if isinstance(parsed, list) else []
-    except Exception:
-        return []
-
-
 def _fetch_chat_test_messages(
     *,
     db: Any,
@@ -89,6 +81,39 @@ def _fetch_chat_test_messages(
     return rows
 
 
+def _load_chat_history(
+    *, db: Any, session_id: str, version_id: int, pending_message: str
+) -> list[dict]:
+    """
+    Earlier turns of the active chat test session as {"role", "content"}
+    messages. The client saves the new user message before asking for the
+    answer, so a trailing copy of it is dropped.
+    """
+    rows = db.execute_query(
+        """
+        SELECT ctm.message_type, ctm.content
+        FROM chat_test_messages ctm
+        INNER JOIN chat_test_sessions cts ON ctm.chat_session_id = cts.id
+        WHERE cts.session_id = %s
+            AND cts.version_id = %s
+            AND cts.is_active = 1
+        ORDER BY ctm.message_order ASC, ctm.created_at ASC
+        """,
+        (session_id, version_id),
+    )
+    history = [
+        {"role": row["message_type"], "content": row["content"] or ""}
+        for row in rows
+    ]
+    if (
+        history
+        and history[-1]["role"] == "user"
+        and history[-1]["content"].strip() == pending_message.strip()
+    ):
+        history.pop()
+    return history
+
+
 def _fetch_chat_test_messages_by_ids(
     *,
     db: Any,
@@ -135,24 +160,11 @@ def _generate_suggestions_for_test(
     model_response: str,
 ) -> list:
     try:
-        import agent_prompt
-
-        handler = BasicHandler(user_ai_services)
-        suggestions_user_message = (
-            f"System prompt:\n{system_prompt}\n\n"
-            f"User test message:\n{user_test_message}\n\n"
-            f"Model response:\n{model_response}\n"
-        )
-        raw = handler.call_llm(
-            agent_prompt.validation_prompt_suggestions_system_prompt,
-            suggestions_user_message,
-        )
-        suggestions = _parse_json_array(raw)
-        return (
-            suggestions[:5]
-            if isinstance(suggestions, list) and suggestions
-            else []
-        )
+        return generate_suggestions(
+            BasicHandler(user_ai_services),
+            system_prompt,
+            [(user_test_message, model_response)],
+        )[0]
     except Exception:
         return []
 
@@ -186,6 +198,30 @@ def _upsert_diff_analysis_metadata(
     return updated
 
 
+def _store_diff_analysis(
+    *, db: Any, left_row: dict, right_row: dict, entry: dict
+) -> str:
+    """
+    Store an explanation under metadata.diff_analysis of both versions.
+    :return: The entry's updated_at timestamp.
+    """
+    from datetime import datetime, timezone
+
+    now_iso = datetime.now(timezone.utc).isoformat()
+    entry = {**entry, "updated_at": now_iso}
+    for row, other in ((left_row, right_row), (right_row, left_row)):
+        meta = _upsert_diff_analysis_metadata(
+            meta=_safe_load_metadata(row.get("metadata")),
+            other_version_id=other["id"],
+            entry=entry,
+        )
+        db.execute_update(
+            "UPDATE prompt_versions SET metadata = %s WHERE id = %s",
+            (json.dumps(meta), row["id"]),
+        )
+    return now_iso
+
+
 async def _save_default_test_conversation(
     session_id: str,
     version_id: int,
@@ -346,8 +382,21 @@ async def test_results(
             )
 
         system_tester = SystemPromptTester(user_ai_services)
+        # Keyed by the original prompt so every optimized version of this
+        # lineage is tested on the same input
+        test_cases, test_case_source = test_case_library.get_or_generate(
+            user_input.session_id,
+            original_prompt,
+            1,
+            lambda n: [
+                system_tester.test_case_generator.generate_test_case(optimized_prompt)
+            ],
+            refresh=bool(user_input.refresh_test_cases),
+        )
+        if not test_cases:
+            raise Exception("Test case generation failed")
         comparison_result = system_tester.compare_system_prompts(
-            original_prompt, optimized_prompt
+            original_prompt, optimized_prompt, test_cases[0]
         )
 
         test_case = comparison_result["test_case"]
@@ -510,6 +559,7 @@ async def test_results(
                 "original_prompt": original_prompt,
                 "optimized_prompt": optimized_prompt,
                 "test_case": test_case,
+                "test_case_source": test_case_source,
                 "original_result": original_response,
                 "optimized_result": optimized_response,
             },
@@ -560,6 +610,92 @@ async def test_system_prompt(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _queue_suggestions(
+    user_ai_services: Any,
+    chat_input: ChatTestInput,
+    system_prompt: str,
+    response: str,
+    message_id: int | None = None,
+) -> dict:
+    """
+    Queue suggestions for a turn instead of waiting for them; the client binds
+    the job to its saved assistant message or polls /chat-test-suggestions.
+    """
+    job_id = suggestion_batcher.submit(
+        user_ai_services,
+        (chat_input.session_id, chat_input.version_number, system_prompt),
+        system_prompt=system_prompt,
+        user_message=chat_input.user_message,
+        response=response,
+        message_id=message_id,
+    )
+    return {
+        "suggestions": [],
+        "suggestions_status": "pending",
+        "suggestion_job_id": job_id,
+    }
+
+
+def _run_variance_test(
+    system_tester: SystemPromptTester,
+    *,
+    user_ai_services: Any,
+    chat_input: ChatTestInput,
+    system_prompt: str,
+) -> dict:
+    """
+    Sample several responses for one chat test message and persist them as a
+    single turn: the user message plus one assistant message that carries
+    every sample and the consistency metrics in its metadata.
+    """
+    result = system_tester.sample_responses(
+        system_prompt, chat_input.user_message, chat_input.samples
+    )
+    if not result["success"]:
+        return result
+
+    variance_group = uuid.uuid4().hex
+    try:
+        result["message_ids"] = save_chat_test_messages(
+            [
+                ChatMessageInput(
+                    session_id=chat_input.session_id,
+                    version_id=chat_input.version_number,
+                    message_type="user",
+                    content=chat_input.user_message,
+                    metadata={"variance_group": variance_group},
+                ),
+                ChatMessageInput(
+                    session_id=chat_input.session_id,
+                    version_id=chat_input.version_number,
+                    message_type="assistant",
+                    content=result["response"],
+                    response_time_ms=result.get("response_time_ms"),
+                    metadata={
+                        "variance_group": variance_group,
+                        "samples": result["samples"],
+                        "variance": result["variance"],
+                    },
+                ),
+            ]
+        )
+        result["persisted"] = True
+    except Exception as e:
+        print(f"Warning: Failed to save variance test turn: {e}")
+        result["persisted"] = False
+    result["variance_group"] = variance_group
+    result.update(
+        _queue_suggestions(
+            user_ai_services,
+            chat_input,
+            system_prompt,
+            result["response"],
+            message_id=result["message_ids"][-1] if result["persisted"] else None,
+        )
+    )
+    return result
+
+
 @router.post("/chat-test-version", response_model=ApiResponse)
 async def chat_test_version(
     chat_input: ChatTestInput, user_id: int = Depends(get_current_user_id)
@@ -608,24 +744,204 @@ async def chat_test_version(
         system_prompt = version_data[0]["prompt_content"]
 
         system_tester = SystemPromptTester(user_ai_services)
-        result = system_tester.test_with_custom_message(
-            system_prompt, chat_input.user_message
-        )
-
-        suggestions = _generate_suggestions_for_test(
-            user_ai_services=user_ai_services,
-            system_prompt=system_prompt,
-            user_test_message=chat_input.user_message,
-            model_response=result.get("response", ""),
-        )
+        if chat_input.samples and chat_input.samples > 1:
+            return {
+                "status": "success",
+                "result": _run_variance_test(
+                    system_tester,
+                    user_ai_services=user_ai_services,
+                    chat_input=chat_input,
+                    system_prompt=system_prompt,
+                ),
+            }
+
+        if chat_input.multi_turn:
+            result = system_tester.test_with_history(
+                system_prompt,
+                _load_chat_history(
+                    db=db,
+                    session_id=chat_input.session_id,
+                    version_id=chat_input.version_number,
+                    pending_message=chat_input.user_message,
+                ),
+                chat_input.user_message,
+                token_budget=chat_input.history_token_budget,
+            )
+        else:
+            result = system_tester.test_with_custom_message(
+                system_prompt, chat_input.user_message
+            )
 
         result_payload = dict(result)
-        result_payload["suggestions"] = suggestions
+        if result.get("success"):
+            result_payload.update(
+                _queue_suggestions(
+                    user_ai_services,
+                    chat_input,
+                    system_prompt,
+                    result.get("response", ""),
+                )
+            )
+        else:
+            result_payload["suggestions"] = []
         return {"status": "success", "result": result_payload}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/chat-test-suggestions/{job_id}", response_model=ApiResponse)
+async def get_chat_test_suggestions(job_id: str):
+    job = suggestion_batcher.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Suggestion job not found")
+    return {"status": "success", "result": job}
+
+
+# Concurrent version calls per broadcast
+MAX_BROADCAST_VERSIONS = 8
+
+
+@router.post("/chat-test-broadcast", response_model=ApiResponse)
+async def chat_test_broadcast(
+    payload: ChatTestBroadcastInput, user_id: int = Depends(get_current_user_id)
+):
+    try:
+        user_ai_services = get_user_ai_services(user_id)
+        if user_ai_services is None:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "type": "config_error",
+                    "message": MODEL_CONFIG_MISSING_MESSAGE,
+                    "missing_fields": [
+                        "modelApiUrl",
+                        "modelApiKey",
+                        "modelName",
+                    ],
+                },
+            )
+
+        validation_result = user_ai_services.validate_model_config()
+        if not validation_result["valid"]:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "type": "config_error",
+                    "message": validation_result["message"],
+                    "missing_fields": validation_result["missing_fields"],
+                },
+            )
+
+        version_ids = list(dict.fromkeys(payload.version_ids))[:MAX_BROADCAST_VERSIONS]
+        if not version_ids:
+            raise HTTPException(status_code=400, detail="No versions given")
+
+        from api.database_api import db
+
+        placeholders = ",".join(["%s"] * len(version_ids))
+        rows = db.execute_query(
+            f"SELECT id, prompt_content FROM prompt_versions "
+            f"WHERE session_id = %s AND id IN ({placeholders})",
+            (payload.session_id, *version_ids),
+        )
+        prompts = {row["id"]: row["prompt_content"] for row in rows}
+        missing = [v for v in version_ids if v not in prompts]
+        if missing:
+            raise HTTPException(
+                status_code=404, detail=f"Versions not found: {missing}"
+            )
+
+        histories = {}
+        if payload.multi_turn:
+            # Read before this turn is persisted
+            histories = {
+                v: _load_chat_history(
+                    db=db,
+                    session_id=payload.session_id,
+                    version_id=v,
+                    pending_message=payload.user_message,
+                )
+                for v in version_ids
+            }
+
+        system_tester = SystemPromptTester(user_ai_services)
+
+        def _run(version_id: int) -> dict:
+            if payload.multi_turn:
+                return system_tester.test_with_history(
+                    prompts[version_id],
+                    histories[version_id],
+                    payload.user_message,
+                    token_budget=payload.history_token_budget,
+                )
+            return system_tester.test_with_custom_message(
+                prompts[version_id], payload.user_message
+            )
+
+        with ThreadPoolExecutor(max_workers=len(version_ids)) as executor:
+            results = dict(zip(version_ids, executor.map(_run, version_ids)))
+
+        succeeded = [v for v in version_ids if results[v].get("success")]
+        messages = []
+        for version_id in succeeded:
+            messages.append(
+                ChatMessageInput(
+                    session_id=payload.session_id,
+                    version_id=version_id,
+                    message_type="user",
+                    content=payload.user_message,
+                )
+            )
+            messages.append(
+                ChatMessageInput(
+                    session_id=payload.session_id,
+                    version_id=version_id,
+                    message_type="assistant",
+                    content=results[version_id]["response"],
+                    response_time_ms=results[version_id].get("response_time_ms"),
+                )
+            )
+        try:
+            message_ids = save_chat_test_messages(messages)
+            persisted = True
+        except Exception as e:
+            print(f"Warning: Failed to save broadcast turn: {e}")
+            message_ids, persisted = [], False
+
+        for i, version_id in enumerate(succeeded):
+            result = results[version_id]
+            if persisted:
+                result["user_message_id"] = message_ids[2 * i]
+                result["assistant_message_id"] = message_ids[2 * i + 1]
+            result.update(
+                _queue_suggestions(
+                    user_ai_services,
+                    ChatTestInput(
+                        session_id=payload.session_id,
+                        version_number=version_id,
+                        user_message=payload.user_message,
+                    ),
+                    prompts[version_id],
+                    result["response"],
+                    message_id=result.get("assistant_message_id"),
+                )
+            )
+
+        return {
+            "status": "success",
+            "result": {
+                "persisted": persisted,
+                "results": [
+                    {"version_id": v, **results[v]} for v in version_ids
+                ],
+            },
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/chat-test-diff-explain", response_model=ApiResponse)
 async def chat_test_diff_explain(
     payload: ChatTestDiffExplainInput,
@@ -661,7 +977,7 @@ async def chat_test_diff_explain(
         from api.database_api import db
 
         prompt_query = """
-            SELECT id, version_number, prompt_content, version_name
+            SELECT id, version_number, prompt_content, version_name, metadata
             FROM prompt_versions
             WHERE session_id = %s AND id IN (%s, %s)
         """
@@ -718,40 +1034,75 @@ async def chat_test_diff_explain(
                 end_order=payload.right_end_order,
             )
 
-        def to_transcript(messages: list[dict]) -> str:
-            lines = []
-            for m in messages:
-                role = (
-                    "User" if m.get("message_type") == "user" else "Assistant"
-                )
-                order = m.get("message_order")
-                content = m.get("content") or ""
-                lines.append(f"{role} [{order}]: {content}")
-            return "\n".join(lines)
+        left_ids = [m["id"] for m in left_messages]
+        right_ids = [m["id"] for m in right_messages]
+        inputs_hash = hashlib.sha256(
+            json.dumps(
+                [
+                    left_prompt,
+                    right_prompt,
+                    [m.get("content") for m in left_messages],
+                    [m.get("content") for m in right_messages],
+                ],
+                ensure_ascii=False,
+            ).encode("utf-8")
+        ).hexdigest()
+
+        saved = _safe_load_metadata(left_row.get("metadata")).get("diff_analysis")
+        entry = saved.get(str(payload.right_version_id)) if isinstance(saved, dict) else None
+        if (
+            isinstance(entry, dict)
+            and entry.get("explanation")
+            and entry.get("left_version_id") == payload.left_version_id
+            and sorted(entry.get("left_message_ids") or []) == sorted(left_ids)
+            and sorted(entry.get("right_message_ids") or []) == sorted(right_ids)
+            and entry.get("inputs_hash", inputs_hash) == inputs_hash
+        ):
+            return {
+                "status": "success",
+                "result": {"explanation": entry["explanation"], "cached": True},
+            }
+
+        diff_text = render_diff(
+            prompt_diff(left_prompt, right_prompt),
+            transcript_diff(left_messages, right_messages),
+        )
 
         import agent_prompt
 
         handler = BasicHandler(user_ai_services)
         user_message = (
             "Explain why the two prompt versions produced different "
-            "behaviors.\n\n"
-            f"=== {left_name} System Prompt ===\n"
-            f"{left_prompt}\n\n"
-            f"=== {right_name} System Prompt ===\n"
-            f"{right_prompt}\n\n"
-            f"=== {left_name} Test Messages (selected) ===\n"
-            f"{to_transcript(left_messages)}\n\n"
-            f"=== {right_name} Test Messages (selected) ===\n"
-            f"{to_transcript(right_messages)}\n"
+            "behaviors. Below is a precomputed diff: only the changed prompt "
+            "sections and the points where the replies diverge.\n\n"
+            f"Left = {left_name}, Right = {right_name}\n\n"
+            f"{diff_text}\n"
         )
         explanation = handler.call_llm(
             agent_prompt.validation_diff_explainer_system_prompt,
             user_message,
         )
 
+        try:
+            _store_diff_analysis(
+                db=db,
+                left_row=left_row,
+                right_row=right_row,
+                entry={
+                    "left_version_id": payload.left_version_id,
+                    "right_version_id": payload.right_version_id,
+                    "left_message_ids": left_ids,
+                    "right_message_ids": right_ids,
+                    "explanation": explanation,
+                    "inputs_hash": inputs_hash,
+                },
+            )
+        except Exception as e:
+            print(f"Warning: Failed to cache diff analysis: {e}")
+
         return {
             "status": "success",
-            "result": {"explanation": explanation},
+            "result": {"explanation": explanation, "cached": False, "diff": diff_text},
         }
     except HTTPException:
         raise
@@ -785,38 +1136,17 @@ async def chat_test_diff_analysis_save(
         if not left_row or not right_row:
             raise HTTPException(status_code=404, detail="Version not found")
 
-        from datetime import datetime, timezone
-
-        now_iso = datetime.now(timezone.utc).isoformat()
-        entry = {
-            "left_version_id": payload.left_version_id,
-            "right_version_id": payload.right_version_id,
-            "left_message_ids": payload.left_message_ids,
-            "right_message_ids": payload.right_message_ids,
-            "explanation": payload.explanation,
-            "updated_at": now_iso,
-        }
-
-        left_meta = _safe_load_metadata(left_row.get("metadata"))
-        right_meta = _safe_load_metadata(right_row.get("metadata"))
-        left_meta = _upsert_diff_analysis_metadata(
-            meta=left_meta,
-            other_version_id=payload.right_version_id,
-            entry=entry,
-        )
-        right_meta = _upsert_diff_analysis_metadata(
-            meta=right_meta,
-            other_version_id=payload.left_version_id,
-            entry=entry,
-        )
-
-        db.execute_update(
-            "UPDATE prompt_versions SET metadata = %s WHERE id = %s",
-            (json.dumps(left_meta), payload.left_version_id),
-        )
-        db.execute_update(
-            "UPDATE prompt_versions SET metadata = %s WHERE id = %s",
-            (json.dumps(right_meta), payload.right_version_id),
+        now_iso = _store_diff_analysis(
+            db=db,
+            left_row=left_row,
+            right_row=right_row,
+            entry={
+                "left_version_id": payload.left_version_id,
+                "right_version_id": payload.right_version_id,
+                "left_message_ids": payload.left_message_ids,
+                "right_message_ids": payload.right_message_ids,
+                "explanation": payload.explanation,
+            },
         )
 
         return {"status": "success", "result": {"updated_at": now_iso}}
@@ -865,6 +1195,214 @@ async def chat_test_diff_analysis_get(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/rank-versions", response_model=ApiResponse)
+async def rank_versions(
+    payload: RankVersionsInput,
+    user_id: int = Depends(get_current_user_id),
+):
+    try:
+        user_ai_services = get_user_ai_services(user_id)
+        if user_ai_services is None:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "type": "config_error",
+                    "message": MODEL_CONFIG_MISSING_MESSAGE,
+                    "missing_fields": [
+                        "modelApiUrl",
+                        "modelApiKey",
+                        "modelName",
+                    ],
+                },
+            )
+
+        validation_result = user_ai_services.validate_model_config()
+        if not validation_result["valid"]:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "type": "config_error",
+                    "message": validation_result["message"],
+                    "missing_fields": validation_result["missing_fields"],
+                },
+            )
+
+        from api.database_api import db
+
+        rows = db.execute_query(
+            """
+            SELECT id, version_number, version_type, prompt_content
+            FROM prompt_versions
+            WHERE session_id = %s
+            ORDER BY version_number ASC
+            """,
+            (payload.session_id,),
+        )
+        # The session's original prompt is the lineage root, as in /test-results,
+        # whichever versions are being ranked
+        lineage_prompt = next(
+            (
+                r["prompt_content"]
+                for r in rows
+                if r["version_type"] == "original" and r.get("prompt_content")
+            ),
+            None,
+        ) or next((r["prompt_content"] for r in rows if r.get("prompt_content")), "")
+        if payload.version_ids:
+            wanted = set(payload.version_ids)
+            rows = [r for r in rows if r["id"] in wanted]
+        rows = [r for r in rows if r.get("prompt_content")]
+        if len(rows) < 2:
+            raise HTTPException(
+                status_code=400, detail="At least two versions are required"
+            )
+
+        test_cases = [t for t in (payload.test_cases or []) if t and t.strip()]
+        if not test_cases:
+            generator = SystemPromptTester(user_ai_services).test_case_generator
+            test_cases, _ = test_case_library.get_or_generate(
+                payload.session_id,
+                lineage_prompt,
+                max(1, payload.test_case_count or 5),
+                lambda n: generator.generate_multiple_test_cases(lineage_prompt, n),
+                refresh=bool(payload.refresh_test_cases),
+            )
+            if not test_cases:
+                raise Exception("Test case generation failed")
+
+        judge = VersionJudge(user_ai_services)
+        result = judge.rank_versions(
+            {r["id"]: r["prompt_content"] for r in rows}, test_cases
+        )
+
+        from datetime import datetime, timezone
+
+        updated_at = datetime.now(timezone.utc).isoformat()
+        set_versions_metadata_key(
+            payload.session_id,
+            "tournament",
+            {
+                entry["version_id"]: {
+                    **entry,
+                    "test_set_hash": result["test_set_hash"],
+                    "judge_model": result["judge_model"],
+                    "judge_base_url": result["judge_base_url"],
+                    "updated_at": updated_at,
+                }
+                for entry in result["ranking"]
+            },
+        )
+
+        version_numbers = {r["id"]: r["version_number"] for r in rows}
+        for entry in result["ranking"]:
+            entry["version_number"] = version_numbers.get(entry["version_id"])
+        return {
+            "status": "success",
+            "result": {**result, "test_cases": test_cases},
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/regression-replay", response_model=ApiResponse)
+async def start_regression_replay(
+    payload: RegressionReplayInput,
+    user_id: int = Depends(get_current_user_id),
+):
+    try:
+        from api.database_api import db
+        from services.ai_services import AIServices
+
+        if payload.run_id:
+            run = regression_replay.get_run(payload.run_id)
+            if not run or run["user_id"] != user_id:
+                raise HTTPException(status_code=404, detail="Replay run not found")
+            config = run["config"] or {}
+            run_id = payload.run_id
+        else:
+            if not payload.session_ids:
+                raise HTTPException(
+                    status_code=400, detail="At least one session is required"
+                )
+            placeholders = ",".join(["%s"] * len(payload.session_ids))
+            owned = db.execute_query(
+                f"SELECT id FROM sessions WHERE user_id = %s AND id IN ({placeholders})",
+                (user_id, *payload.session_ids),
+            )
+            config = {
+                "session_ids": [row["id"] for row in owned],
+                "version_number": payload.version_number,
+                "source_version_id": payload.source_version_id,
+                "model_name": payload.target_model,
+            }
+            if not config["session_ids"]:
+                raise HTTPException(status_code=404, detail="Sessions not found")
+            run_id = regression_replay.create_run(user_id, config)
+
+        # A dedicated instance: the target model must not leak into the
+        # user's shared AIServices
+        try:
+            replay_ai_services = AIServices(user_id=user_id)
+        except Exception:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "type": "config_error",
+                    "message": MODEL_CONFIG_MISSING_MESSAGE,
+                    "missing_fields": [
+                        "modelApiUrl",
+                        "modelApiKey",
+                        "modelName",
+                    ],
+                },
+            )
+
+        regression_replay.replay_in_background(
+            replay_ai_services,
+            run_id,
+            session_ids=config.get("session_ids") or [],
+            version_number=config.get("version_number"),
+            source_version_id=config.get("source_version_id"),
+            model_name=config.get("model_name"),
+            max_workers=max(
+                1,
+                min(
+                    payload.max_concurrency or regression_replay.REPLAY_MAX_CONCURRENCY,
+                    regression_replay.REPLAY_MAX_CONCURRENCY,
+                ),
+            ),
+        )
+        return {
+            "status": "success",
+            "result": {"run_id": run_id, "status": "running", "config": config},
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/regression-replay/{run_id}", response_model=ApiResponse)
+async def get_regression_replay(
+    run_id: str,
+    user_id: int = Depends(get_current_user_id),
+):
+    try:
+        run = regression_replay.get_run(run_id)
+        if not run or run["user_id"] != user_id:
+            raise HTTPException(status_code=404, detail="Replay run not found")
+        return {
+            "status": "success",
+            "result": {**run, "report": regression_replay.build_report(run_id)},
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/generate-test-case", response_model=ApiResponse)
 async def generate_test_case(
     test_input: SystemPromptTestInput,
@@ -945,6 +1483,8 @@ async def generate_multiple_test_cases(
             test_input.system_prompt,
             test_input.count,
         )
+        if not test_cases:
+            raise Exception("Test case generation failed")
 
         return {"status": "success", "result": {"test_cases": test_cases}}
     except Exception as e:
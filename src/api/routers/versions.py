@@ -1,8 +1,11 @@
 import json
+from typing import Optional
 
 from fastapi import APIRouter, HTTPException
 
-from api import database_api
+from api import database_api, prompt_index
+from api.session_store import session_store
+from api.suggestion_queue import suggestion_batcher
 from api.schemas import (
     ApiResponse,
     ChatHistoryRequest,
@@ -14,6 +17,20 @@ from api.schemas import (
 router = APIRouter()
 
 
+def _version_metadata(session_id: str, version: VersionInput) -> Optional[str]:
+    """
+    Serialized version metadata. Versions derived from the generated prompt
+    record the template the session generated it with, which the similar-prompt
+    index uses as a template prior.
+    """
+    metadata = dict(version.metadata or {})
+    if version.version_type != "original" and "template_key" not in metadata:
+        session = session_store.sessions.get(session_id) or {}
+        if session.get("selected_prompt_template_key"):
+            metadata["template_key"] = session["selected_prompt_template_key"]
+    return json.dumps(metadata) if metadata else None
+
+
 @router.get("/api/sessions/{session_id}/versions", response_model=ApiResponse)
 async def get_session_versions(session_id: str):
     try:
@@ -92,11 +109,7 @@ async def add_session_version(session_id: str, version_input: VersionInput):
             VALUES (%s, %s, %s, %s, %s, %s)
             """
 
-            metadata_json = (
-                json.dumps(version_input.metadata)
-                if version_input.metadata
-                else None
-            )
+            metadata_json = _version_metadata(session_id, version_input)
 
             cursor.execute(
                 insert_query,
@@ -112,6 +125,7 @@ async def add_session_version(session_id: str, version_input: VersionInput):
 
             version_id = cursor.lastrowid
             connection.commit()
+            prompt_index.schedule_sync()
         finally:
             if cursor:
                 cursor.close()
@@ -131,6 +145,122 @@ async def add_session_version(session_id: str, version_input: VersionInput):
         )
 
 
+def add_session_versions(session_id: str, versions: list[VersionInput]) -> list[dict]:
+    """
+    Insert several versions with consecutive version numbers in one transaction.
+    :param session_id: Session the versions belong to.
+    :param versions: Versions to insert, in order.
+    :return: [{"version_id", "version_number"}] in the same order.
+    """
+    if not versions:
+        return []
+
+    connection = database_api.db.get_connection()
+    if not connection:
+        raise Exception("Failed to get database connection")
+
+    cursor = None
+    try:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(
+            "SELECT COALESCE(MAX(version_number), 0) + 1 as next_version "
+            "FROM prompt_versions WHERE session_id = %s FOR UPDATE",
+            (session_id,),
+        )
+        row = cursor.fetchone()
+        next_version = row["next_version"] if row else 1
+
+        insert_query = """
+        INSERT INTO prompt_versions
+        (
+            session_id,
+            version_number,
+            prompt_content,
+            test_result,
+            version_type,
+            metadata
+        )
+        VALUES (%s, %s, %s, %s, %s, %s)
+        """
+        inserted = []
+        for offset, version in enumerate(versions):
+            cursor.execute(
+                insert_query,
+                (
+                    session_id,
+                    next_version + offset,
+                    version.prompt_content,
+                    version.test_result,
+                    version.version_type,
+                    _version_metadata(session_id, version),
+                ),
+            )
+            inserted.append(
+                {
+                    "version_id": cursor.lastrowid,
+                    "version_number": next_version + offset,
+                }
+            )
+        connection.commit()
+        prompt_index.schedule_sync()
+        return inserted
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        connection.close()
+
+
+def set_versions_metadata_key(
+    session_id: str, key: str, values: dict[int, dict]
+) -> int:
+    """
+    Set `metadata.<key>` on several versions of a session in one transaction.
+    :param session_id: Session the versions belong to.
+    :param key: Top-level metadata key to overwrite.
+    :param values: version id -> JSON-serializable value.
+    :return: Number of rows updated.
+    """
+    if not values:
+        return 0
+
+    connection = database_api.db.get_connection()
+    if not connection:
+        raise Exception("Failed to get database connection")
+
+    cursor = None
+    try:
+        cursor = connection.cursor()
+        update_query = """
+        UPDATE prompt_versions
+        SET metadata = JSON_SET(COALESCE(metadata, JSON_OBJECT()), %s, CAST(%s AS JSON))
+        WHERE session_id = %s AND id = %s
+        """
+        updated = 0
+        for version_id, value in values.items():
+            cursor.execute(
+                update_query,
+                (
+                    f"$.{key}",
+                    json.dumps(value, ensure_ascii=False),
+                    session_id,
+                    version_id,
+                ),
+            )
+            updated += cursor.rowcount
+        connection.commit()
+        return updated
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        connection.close()
+
+
 @router.put(
     "/api/sessions/{session_id}/versions/{version_id}/name",
     response_model=ApiResponse,
@@ -334,6 +464,10 @@ async def save_chat_test_message(message_input: ChatMessageInput):
         if message_id is None:
             raise Exception("Failed to get message ID")
 
+        job_id = (message_input.metadata or {}).get("suggestion_job_id")
+        if job_id:
+            suggestion_batcher.bind_message(job_id, message_id)
+
         return ApiResponse(
             status="success",
             result={"message_id": message_id},
@@ -350,6 +484,57 @@ async def save_chat_test_message(message_input: ChatMessageInput):
         )
 
 
+def save_chat_test_messages(messages: list[ChatMessageInput]) -> list[int]:
+    """
+    Save several chat test messages in order within one transaction.
+    :return: The new message ids, in the same order.
+    """
+    connection = database_api.db.get_connection()
+    if not connection:
+        raise Exception("Database connection failed")
+
+    cursor = None
+    try:
+        cursor = connection.cursor()
+        message_ids = []
+        for message_input in messages:
+            cursor.callproc(
+                "SaveChatTestMessage",
+                [
+                    message_input.session_id,
+                    message_input.version_id,
+                    message_input.message_type,
+                    message_input.content,
+                    message_input.response_time_ms,
+                    message_input.token_count,
+                    (
+                        json.dumps(message_input.metadata)
+                        if message_input.metadata
+                        else None
+                    ),
+                ],
+            )
+            message_id = None
+            for result in cursor.stored_results():
+                if result.description:
+                    row = result.fetchone()
+                    if row:
+                        message_id = row[0]
+                    break
+            if message_id is None:
+                raise Exception("Failed to get message ID")
+            message_ids.append(message_id)
+        connection.commit()
+        return message_ids
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        connection.close()
+
+
 @router.post("/chat-test-history", response_model=ApiResponse)
 async def get_chat_test_history(history_request: ChatHistoryRequest):
     try:
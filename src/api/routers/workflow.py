@@ -1,12 +1,31 @@
 import json
+import uuid
 from typing import Any, Optional, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException
 
 from core import processor
+from api import prompt_index
 from api.dependencies import get_current_user_id, get_user_ai_services
-from api.schemas import AnalysisInput, ApiResponse, UserFeedback, UserInput
+from api.prefetch import inputs_key, prefetch_enabled, speculative_cache
+from api.semantic_cache import recent_hits, semantic_cache, semantic_cache_threshold
+from api.routers.versions import add_session_versions
+from api.schemas import (
+    AnalysisInput,
+    ApiResponse,
+    SimilarPromptsInput,
+    UserFeedback,
+    UserInput,
+    VersionInput,
+)
 from api.session_store import session_store
+from core.utils.json_extract import extract_json
+from core.utils.template_ranker import rank_templates
+from core.utils.token_budget import (
+    DEFAULT_ANALYSIS_TOKEN_BUDGET,
+    analysis_budget_for,
+    compact_analysis,
+)
 
 
 router = APIRouter()
@@ -21,6 +40,14 @@ DEFAULT_OPTIMIZATION_PROMPT = (
     "prompt to make it clearer, more specific, and more effective. Focus on "
     "improving clarity, specificity, structure, and expected outcomes."
 )
+# Local template ranking: skip the LLM when the leader is clear,
+# otherwise send only the top candidates
+TEMPLATE_RANK_MIN_SCORE = 0.15
+TEMPLATE_RANK_CLEAR_RATIO = 1.5
+TEMPLATE_LLM_TOP_K = 5
+# Multi-template generation: candidates when the request names no templates, and the cap
+GENERATION_CANDIDATES_DEFAULT_K = 3
+GENERATION_CANDIDATES_MAX = 6
 
 
 def _requirements_checklist_key(session_id: str) -> str:
@@ -123,24 +150,6 @@ def _require_ai_services(
     return user_ai_services
 
 
-def _parse_json_object(text: str) -> dict:
-    if not text:
-        return {}
-    try:
-        return json.loads(text)
-    except Exception:
-        pass
-
-    start = text.find("{")
-    end = text.rfind("}")
-    if start == -1 or end == -1 or end <= start:
-        return {}
-    try:
-        return json.loads(text[start : end + 1])
-    except Exception:
-        return {}
-
-
 def _get_selected_prompt_template_keys(
     user_id: int, *, category: Optional[str] = "prompt_crafter"
 ) -> list[str]:
@@ -208,6 +217,17 @@ def _get_prompt_templates_by_keys(
     return templates
 
 
+def _past_template_prior(user_id: int, original_prompt: str) -> dict[str, float]:
+    """
+    Templates behind the user's similar past versions, for template ranking.
+    """
+    try:
+        return prompt_index.template_prior(user_id, original_prompt)
+    except Exception as e:
+        print(f"Warning: Failed to look up similar past prompts: {e}")
+        return {}
+
+
 def _choose_template_with_llm(
     prompt_generator: processor.PromptGenerator,
     *,
@@ -216,9 +236,38 @@ def _choose_template_with_llm(
     candidates: list[dict],
     feedback: Optional[str] = None,
     avoid_template_key: Optional[str] = None,
+    template_prior: Optional[dict[str, float]] = None,
 ) -> Tuple[Optional[str], str]:
     if not candidates:
         return None, ""
+    if len(candidates) == 1:
+        return candidates[0].get("template_key"), "Only one checked template is available."
+
+    ranking = rank_templates(
+        candidates,
+        original_prompt=original_prompt,
+        analysis_results=analysis_results,
+        feedback=feedback,
+        prior=template_prior,
+    )
+    if avoid_template_key:
+        ranking = [r for r in ranking if r[0] != avoid_template_key] + [
+            r for r in ranking if r[0] == avoid_template_key
+        ]
+    top_key, top_score = ranking[0]
+    runner_up_score = ranking[1][1] if len(ranking) > 1 else 0.0
+    if (
+        top_key != avoid_template_key
+        and top_score >= TEMPLATE_RANK_MIN_SCORE
+        and top_score >= TEMPLATE_RANK_CLEAR_RATIO * runner_up_score
+    ):
+        return top_key, (
+            "Best match for the prompt and analysis by template name, "
+            f"description and category (score {top_score:.2f} vs {runner_up_score:.2f})."
+        )
+
+    by_key = {c.get("template_key"): c for c in candidates}
+    shortlist = [by_key[key] for key, _ in ranking[:TEMPLATE_LLM_TOP_K]]
 
     candidates_payload = [
         {
@@ -228,7 +277,7 @@ def _choose_template_with_llm(
             "category": c.get("category"),
             "is_custom": bool(c.get("is_custom")),
         }
-        for c in candidates
+        for c in shortlist
     ]
 
     avoid_text = (
@@ -238,25 +287,38 @@ def _choose_template_with_llm(
     )
     feedback_text = f"User feedback about the last generated prompt:\n{feedback}\n" if feedback else ""
 
+    # Template choice needs the gist of the analysis, not all of it
+    analysis_text = compact_analysis(
+        analysis_results,
+        original_prompt=original_prompt,
+        max_tokens=analysis_budget_for(prompt_generator.ai_server) // 2,
+    )
+
     import agent_prompt
 
     system_message = agent_prompt.template_selector_system_prompt
     user_message = (
         f"User original prompt:\n{original_prompt}\n\n"
-        f"Analysis results:\n{json.dumps(analysis_results, ensure_ascii=False)}\n\n"
+        f"Analysis results:\n{analysis_text}\n\n"
         f"{feedback_text}"
         f"{avoid_text}"
         f"Candidates:\n{json.dumps(candidates_payload, ensure_ascii=False)}\n"
     )
 
-    raw = prompt_generator.call_llm(system_message, user_message)
-    parsed = _parse_json_object(raw)
+    raw = prompt_generator.call_llm(
+        system_message,
+        user_message,
+        agent_key="template_selector",
+        response_schema=agent_prompt.template_selector_schema,
+    )
+    parsed = extract_json(raw, dict, schema=agent_prompt.template_selector_schema) or {}
     template_key = parsed.get("template_key")
     reason = parsed.get("reason") or ""
     if isinstance(template_key, str):
         template_key = template_key.strip()
-    if not template_key:
-        return None, reason
+    if not template_key or template_key not in by_key:
+        # Fall back to the best local match rather than the first checked template
+        return top_key, reason
     return template_key, reason
 
 
@@ -308,17 +370,413 @@ def _build_generation_thinking(
 
 
 def _build_generation_user_message(
-    *, original_prompt: str, analysis_results: Any, feedback: Optional[str] = None
+    *,
+    original_prompt: str,
+    analysis_results: Any,
+    feedback: Optional[str] = None,
+    max_tokens: Optional[int] = None,
 ) -> str:
+    analysis_text = compact_analysis(
+        analysis_results,
+        original_prompt=original_prompt,
+        max_tokens=max_tokens or DEFAULT_ANALYSIS_TOKEN_BUDGET,
+    )
     msg = (
         f"The user's prompt\n{original_prompt}\n"
-        f"The analysis result of user's prompt:\n{str(analysis_results)}\n"
+        f"The analysis result of user's prompt:\n{analysis_text}\n"
     )
     if feedback:
         msg = f"{msg}\nThe supplementary information is:\n{feedback}"
     return msg
 
 
+def _build_generation_system_message(template_content: Optional[str]) -> str:
+    import agent_prompt
+
+    if not template_content:
+        return agent_prompt.structuring_prompt
+    return (
+        f"{agent_prompt.structuring_prompt}\n\n"
+        f"# Prompt Framework\n{template_content}\n"
+    )
+
+
+def _template_payload(template_key: str, template_meta: Optional[dict]) -> dict:
+    template_meta = template_meta or {}
+    return {
+        "template_key": template_key,
+        "name": template_meta.get("name"),
+        "description": template_meta.get("description"),
+        "category": template_meta.get("category"),
+        "is_custom": bool(template_meta.get("is_custom")),
+    }
+
+
+def _build_patched_generation_result(
+    user_id: int, *, session: dict, generated_prompt: str
+) -> dict:
+    """
+    Result payload for a generation revised in place, which keeps the previous template.
+    """
+    selected_template_key = session.get("selected_prompt_template_key")
+    templates_map = (
+        _get_prompt_templates_by_keys(user_id, [selected_template_key])
+        if selected_template_key
+        else {}
+    )
+    selected_template_meta = templates_map.get(selected_template_key) or {}
+    candidates_payload = [
+        {
+            "template_key": c.get("template_key"),
+            "name": c.get("name"),
+            "description": c.get("description"),
+            "category": c.get("category"),
+            "is_custom": bool(c.get("is_custom")),
+        }
+        for c in templates_map.values()
+    ]
+    thinking = _build_generation_thinking(
+        candidates=candidates_payload,
+        selected_template_key=selected_template_key,
+        selection_reason=(
+            "Kept the previous template and revised only the sections the feedback touches."
+        ),
+        is_manual_selection=False,
+    )
+    return {
+        "prompt": generated_prompt,
+        "selected_template": {
+            "template_key": selected_template_key,
+            "name": selected_template_meta.get("name"),
+            "description": selected_template_meta.get("description"),
+            "category": selected_template_meta.get("category"),
+            "is_custom": selected_template_meta.get("is_custom"),
+        },
+        "template_candidates": candidates_payload,
+        "thinking": thinking,
+    }
+
+
+def _latest_workflow_inputs(session_id: str, session: dict) -> Tuple[Any, Any]:
+    """
+    The latest structured prompt and analysis results of a session, preferring
+    the persisted messages over the in-memory session.
+    :return: (original_prompt, analysis_results)
+    """
+    from api.database_api import get_messages
+
+    latest_prompt = None
+    latest_analysis_results = None
+    for message in reversed(get_messages(session_id)):
+        if (
+            message.get("step") == "structure"
+            and message.get("type") == "assistant"
+            and latest_prompt is None
+        ):
+            latest_prompt = message.get("content")
+        elif (
+            message.get("step") == "analysis"
+            and message.get("type") == "assistant"
+            and latest_analysis_results is None
+        ):
+            try:
+                latest_analysis_results = json.loads(message.get("content", "{}"))
+            except Exception:
+                latest_analysis_results = message.get("content")
+
+    analysis_results = latest_analysis_results or session.get("analysis_results")
+    original_prompt = latest_prompt or session.get("prompt")
+    return original_prompt, analysis_results
+
+
+def _generate_prompt_result(
+    user_id: int,
+    user_ai_services,
+    *,
+    original_prompt: str,
+    analysis_results: Any,
+    requested_template_key: Optional[str] = None,
+    previous_key: Optional[str] = None,
+) -> dict:
+    """
+    Choose a template and generate the structured prompt without touching the
+    session, so it can also run speculatively.
+    :return: The /generate-prompt result payload.
+    """
+    prompt_generator = processor.PromptGenerator(user_ai_services)
+
+    selected_keys = _get_selected_prompt_template_keys(user_id)
+    keys_to_fetch: list[str] = list(selected_keys)
+    if requested_template_key and requested_template_key not in keys_to_fetch:
+        keys_to_fetch.append(requested_template_key)
+    templates_map = _get_prompt_templates_by_keys(user_id, keys_to_fetch)
+    candidates = [
+        templates_map[k] for k in selected_keys if k in templates_map
+    ]
+
+    selected_template_key: Optional[str] = None
+    selection_reason = ""
+
+    if requested_template_key:
+        selected_template_key = requested_template_key
+    else:
+        llm_selected_key, llm_reason = _choose_template_with_llm(
+            prompt_generator,
+            original_prompt=original_prompt,
+            analysis_results=analysis_results,
+            candidates=candidates,
+            avoid_template_key=previous_key,
+            template_prior=_past_template_prior(user_id, original_prompt),
+        )
+        if llm_selected_key and llm_selected_key in templates_map:
+            selected_template_key = llm_selected_key
+            selection_reason = llm_reason
+        elif candidates:
+            selected_template_key = candidates[0]["template_key"]
+            selection_reason = llm_reason
+
+    template_content = None
+    selected_template_meta = None
+    if selected_template_key:
+        selected_template_meta = templates_map.get(selected_template_key)
+        if selected_template_meta:
+            template_content = selected_template_meta.get("content")
+
+    system_message = _build_generation_system_message(template_content)
+    if not template_content:
+        selected_template_key = (
+            selected_template_key or "built_in_structuring_prompt"
+        )
+        if not requested_template_key and not selection_reason:
+            selection_reason = (
+                "No checked template was available; used the default framework."
+            )
+
+    user_message = _build_generation_user_message(
+        original_prompt=original_prompt,
+        analysis_results=analysis_results,
+        max_tokens=analysis_budget_for(user_ai_services),
+    )
+    generated_prompt = prompt_generator.finalize(
+        prompt_generator.call_llm(system_message, user_message), original_prompt
+    )
+
+    candidates_payload = [
+        {
+            "template_key": c.get("template_key"),
+            "name": c.get("name"),
+            "description": c.get("description"),
+            "category": c.get("category"),
+            "is_custom": bool(c.get("is_custom")),
+        }
+        for c in candidates
+    ]
+
+    thinking = _build_generation_thinking(
+        candidates=candidates_payload,
+        selected_template_key=selected_template_key,
+        selection_reason=selection_reason,
+        is_manual_selection=bool(requested_template_key),
+    )
+
+    return {
+        "prompt": generated_prompt,
+        "selected_template": {
+            "template_key": selected_template_key,
+            "name": (selected_template_meta or {}).get("name"),
+            "description": (selected_template_meta or {}).get("description"),
+            "category": (selected_template_meta or {}).get("category"),
+            "is_custom": (selected_template_meta or {}).get("is_custom"),
+        },
+        "template_candidates": candidates_payload,
+        "thinking": thinking,
+    }
+
+
+def _load_saved_method_selection(
+    user_id: int,
+) -> Tuple[list, Optional[dict], bool]:
+    """
+    The analysis method selection saved in Settings, shaped like the
+    /analyze-elements request the frontend builds from it.
+    :return: (selected_methods, custom_methods, auto_select)
+    """
+    from api.database_api import db, get_user_settings
+
+    auto_select = bool(get_user_settings(user_id).get("autoSelectMode"))
+    rows = db.execute_query(
+        "SELECT method_key, label, description, is_custom, is_selected "
+        "FROM user_analysis_methods WHERE user_id = %s",
+        (user_id,),
+    )
+    selected_methods = (
+        ["auto_select"]
+        if auto_select
+        else [row["method_key"] for row in rows if row.get("is_selected")]
+    )
+    custom_methods = {
+        row["method_key"]: {"label": row["label"], "description": row["description"]}
+        for row in rows
+        if row.get("is_custom")
+    }
+    return selected_methods, custom_methods or None, auto_select
+
+
+def _analysis_inputs_key(
+    prompt: str,
+    selected_methods: Optional[list],
+    custom_methods: Optional[dict],
+    auto_select: Optional[bool],
+    consolidated: Optional[bool],
+) -> str:
+    return inputs_key(
+        prompt,
+        sorted(selected_methods or []),
+        custom_methods or {},
+        bool(auto_select),
+        bool(consolidated),
+    )
+
+
+def _generation_inputs_key(
+    user_id: int,
+    *,
+    original_prompt: str,
+    analysis_results: Any,
+    requested_template_key: Optional[str],
+    previous_key: Optional[str],
+) -> str:
+    return inputs_key(
+        original_prompt,
+        analysis_results,
+        requested_template_key,
+        previous_key,
+        _get_selected_prompt_template_keys(user_id),
+    )
+
+
+def _semantic_context_key(user_ai_services, *inputs: Any) -> str:
+    """
+    Everything besides the prompt that a reusable stage result depends on,
+    including the model that produced it.
+    """
+    model_name = (getattr(user_ai_services, "current_config", None) or {}).get(
+        "model_name"
+    )
+    return inputs_key(model_name, *inputs)
+
+
+def _semantic_cache_lookup(
+    user_id: int, *, stage: str, context_key: str, prompt: str, session_id: str
+) -> Tuple[Optional[float], Optional[dict]]:
+    """
+    Reuse a result stored for a near-identical prompt, for users who opted in.
+    Hits are recorded for auditing.
+    :return: (threshold, or None when the user has not opted in; hit or None)
+    """
+    threshold = semantic_cache_threshold(user_id)
+    if threshold is None or not prompt:
+        return threshold, None
+    try:
+        hit = semantic_cache.lookup(stage, context_key, prompt, threshold)
+        if hit is not None:
+            semantic_cache.record_hit(
+                hit,
+                stage=stage,
+                user_id=user_id,
+                session_id=session_id,
+                threshold=threshold,
+                prompt=prompt,
+            )
+        return threshold, hit
+    except Exception as e:
+        print(f"Warning: Semantic cache lookup failed: {e}")
+        return threshold, None
+
+
+def _semantic_cache_store(
+    user_id: int, *, stage: str, context_key: str, prompt: str, result: Any
+) -> None:
+    try:
+        semantic_cache.store(stage, context_key, prompt, result, user_id)
+    except Exception as e:
+        print(f"Warning: Failed to store semantic cache entry: {e}")
+
+
+def _semantic_hit_message(stage: str, hit: dict) -> str:
+    return (
+        f"Reused the {stage} of a near-identical prompt "
+        f"(similarity {hit['similarity']:.2f})"
+    )
+
+
+def _prefetch_analysis(
+    user_id: int, user_ai_services, *, session_id: str, session: dict
+) -> None:
+    """
+    Start analysing an accepted prompt with the saved method selection, for users
+    who opted into speculative prefetch.
+    """
+    try:
+        if not prefetch_enabled(user_id) or not session.get("prompt"):
+            return
+        selected_methods, custom_methods, auto_select = _load_saved_method_selection(
+            user_id
+        )
+        if not selected_methods:
+            return
+        speculative_cache.schedule(
+            session_id,
+            "analysis",
+            _analysis_inputs_key(
+                session["prompt"], selected_methods, custom_methods, auto_select, False
+            ),
+            processor.ElementsAnalyzer(user_ai_services).run,
+            session["prompt"],
+            selected_methods=selected_methods,
+            custom_methods=custom_methods,
+            auto_select=auto_select,
+            consolidated=False,
+        )
+    except Exception as e:
+        print(f"Warning: Failed to prefetch analysis: {e}")
+
+
+def _prefetch_generation(
+    user_id: int, user_ai_services, *, session_id: str, session: dict
+) -> None:
+    """
+    Start generating from accepted analysis results, for users who opted into
+    speculative prefetch.
+    """
+    try:
+        if not prefetch_enabled(user_id) or user_ai_services is None:
+            return
+        original_prompt, analysis_results = _latest_workflow_inputs(session_id, session)
+        if not original_prompt or not analysis_results:
+            return
+        previous_key = session.get("selected_prompt_template_key")
+        speculative_cache.schedule(
+            session_id,
+            "generation",
+            _generation_inputs_key(
+                user_id,
+                original_prompt=original_prompt,
+                analysis_results=analysis_results,
+                requested_template_key=None,
+                previous_key=previous_key,
+            ),
+            _generate_prompt_result,
+            user_id,
+            user_ai_services,
+            original_prompt=original_prompt,
+            analysis_results=analysis_results,
+            previous_key=previous_key,
+        )
+    except Exception as e:
+        print(f"Warning: Failed to prefetch generation: {e}")
+
+
 @router.post("/check-structure", response_model=ApiResponse)
 async def check_structure(
     user_input: UserInput, user_id: int = Depends(get_current_user_id)
@@ -363,6 +821,12 @@ async def check_structure(
 
         if end_flag == "OK":
             session["prompt"] = answer
+            _prefetch_analysis(
+                user_id,
+                user_ai_services,
+                session_id=user_input.session_id,
+                session=session,
+            )
         elif end_flag == "CLARIFY":
             end_flag = "NEED_CLARIFICATION"
         else:
@@ -455,6 +919,12 @@ async def structure_feedback(
 
             if end_flag == "OK":
                 session["prompt"] = answer
+                _prefetch_analysis(
+                    user_id,
+                    user_ai_services,
+                    session_id=user_input.session_id,
+                    session=session,
+                )
             elif end_flag == "CLARIFY":
                 end_flag = "NEED_CLARIFICATION"
             else:
@@ -493,6 +963,12 @@ async def structure_feedback(
 
         if end_flag == "OK":
             session["prompt"] = answer
+            _prefetch_analysis(
+                user_id,
+                user_ai_services,
+                session_id=user_input.session_id,
+                session=session,
+            )
         elif end_flag == "CLARIFY":
             end_flag = "NEED_CLARIFICATION"
 
@@ -541,19 +1017,62 @@ async def analyze_elements(
 
         prompt_to_analyze = session["prompt"]
 
-        analysis_results = elements_analyzer.run(
-            prompt_to_analyze,
-            selected_methods=user_input.selected_methods,
-            custom_methods=user_input.custom_methods,
-            auto_select=user_input.auto_select,
+        analysis_results = speculative_cache.take(
+            user_input.session_id,
+            "analysis",
+            _analysis_inputs_key(
+                prompt_to_analyze,
+                user_input.selected_methods,
+                user_input.custom_methods,
+                user_input.auto_select,
+                user_input.consolidated,
+            ),
+        )
+        semantic_threshold, semantic_hit = None, None
+        semantic_key = _semantic_context_key(
+            user_ai_services,
+            sorted(user_input.selected_methods or []),
+            user_input.custom_methods or {},
+            bool(user_input.auto_select),
+            bool(user_input.consolidated),
         )
+        if analysis_results is None:
+            semantic_threshold, semantic_hit = _semantic_cache_lookup(
+                user_id,
+                stage="analysis",
+                context_key=semantic_key,
+                prompt=prompt_to_analyze,
+                session_id=user_input.session_id,
+            )
+            if semantic_hit is not None:
+                analysis_results = semantic_hit["result"]
+        if analysis_results is None:
+            analysis_results = elements_analyzer.run(
+                prompt_to_analyze,
+                selected_methods=user_input.selected_methods,
+                custom_methods=user_input.custom_methods,
+                auto_select=user_input.auto_select,
+                consolidated=bool(user_input.consolidated),
+            )
+            if semantic_threshold is not None:
+                _semantic_cache_store(
+                    user_id,
+                    stage="analysis",
+                    context_key=semantic_key,
+                    prompt=prompt_to_analyze,
+                    result=analysis_results,
+                )
 
         session["analysis_results"] = analysis_results
         session["selected_methods"] = user_input.selected_methods
         session["custom_methods"] = user_input.custom_methods
         session["auto_select"] = user_input.auto_select
+        session["consolidated_analysis"] = bool(user_input.consolidated)
 
-        return {"status": "success", "result": analysis_results}
+        response = {"status": "success", "result": analysis_results}
+        if semantic_hit is not None:
+            response["message"] = _semantic_hit_message("analysis", semantic_hit)
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -567,6 +1086,12 @@ async def analysis_feedback(
 
         session = session_store.get_session(feedback.session_id)
         if feedback.feedback.lower() == "yes":
+            _prefetch_generation(
+                user_id,
+                get_user_ai_services(user_id),
+                session_id=feedback.session_id,
+                session=session,
+            )
             return {
                 "status": "success",
                 "result": session["analysis_results"],
@@ -610,13 +1135,23 @@ async def analysis_feedback(
 
         prompt_to_analyze = latest_prompt or session.get("prompt")
 
+        previous_results = session.get("analysis_results") or []
         selected_methods = session.get("selected_methods")
+        if session.get("auto_select") or not selected_methods:
+            # Re-run the methods that produced the current analysis
+            selected_methods = [
+                item["agent_key"]
+                for item in previous_results
+                if isinstance(item, dict) and item.get("agent_key")
+            ] or selected_methods
         custom_methods = session.get("custom_methods")
         analysis_results = elements_analyzer.run(
             prompt=prompt_to_analyze,
             feedback=feedback.content,
             selected_methods=selected_methods,
             custom_methods=custom_methods,
+            previous_results=previous_results,
+            consolidated=bool(session.get("consolidated_analysis")),
         )
         session["analysis_results"] = analysis_results
 
@@ -636,144 +1171,199 @@ async def generate_prompt(
             missing_fields=MODEL_CONFIG_MISSING_FIELDS,
         )
 
-        from api.database_api import get_messages
-
         session = session_store.get_session(user_input.session_id)
-        prompt_generator = processor.PromptGenerator(user_ai_services)
-
-        messages = get_messages(user_input.session_id)
-
-        latest_prompt = None
-        latest_analysis_results = None
-
-        for message in reversed(messages):
-            if (
-                message.get("step") == "structure"
-                and message.get("type") == "assistant"
-                and latest_prompt is None
-            ):
-                latest_prompt = message.get("content")
-            elif (
-                message.get("step") == "analysis"
-                and message.get("type") == "assistant"
-                and latest_analysis_results is None
-            ):
-                try:
-                    latest_analysis_results = json.loads(
-                        message.get("content", "{}")
-                    )
-                except Exception:
-                    latest_analysis_results = message.get("content")
-
-        analysis_results = latest_analysis_results or session.get(
-            "analysis_results"
+        original_prompt, analysis_results = _latest_workflow_inputs(
+            user_input.session_id, session
         )
-        original_prompt = latest_prompt or session.get("prompt")
         requested_template_key = (
             user_input.template_key.strip()
             if isinstance(user_input.template_key, str)
             and user_input.template_key.strip()
             else None
         )
+        previous_key = session.get("selected_prompt_template_key")
 
-        selected_keys = _get_selected_prompt_template_keys(user_id)
-        keys_to_fetch: list[str] = list(selected_keys)
-        if requested_template_key and requested_template_key not in keys_to_fetch:
-            keys_to_fetch.append(requested_template_key)
-        templates_map = _get_prompt_templates_by_keys(user_id, keys_to_fetch)
-        candidates = [
-            templates_map[k] for k in selected_keys if k in templates_map
-        ]
-
-        selected_template_key: Optional[str] = None
-        selection_reason = ""
-
-        if requested_template_key:
-            selected_template_key = requested_template_key
-        else:
-            previous_key = session.get("selected_prompt_template_key")
-            llm_selected_key, llm_reason = _choose_template_with_llm(
-                prompt_generator,
+        result_payload = speculative_cache.take(
+            user_input.session_id,
+            "generation",
+            _generation_inputs_key(
+                user_id,
+                original_prompt=original_prompt,
+                analysis_results=analysis_results,
+                requested_template_key=requested_template_key,
+                previous_key=previous_key,
+            ),
+        )
+        semantic_threshold, semantic_hit = None, None
+        semantic_key = _semantic_context_key(
+            user_ai_services,
+            analysis_results,
+            requested_template_key,
+            previous_key,
+            _get_selected_prompt_template_keys(user_id),
+        )
+        if result_payload is None:
+            semantic_threshold, semantic_hit = _semantic_cache_lookup(
+                user_id,
+                stage="generation",
+                context_key=semantic_key,
+                prompt=original_prompt,
+                session_id=user_input.session_id,
+            )
+            if semantic_hit is not None:
+                result_payload = semantic_hit["result"]
+        if result_payload is None:
+            result_payload = _generate_prompt_result(
+                user_id,
+                user_ai_services,
                 original_prompt=original_prompt,
                 analysis_results=analysis_results,
-                candidates=candidates,
-                avoid_template_key=previous_key,
+                requested_template_key=requested_template_key,
+                previous_key=previous_key,
             )
-            if llm_selected_key and llm_selected_key in templates_map:
-                selected_template_key = llm_selected_key
-                selection_reason = llm_reason
-            elif candidates:
-                selected_template_key = candidates[0]["template_key"]
-                selection_reason = llm_reason
+            if semantic_threshold is not None:
+                _semantic_cache_store(
+                    user_id,
+                    stage="generation",
+                    context_key=semantic_key,
+                    prompt=original_prompt,
+                    result=result_payload,
+                )
 
-        template_content = None
-        selected_template_meta = None
-        if selected_template_key:
-            selected_template_meta = templates_map.get(selected_template_key)
-            if selected_template_meta:
-                template_content = selected_template_meta.get("content")
+        session["generated_prompt"] = result_payload["prompt"]
+        session["selected_prompt_template_key"] = result_payload[
+            "selected_template"
+        ]["template_key"]
 
-        import agent_prompt
+        response = {"status": "success", "result": result_payload}
+        if semantic_hit is not None:
+            response["message"] = _semantic_hit_message("generation", semantic_hit)
+        return response
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        base_system_prompt = agent_prompt.structuring_prompt
-        if template_content:
-            system_message = (
-                f"{base_system_prompt}\n\n"
-                f"# Prompt Framework\n{template_content}\n"
+
+@router.post("/generate-prompt-candidates", response_model=ApiResponse)
+async def generate_prompt_candidates(
+    user_input: UserInput, user_id: int = Depends(get_current_user_id)
+):
+    """
+    Generate one candidate per template concurrently: the templates named in
+    `template_keys`, or the `candidate_count` best-ranked checked templates.
+    Every candidate is stored as a prompt version.
+    """
+    try:
+        user_ai_services = _require_ai_services(
+            user_id,
+            message=MODEL_CONFIG_MISSING_MESSAGE,
+            missing_fields=MODEL_CONFIG_MISSING_FIELDS,
+        )
+
+        session = session_store.get_session(user_input.session_id)
+        original_prompt, analysis_results = _latest_workflow_inputs(
+            user_input.session_id, session
+        )
+
+        requested_keys = list(
+            dict.fromkeys(
+                k.strip()
+                for k in (user_input.template_keys or [])
+                if isinstance(k, str) and k.strip()
             )
+        )
+        selected_keys = _get_selected_prompt_template_keys(user_id)
+        templates_map = _get_prompt_templates_by_keys(
+            user_id, list(dict.fromkeys(selected_keys + requested_keys))
+        )
+        if requested_keys:
+            template_keys = [k for k in requested_keys if k in templates_map]
         else:
-            system_message = base_system_prompt
-            selected_template_key = (
-                selected_template_key or "built_in_structuring_prompt"
+            ranked = rank_templates(
+                [templates_map[k] for k in selected_keys if k in templates_map],
+                original_prompt=original_prompt,
+                analysis_results=analysis_results,
+                prior=_past_template_prior(user_id, original_prompt),
+            )
+            template_keys = [
+                key
+                for key, _ in ranked[
+                    : user_input.candidate_count or GENERATION_CANDIDATES_DEFAULT_K
+                ]
+            ]
+        template_keys = template_keys[:GENERATION_CANDIDATES_MAX]
+        if not template_keys:
+            raise HTTPException(
+                status_code=400, detail="No prompt templates available to compare"
             )
-            if not requested_template_key and not selection_reason:
-                selection_reason = (
-                    "No checked template was available; used the default framework."
-                )
 
+        # Every candidate shares the user message; only the framework differs
         user_message = _build_generation_user_message(
             original_prompt=original_prompt,
             analysis_results=analysis_results,
+            max_tokens=analysis_budget_for(user_ai_services),
         )
-        generated_prompt = (
-            prompt_generator.call_llm(system_message, user_message).replace("```", "")
+        prompt_generator = processor.PromptGenerator(user_ai_services)
+        responses = prompt_generator.call_llm_many(
+            [
+                (
+                    _build_generation_system_message(
+                        templates_map[key].get("content")
+                    ),
+                    user_message,
+                )
+                for key in template_keys
+            ],
+            return_exceptions=True,
         )
 
-        session["generated_prompt"] = generated_prompt
-        session["selected_prompt_template_key"] = selected_template_key
-
-        candidates_payload = [
-            {
-                "template_key": c.get("template_key"),
-                "name": c.get("name"),
-                "description": c.get("description"),
-                "category": c.get("category"),
-                "is_custom": bool(c.get("is_custom")),
-            }
-            for c in candidates
+        candidates = []
+        for key, response in zip(template_keys, responses):
+            if isinstance(response, Exception):
+                print(f"Warning: Generation with template {key} failed: {response}")
+                continue
+            candidates.append(
+                {
+                    "prompt": prompt_generator.finalize(response, original_prompt),
+                    "selected_template": _template_payload(key, templates_map[key]),
+                }
+            )
+        if not candidates:
+            raise Exception("Generation failed for every template")
+
+        candidate_group = uuid.uuid4().hex
+        try:
+            stored = add_session_versions(
+                user_input.session_id,
+                [
+                    VersionInput(
+                        prompt_content=candidate["prompt"],
+                        # Alternatives, not the session's single "original" row
+                        version_type="user_modified",
+                        metadata={
+                            "source": "multi_template_generation",
+                            "candidate_group": candidate_group,
+                            "template_key": candidate["selected_template"]["template_key"],
+                            "template_name": candidate["selected_template"]["name"],
+                        },
+                    )
+                    for candidate in candidates
+                ],
+            )
+        except Exception as e:
+            print(f"Warning: Failed to store generation candidates: {e}")
+            stored = [{"version_id": None, "version_number": None}] * len(candidates)
+        for candidate, version in zip(candidates, stored):
+            candidate.update(version)
+
+        session["generated_prompt"] = candidates[0]["prompt"]
+        session["selected_prompt_template_key"] = candidates[0]["selected_template"][
+            "template_key"
         ]
 
-        thinking = _build_generation_thinking(
-            candidates=candidates_payload,
-            selected_template_key=selected_template_key,
-            selection_reason=selection_reason,
-            is_manual_selection=bool(requested_template_key),
-        )
-
-        result_payload = {
-            "prompt": generated_prompt,
-            "selected_template": {
-                "template_key": selected_template_key,
-                "name": (selected_template_meta or {}).get("name"),
-                "description": (selected_template_meta or {}).get("description"),
-                "category": (selected_template_meta or {}).get("category"),
-                "is_custom": (selected_template_meta or {}).get("is_custom"),
-            },
-            "template_candidates": candidates_payload,
-            "thinking": thinking,
+        return {
+            "status": "success",
+            "result": {"candidate_group": candidate_group, "candidates": candidates},
         }
-
-        return {"status": "success", "result": result_payload}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -783,8 +1373,6 @@ async def generation_feedback(
     feedback: UserFeedback, user_id: int = Depends(get_current_user_id)
 ):
     try:
-        from api.database_api import get_messages
-
         session = session_store.get_session(feedback.session_id)
 
         if feedback.feedback.lower() == "yes":
@@ -800,35 +1388,28 @@ async def generation_feedback(
             missing_fields=MODEL_CONFIG_MISSING_FIELDS,
         )
 
-        prompt_generator = processor.PromptGenerator(user_ai_services)
-        messages = get_messages(feedback.session_id)
-
-        latest_prompt = None
-        latest_analysis_results = None
-
-        for message in reversed(messages):
-            if (
-                message.get("step") == "structure"
-                and message.get("type") == "assistant"
-                and latest_prompt is None
-            ):
-                latest_prompt = message.get("content")
-            elif (
-                message.get("step") == "analysis"
-                and message.get("type") == "assistant"
-                and latest_analysis_results is None
-            ):
-                try:
-                    latest_analysis_results = json.loads(
-                        message.get("content", "{}")
-                    )
-                except Exception:
-                    latest_analysis_results = message.get("content")
+        previous_prompt = session.get("generated_prompt")
+        if feedback.revision_mode == "patch" and previous_prompt:
+            patched_prompt = processor.PromptPatcher(user_ai_services).run(
+                previous_prompt,
+                feedback.content or feedback.feedback,
+                context="Keep the selected template's sections and ordering.",
+            )
+            if patched_prompt:
+                session["generated_prompt"] = patched_prompt
+                return {
+                    "status": "success",
+                    "result": _build_patched_generation_result(
+                        user_id,
+                        session=session,
+                        generated_prompt=patched_prompt,
+                    ),
+                }
 
-        analysis_results = latest_analysis_results or session.get(
-            "analysis_results"
+        prompt_generator = processor.PromptGenerator(user_ai_services)
+        original_prompt, analysis_results = _latest_workflow_inputs(
+            feedback.session_id, session
         )
-        original_prompt = latest_prompt or session.get("prompt")
         selected_keys = _get_selected_prompt_template_keys(user_id)
         previous_key = session.get("selected_prompt_template_key")
         templates_map = _get_prompt_templates_by_keys(user_id, selected_keys)
@@ -841,6 +1422,7 @@ async def generation_feedback(
             candidates=candidates,
             feedback=feedback.content or feedback.feedback,
             avoid_template_key=previous_key,
+            template_prior=_past_template_prior(user_id, original_prompt),
         )
 
         selected_template_key: Optional[str] = None
@@ -877,9 +1459,10 @@ async def generation_feedback(
             original_prompt=original_prompt,
             analysis_results=analysis_results,
             feedback=feedback.content,
+            max_tokens=analysis_budget_for(user_ai_services),
         )
-        generated_prompt = (
-            prompt_generator.call_llm(system_message, user_message).replace("```", "")
+        generated_prompt = prompt_generator.finalize(
+            prompt_generator.call_llm(system_message, user_message), original_prompt
         )
 
         session["generated_prompt"] = generated_prompt
@@ -976,20 +1559,21 @@ async def optimize_prompt(
             optimization_prompt,
             include_thinking=True,
             temperature=0.3,
+            n=user_input.candidate_count or 1,
         )
         optimized_prompt = optimization_result["optimized_prompt"]
         thinking_process = optimization_result["thinking"]
 
         session["optimized_prompt"] = optimized_prompt
 
-        return {
-            "status": "success",
-            "result": {
-                "optimized_prompt": optimized_prompt,
-                "thinking": thinking_process,
-                "original_prompt": prompt_to_optimize,
-            },
+        result = {
+            "optimized_prompt": optimized_prompt,
+            "thinking": thinking_process,
+            "original_prompt": prompt_to_optimize,
         }
+        if optimization_result.get("candidates"):
+            result["candidates"] = optimization_result["candidates"]
+        return {"status": "success", "result": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1038,6 +1622,17 @@ async def optimization_feedback(
             )
 
         feedback_text = feedback.content or feedback.feedback
+        previous_optimized = session.get("optimized_prompt")
+        if feedback.revision_mode == "patch" and previous_optimized:
+            patched_prompt = processor.PromptPatcher(user_ai_services).run(
+                previous_optimized,
+                feedback_text,
+                context=optimization_prompt,
+            )
+            if patched_prompt:
+                session["optimized_prompt"] = patched_prompt
+                return {"status": "success", "result": patched_prompt}
+
         prompt_optimizer = processor.PromptOptimizer(user_ai_services)
         optimized_prompt = prompt_optimizer.run(
             prompt_to_optimize,
@@ -1125,3 +1720,51 @@ async def decode_insights(
         return {"status": "success", "result": decoded_insights}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/semantic-cache/hits", response_model=ApiResponse)
+async def semantic_cache_hits(
+    limit: int = 100, user_id: int = Depends(get_current_user_id)
+):
+    """
+    Recent reuses of near-duplicate results for the current user, with the
+    prompt each reused result was originally computed for when the user
+    stored it themselves.
+    """
+    try:
+        return {
+            "status": "success",
+            "result": recent_hits(user_id, limit=max(1, min(limit, 500))),
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/similar-prompts", response_model=ApiResponse)
+async def similar_prompts(
+    payload: SimilarPromptsInput, user_id: int = Depends(get_current_user_id)
+):
+    """
+    The current user's past prompt versions most similar to `prompt` (or to the
+    session's prompt), one per session, excluding the session itself.
+    """
+    try:
+        text = payload.prompt
+        if not text and payload.session_id:
+            session = session_store.get_session(payload.session_id)
+            text = session.get("generated_prompt") or session.get("prompt")
+        if not text:
+            raise HTTPException(status_code=400, detail="prompt or session_id is required")
+        return {
+            "status": "success",
+            "result": prompt_index.similar_prompts(
+                user_id,
+                text,
+                limit=max(1, min(payload.limit or 5, 20)),
+                exclude_session_id=payload.session_id,
+            ),
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
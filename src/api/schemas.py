@@ -15,6 +15,12 @@ class UserInput(BaseModel):
     custom_methods: Optional[Dict[str, Dict[str, str]]] = None
     auto_select: Optional[bool] = False
     template_key: Optional[str] = None
+    # Multi-template generation: explicit templates, or how many top-ranked ones
+    template_keys: Optional[List[str]] = None
+    # Candidates to produce (generation candidates, best-of-n optimization)
+    candidate_count: Optional[int] = None
+    # Discard the session's stored test cases and generate new ones
+    refresh_test_cases: Optional[bool] = False
 
 
 class AnalysisInput(BaseModel):
@@ -22,12 +28,16 @@ class AnalysisInput(BaseModel):
     selected_methods: Optional[List[str]] = None
     custom_methods: Optional[Dict[str, Dict[str, str]]] = None
     auto_select: Optional[bool] = False
+    # One structured request for all methods instead of one request each
+    consolidated: Optional[bool] = False
 
 
 class UserFeedback(BaseModel):
     session_id: str
     feedback: str
     content: Optional[str] = None
+    # "full" regenerates; "patch" (opt-in) revises only the sections the feedback touches
+    revision_mode: Optional[str] = "full"
 
 
 class VersionInput(BaseModel):
@@ -48,6 +58,19 @@ class ChatTestInput(BaseModel):
     session_id: str
     version_number: int
     user_message: str
+    # Variance mode: sample this many responses and persist them as one turn
+    samples: Optional[int] = None
+    # Multi-turn mode: earlier turns of this version's chat test are loaded server-side
+    multi_turn: Optional[bool] = False
+    history_token_budget: Optional[int] = None
+
+
+class ChatTestBroadcastInput(BaseModel):
+    session_id: str
+    version_ids: List[int]
+    user_message: str
+    multi_turn: Optional[bool] = False
+    history_token_budget: Optional[int] = None
 
 
 class ChatMessageInput(BaseModel):
@@ -93,6 +116,37 @@ class ChatTestDiffAnalysisGetInput(BaseModel):
     right_version_id: int
 
 
+class RankVersionsInput(BaseModel):
+    session_id: str
+    # All versions of the session when omitted
+    version_ids: Optional[List[int]] = None
+    # Taken from the session's test case library when omitted
+    test_cases: Optional[List[str]] = None
+    test_case_count: Optional[int] = 5
+    refresh_test_cases: Optional[bool] = False
+
+
+class RegressionReplayInput(BaseModel):
+    session_ids: List[str]
+    # Latest version of each session when omitted
+    version_number: Optional[int] = None
+    # Only replay messages originally sent to this version
+    source_version_id: Optional[int] = None
+    # Target model name on the configured endpoint; current model when omitted
+    target_model: Optional[str] = None
+    # Resume an earlier run instead of starting a new one
+    run_id: Optional[str] = None
+    # Capped at REPLAY_MAX_CONCURRENCY
+    max_concurrency: Optional[int] = None
+
+
+class SimilarPromptsInput(BaseModel):
+    # Text to match; defaults to the session's current prompt
+    prompt: Optional[str] = None
+    session_id: Optional[str] = None
+    limit: Optional[int] = 5
+
+
 class ApiResponse(BaseModel):
     status: str
     result: Any
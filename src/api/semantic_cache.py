@@ -0,0 +1,254 @@
+"""
+Opt-in reuse of analysis and generation results across near-identical prompts.
+
+Prompts are normalized (case, punctuation, whitespace) and fingerprinted with
+MinHash over word shingles; a banded LSH index per stage finds candidates,
+which are verified with the exact shingle Jaccard similarity before a stored
+result is reused. Entries are shared between users who opted in, so a cohort
+submitting the same exercise pays for it once. Every reuse is recorded in
+`semantic_cache_hits` for auditing.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.utils.similarity import MinHasher, MinHashLSH, jaccard, normalize_text, shingles
+
+# user_settings keys: opt-in flag and the similarity needed for reuse
+SEMANTIC_CACHE_SETTING_KEY = "semanticCache"
+SEMANTIC_CACHE_THRESHOLD_KEY = "semanticCacheThreshold"
+DEFAULT_SIMILARITY_THRESHOLD = 0.85
+# Below this, reused results would too often belong to a different prompt
+MIN_SIMILARITY_THRESHOLD = 0.7
+# Word pairs: a one-word edit changes few shingles even in short prompts
+SHINGLE_SIZE = 2
+NUM_PERM = 128
+# 32 bands of 4 rows: pairs at 0.7 similarity are candidates with p > 0.999
+LSH_BANDS = 32
+# Most recent entries per stage kept in the in-memory index
+INDEX_SIZE = 5000
+
+_hasher = MinHasher(num_perm=NUM_PERM)
+
+
+def _db():
+    from api.database_api import db
+
+    return db
+
+
+def _text_hash(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def semantic_cache_threshold(user_id: int) -> Optional[float]:
+    """
+    :return: The user's reuse threshold, or None when they have not opted in.
+    """
+    try:
+        from api.database_api import get_user_settings
+
+        settings = get_user_settings(user_id)
+    except Exception:
+        return None
+    if not settings.get(SEMANTIC_CACHE_SETTING_KEY):
+        return None
+    try:
+        threshold = float(
+            settings.get(SEMANTIC_CACHE_THRESHOLD_KEY, DEFAULT_SIMILARITY_THRESHOLD)
+        )
+    except (TypeError, ValueError):
+        threshold = DEFAULT_SIMILARITY_THRESHOLD
+    return min(max(threshold, MIN_SIMILARITY_THRESHOLD), 1.0)
+
+
+class _StageIndex:
+    """
+    LSH index over one stage's entries, plus an exact-text lookup.
+    """
+
+    def __init__(self):
+        self.lsh = MinHashLSH(num_perm=NUM_PERM, bands=LSH_BANDS)
+        # entry id -> (context_key, shingle set), oldest first
+        self.entries: "OrderedDict[int, Tuple[str, frozenset]]" = OrderedDict()
+        self.exact: Dict[Tuple[str, str], int] = {}
+        self.last_id = 0
+
+    def add(self, entry_id: int, context_key: str, normalized: str, signature) -> None:
+        if entry_id in self.entries:
+            return
+        self.lsh.insert(entry_id, signature)
+        self.entries[entry_id] = (context_key, frozenset(shingles(normalized, SHINGLE_SIZE)))
+        self.exact[(context_key, _text_hash(normalized))] = entry_id
+        self.last_id = max(self.last_id, entry_id)
+        while len(self.entries) > INDEX_SIZE:
+            old_id, _ = self.entries.popitem(last=False)
+            self.lsh.remove(old_id)
+        if len(self.exact) > 2 * INDEX_SIZE:
+            self.exact = {k: v for k, v in self.exact.items() if v in self.entries}
+
+
+class SemanticCache:
+    def __init__(self):
+        self._indexes: Dict[str, _StageIndex] = {}
+        self._lock = threading.Lock()
+
+    def _sync(self, stage: str) -> _StageIndex:
+        """
+        Load entries written since the last sync, including those written by
+        other worker processes.
+        """
+        with self._lock:
+            index = self._indexes.setdefault(stage, _StageIndex())
+            last_id = index.last_id
+        rows = _db().execute_query(
+            "SELECT id, context_key, normalized_text, signature FROM ("
+            "SELECT id, context_key, normalized_text, signature FROM semantic_cache_entries "
+            "WHERE stage = %s AND id > %s ORDER BY id DESC LIMIT %s"
+            ") recent ORDER BY id ASC",
+            (stage, last_id, INDEX_SIZE),
+        )
+        if rows:
+            with self._lock:
+                for row in rows:
+                    signature = row["signature"]
+                    if isinstance(signature, str):
+                        signature = json.loads(signature)
+                    index.add(row["id"], row["context_key"], row["normalized_text"], signature)
+        return index
+
+    def lookup(
+        self, stage: str, context_key: str, prompt: str, threshold: float
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Find a stored result for a prompt at least `threshold` similar to
+        `prompt`, computed from the same `context_key` (the stage's other inputs).
+        :return: {"entry_id", "similarity", "result"}, or None on a miss.
+        """
+        normalized = normalize_text(prompt)
+        if not normalized:
+            return None
+        index = self._sync(stage)
+        with self._lock:
+            entry_id = index.exact.get((context_key, _text_hash(normalized)))
+            similarity = 1.0
+            if entry_id is None:
+                features = shingles(normalized, SHINGLE_SIZE)
+                candidates = index.lsh.query(_hasher.signature(features))
+                similarity = 0.0
+                for candidate in candidates:
+                    candidate_context, candidate_features = index.entries[candidate]
+                    if candidate_context != context_key:
+                        continue
+                    # Verify exactly; the MinHash estimate only finds candidates
+                    score = jaccard(features, candidate_features)
+                    if score >= threshold and score > similarity:
+                        entry_id, similarity = candidate, score
+        if entry_id is None:
+            return None
+        rows = _db().execute_query(
+            "SELECT result FROM semantic_cache_entries WHERE id = %s", (entry_id,)
+        )
+        if not rows:
+            return None
+        result = rows[0]["result"]
+        if isinstance(result, str):
+            result = json.loads(result)
+        return {"entry_id": entry_id, "similarity": round(similarity, 4), "result": result}
+
+    def store(
+        self, stage: str, context_key: str, prompt: str, result: Any, user_id: int
+    ) -> None:
+        normalized = normalize_text(prompt)
+        if not normalized:
+            return
+        signature = list(_hasher.signature(shingles(normalized, SHINGLE_SIZE)))
+        ok = _db().execute_update(
+            "INSERT INTO semantic_cache_entries "
+            "(stage, context_key, text_hash, normalized_text, signature, result, user_id) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE result = VALUES(result), user_id = VALUES(user_id)",
+            (
+                stage,
+                context_key,
+                _text_hash(normalized),
+                normalized,
+                json.dumps(signature),
+                json.dumps(result, ensure_ascii=False, default=str),
+                user_id,
+            ),
+        )
+        if not ok:
+            raise Exception("Failed to store semantic cache entry")
+        # Picks up the new row (and any from other workers) for this process
+        self._sync(stage)
+
+    def record_hit(
+        self,
+        hit: Dict[str, Any],
+        *,
+        stage: str,
+        user_id: int,
+        session_id: Optional[str],
+        threshold: float,
+        prompt: str,
+    ) -> None:
+        _db().execute_update(
+            "INSERT INTO semantic_cache_hits "
+            "(entry_id, stage, user_id, session_id, similarity, threshold, prompt) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            (hit["entry_id"], stage, user_id, session_id, hit["similarity"], threshold, prompt),
+        )
+
+
+def recent_hits(user_id: int, limit: int = 100) -> Dict[str, Any]:
+    """
+    A user's recent reuses. The prompt a reused result was computed for is
+    included only when that entry was stored by the same user; entries from
+    other users are identified by id and similarity alone.
+    """
+    db = _db()
+    rows = db.execute_query(
+        "SELECT h.id, h.entry_id, h.stage, h.session_id, h.similarity, h.threshold, "
+        "h.prompt, h.created_at, "
+        "CASE WHEN e.user_id = h.user_id THEN e.normalized_text END AS source_text "
+        "FROM semantic_cache_hits h JOIN semantic_cache_entries e ON e.id = h.entry_id "
+        "WHERE h.user_id = %s ORDER BY h.id DESC LIMIT %s",
+        (user_id, limit),
+    )
+    totals = db.execute_query(
+        "SELECT stage, COUNT(*) AS hits, AVG(similarity) AS mean_similarity, "
+        "MIN(similarity) AS min_similarity FROM semantic_cache_hits "
+        "WHERE user_id = %s GROUP BY stage",
+        (user_id,),
+    )
+    hits: List[Dict[str, Any]] = []
+    for row in rows:
+        created_at = row.get("created_at")
+        if row.get("source_text") is None:
+            row.pop("source_text", None)
+        hits.append(
+            {
+                **row,
+                "similarity": float(row["similarity"]),
+                "threshold": float(row["threshold"]),
+                "created_at": created_at.isoformat() if created_at else None,
+            }
+        )
+    return {
+        "hits": hits,
+        "by_stage": [
+            {
+                "stage": row["stage"],
+                "hits": int(row["hits"]),
+                "mean_similarity": round(float(row["mean_similarity"] or 0), 4),
+                "min_similarity": round(float(row["min_similarity"] or 0), 4),
+            }
+            for row in totals
+        ],
+    }
+
+
+semantic_cache = SemanticCache()
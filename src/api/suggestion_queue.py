@@ -0,0 +1,263 @@
+"""
+Improvement suggestions for chat test turns, computed off the request path.
+
+Turns sent to the same version within a short window are batched into a
+single suggestion call; results are attached to the assistant message's
+metadata once the message is saved and the suggestions are ready.
+"""
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import agent_prompt
+from core.processor.basic_handler import BasicHandler
+from core.utils.json_extract import extract_json
+
+# Turns arriving within this window are batched into one call
+SUGGESTION_BATCH_WINDOW_S = 1.5
+SUGGESTION_MAX_BATCH = 4
+MAX_SUGGESTIONS = 5
+MAX_TRACKED_JOBS = 2000
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="suggestions")
+
+
+def parse_suggestions(text: str, schema: dict) -> list:
+    # Accept both {"suggestions": [...]} and a bare list from older prompts
+    parsed = extract_json(text, schema=schema)
+    if isinstance(parsed, dict):
+        parsed = parsed.get("suggestions")
+    return parsed if isinstance(parsed, list) else []
+
+
+def _turn_message(system_prompt: str, user_message: str, response: str) -> str:
+    return (
+        f"System prompt:\n{system_prompt}\n\n"
+        f"User test message:\n{user_message}\n\n"
+        f"Model response:\n{response}\n"
+    )
+
+
+def _single_turn(handler: BasicHandler, system_prompt: str, turn: Tuple[str, str]) -> list:
+    schema = agent_prompt.validation_prompt_suggestions_schema
+    raw = handler.call_llm(
+        agent_prompt.validation_prompt_suggestions_system_prompt,
+        _turn_message(system_prompt, *turn),
+        agent_key="validation_prompt_suggestions",
+        response_schema=schema,
+    )
+    suggestions = parse_suggestions(raw, schema)
+    if not suggestions:
+        suggestions = parse_suggestions(handler.repair_json_output(raw), schema)
+    return suggestions[:MAX_SUGGESTIONS]
+
+
+def generate_suggestions(
+    handler: BasicHandler, system_prompt: str, turns: Sequence[Tuple[str, str]]
+) -> List[list]:
+    """
+    Suggestions for several (user message, response) turns of one prompt.
+    Several turns share one call; turns missing from its output are retried
+    one by one.
+    :return: One suggestion list per turn, in order.
+    """
+    if not turns:
+        return []
+    if len(turns) == 1:
+        return [_single_turn(handler, system_prompt, turns[0])]
+
+    schema = agent_prompt.validation_prompt_suggestions_batch_schema
+    user_message = f"System prompt:\n{system_prompt}\n\n" + "\n".join(
+        f"=== Turn {i} ===\nUser test message:\n{message}\n\nModel response:\n{response}\n"
+        for i, (message, response) in enumerate(turns, start=1)
+    )
+    by_turn: Dict[int, list] = {}
+    try:
+        raw = handler.call_llm(
+            agent_prompt.validation_prompt_suggestions_batch_system_prompt,
+            user_message,
+            agent_key="validation_prompt_suggestions_batch",
+            response_schema=schema,
+        )
+        parsed = extract_json(raw, expect=dict, schema=schema) or {}
+        for entry in parsed.get("turns") or []:
+            if isinstance(entry, dict) and isinstance(entry.get("suggestions"), list):
+                by_turn[entry.get("turn")] = entry["suggestions"][:MAX_SUGGESTIONS]
+    except Exception as e:
+        print(f"Warning: Batched suggestion call failed: {e}")
+
+    missing = [i for i in range(1, len(turns) + 1) if i not in by_turn]
+    if missing:
+        # A private pool: this may already run on one of _executor's workers
+        with ThreadPoolExecutor(max_workers=len(missing)) as pool:
+            retried = list(
+                pool.map(
+                    lambda i: _safe_single_turn(handler, system_prompt, turns[i - 1]),
+                    missing,
+                )
+            )
+        by_turn.update(zip(missing, retried))
+    return [by_turn[i] for i in range(1, len(turns) + 1)]
+
+
+def _safe_single_turn(handler: BasicHandler, system_prompt: str, turn: Tuple[str, str]) -> list:
+    try:
+        return _single_turn(handler, system_prompt, turn)
+    except Exception:
+        return []
+
+
+def _attach_to_messages(results: Dict[int, list]) -> None:
+    """
+    Write suggestions into chat_test_messages.metadata in one transaction.
+    :param results: message id -> suggestions
+    """
+    if not results:
+        return
+    from api.database_api import db
+
+    connection = db.get_connection()
+    if not connection:
+        print("Warning: Failed to attach suggestions: no database connection")
+        return
+    cursor = None
+    try:
+        cursor = connection.cursor()
+        cursor.executemany(
+            "UPDATE chat_test_messages SET metadata = JSON_SET("
+            "COALESCE(metadata, JSON_OBJECT()), '$.suggestions', CAST(%s AS JSON)) "
+            "WHERE id = %s",
+            [
+                (json.dumps(suggestions, ensure_ascii=False), message_id)
+                for message_id, suggestions in results.items()
+            ],
+        )
+        connection.commit()
+    except Exception as e:
+        connection.rollback()
+        print(f"Warning: Failed to attach suggestions: {e}")
+    finally:
+        if cursor:
+            cursor.close()
+        connection.close()
+
+
+class SuggestionBatcher:
+    """
+    Queues turns per (session, version, prompt) and flushes each queue after
+    SUGGESTION_BATCH_WINDOW_S, or as soon as it holds SUGGESTION_MAX_BATCH turns.
+    """
+
+    def __init__(self):
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._queues: Dict[tuple, List[str]] = {}
+        self._timers: Dict[tuple, threading.Timer] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        ai_services: Any,
+        queue_key: tuple,
+        *,
+        system_prompt: str,
+        user_message: str,
+        response: str,
+        message_id: Optional[int] = None,
+    ) -> str:
+        """
+        :param queue_key: Turns with the same key share a system prompt and may be batched.
+        :param message_id: Assistant message to attach the suggestions to, if already saved.
+        :return: Job id to poll or to bind a message to later.
+        """
+        job_id = uuid.uuid4().hex
+        flush_now = False
+        with self._lock:
+            self._jobs[job_id] = {
+                "status": "pending",
+                "suggestions": [],
+                "message_id": message_id,
+                "turn": (user_message, response),
+                "ai_services": ai_services,
+                "system_prompt": system_prompt,
+            }
+            while len(self._jobs) > MAX_TRACKED_JOBS:
+                self._jobs.popitem(last=False)
+            queue = self._queues.setdefault(queue_key, [])
+            queue.append(job_id)
+            if len(queue) >= SUGGESTION_MAX_BATCH:
+                flush_now = True
+            elif queue_key not in self._timers:
+                timer = threading.Timer(
+                    SUGGESTION_BATCH_WINDOW_S, self._flush, args=(queue_key,)
+                )
+                timer.daemon = True
+                self._timers[queue_key] = timer
+                timer.start()
+        if flush_now:
+            _executor.submit(self._flush, queue_key)
+        return job_id
+
+    def bind_message(self, job_id: str, message_id: int) -> None:
+        """
+        Attach a job's suggestions to a saved message, now or once ready.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job["message_id"] = message_id
+            ready = job["status"] == "ready"
+            suggestions = job["suggestions"]
+        if ready and suggestions:
+            _attach_to_messages({message_id: suggestions})
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {
+                "job_id": job_id,
+                "status": job["status"],
+                "suggestions": job["suggestions"],
+                "message_id": job["message_id"],
+            }
+
+    def _flush(self, queue_key: tuple) -> None:
+        with self._lock:
+            timer = self._timers.pop(queue_key, None)
+            job_ids = self._queues.pop(queue_key, [])
+            jobs = [(j, self._jobs[j]) for j in job_ids if j in self._jobs]
+        if timer:
+            timer.cancel()
+        if not jobs:
+            return
+
+        first = jobs[0][1]
+        try:
+            results = generate_suggestions(
+                BasicHandler(first["ai_services"]),
+                first["system_prompt"],
+                [job["turn"] for _, job in jobs],
+            )
+            status = "ready"
+        except Exception as e:
+            print(f"Warning: Suggestion generation failed: {e}")
+            results, status = [[] for _ in jobs], "failed"
+
+        to_attach: Dict[int, list] = {}
+        with self._lock:
+            for (_, job), suggestions in zip(jobs, results):
+                job["status"] = status
+                job["suggestions"] = suggestions
+                # The turn and client are no longer needed once resolved
+                job.pop("ai_services", None)
+                if job["message_id"] is not None and suggestions:
+                    to_attach[job["message_id"]] = suggestions
+        _attach_to_messages(to_attach)
+
+
+suggestion_batcher = SuggestionBatcher()
@@ -0,0 +1,112 @@
+"""
+Persisted test cases per session and prompt lineage.
+
+Test cases are keyed by the session and the content hash of the lineage's
+root prompt (the original prompt the versions derive from), so repeated
+validation runs and later versions are measured on the same inputs.
+"""
+import hashlib
+from typing import Callable, List
+
+
+def _db():
+    from api.database_api import db
+
+    return db
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256((prompt or "").strip().encode("utf-8")).hexdigest()
+
+
+def get_test_cases(session_id: str, lineage_prompt: str) -> List[str]:
+    rows = _db().execute_query(
+        "SELECT content FROM test_case_library "
+        "WHERE session_id = %s AND prompt_hash = %s ORDER BY position ASC",
+        (session_id, prompt_hash(lineage_prompt)),
+    )
+    return [row["content"] for row in rows]
+
+
+def save_test_cases(
+    session_id: str, lineage_prompt: str, test_cases: List[str], *, replace: bool
+) -> None:
+    """
+    :param replace: Drop the stored set first; otherwise append after it.
+    """
+    key = prompt_hash(lineage_prompt)
+    connection = _db().get_connection()
+    if not connection:
+        raise Exception("Failed to get database connection")
+    cursor = None
+    try:
+        cursor = connection.cursor()
+        if replace:
+            cursor.execute(
+                "DELETE FROM test_case_library WHERE session_id = %s AND prompt_hash = %s",
+                (session_id, key),
+            )
+            start = 0
+        else:
+            cursor.execute(
+                "SELECT COALESCE(MAX(position), -1) + 1 FROM test_case_library "
+                "WHERE session_id = %s AND prompt_hash = %s FOR UPDATE",
+                (session_id, key),
+            )
+            start = cursor.fetchone()[0]
+        cursor.executemany(
+            "INSERT INTO test_case_library (session_id, prompt_hash, position, content) "
+            "VALUES (%s, %s, %s, %s)",
+            [
+                (session_id, key, start + offset, test_case)
+                for offset, test_case in enumerate(test_cases)
+            ],
+        )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        connection.close()
+
+
+def get_or_generate(
+    session_id: str,
+    lineage_prompt: str,
+    count: int,
+    generate: Callable[[int], List[str]],
+    refresh: bool = False,
+) -> tuple[List[str], str]:
+    """
+    Stored test cases for the lineage, generating only what is missing.
+    :param generate: Called with the number of new test cases needed; returns
+        an empty list or raises when generation fails.
+    :param refresh: Discard the stored set and generate a new one.
+    :return: (first `count` test cases, "library" | "generated" | "extended");
+        only the stored cases, possibly none, when generation failed.
+    """
+    stored: List[str] = []
+    if not refresh:
+        try:
+            stored = get_test_cases(session_id, lineage_prompt)
+        except Exception as e:
+            print(f"Warning: Failed to load test case library: {e}")
+    if len(stored) >= count:
+        return stored[:count], "library"
+
+    known = set(stored)
+    try:
+        generated = generate(count - len(stored))
+    except Exception as e:
+        print(f"Warning: Test case generation failed: {e}")
+        generated = []
+    fresh = [t for t in generated if t and t.strip() and t not in known]
+    if not fresh:
+        return stored, "library"
+    try:
+        save_test_cases(session_id, lineage_prompt, fresh, replace=not stored)
+    except Exception as e:
+        print(f"Warning: Failed to save test cases to library: {e}")
+    return (stored + fresh)[:count], ("extended" if stored else "generated")
@@ -2,5 +2,6 @@ from .basic_handler import *
 from .elements_analyzer import *
 from .prompts_generator import *
 from .prompts_optimizer import *
+from .prompt_patcher import *
 from .structure_checker import *
 from .prompt_tester import *
@@ -1,19 +1,56 @@
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Sequence, Tuple, Union
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 from services import ai_services
+from infrastructure.config.agent_mapping import get_agent_route
+import agent_prompt
+from ..utils.json_schema import validate
+from ..utils.json_extract import extract_json
+
+# Upper bound on simultaneous LLM requests issued by a single handler call
+DEFAULT_MAX_CONCURRENCY = 8
+# Longest malformed output sent back to the model for repair
+MAX_REPAIR_INPUT_CHARS = 6000
 
 
 class BasicHandler:
     def __init__(self, ai_services: ai_services.AIServices):
         self.ai_server = ai_services
 
-    def call_llm(self, system_message: str, user_message: str) -> str:
+    def route_kwargs(self, agent_key: Optional[str]) -> dict:
+        """
+        Model and max_tokens for an agent, from the routing table in agent_mapping.
+        The tier's max_tokens only applies when the tier has its own model; an
+        agent that falls back to the current model is not capped.
+        :param agent_key: Agent key; None keeps the current model without a token cap.
+        :return: Extra keyword arguments for AIServices.call.
+        """
+        if not agent_key:
+            return {}
+        route = get_agent_route(agent_key)
+        kwargs = {"model_key": self.ai_server.model_for_tier(route["tier"])}
+        if route["max_tokens"] and self.ai_server.has_tier_model(route["tier"]):
+            kwargs["max_tokens"] = route["max_tokens"]
+        return kwargs
+
+    def call_llm(
+        self,
+        system_message: str,
+        user_message: str,
+        temperature: float = 0,
+        agent_key: Optional[str] = None,
+        response_schema: Optional[dict] = None,
+    ) -> str:
         """
         :param system_message: system message.
         :param user_message: user message.
+        :param temperature: sampling temperature.
+        :param agent_key: agent key used to route the call to a model tier.
+        :param response_schema: JSON schema to constrain the output to, where supported.
         :return: LLMs' response.
         """
         messages = [
@@ -21,13 +58,106 @@ class BasicHandler:
             {"role": "user", "content": user_message},
         ]
 
+        call_kwargs = self.route_kwargs(agent_key)
+        if response_schema is not None:
+            call_kwargs["response_schema"] = response_schema
+            call_kwargs["schema_name"] = agent_key or "response"
+
         llm_response = self.ai_server.call(
             messages=messages,
-            temperature=0,
+            temperature=temperature,
+            **call_kwargs,
         )
 
         return llm_response.strip().replace('"""', "")
 
+    def call_llm_many(
+        self,
+        message_pairs: Sequence[Tuple[str, str]],
+        *,
+        temperature: float = 0,
+        max_workers: Optional[int] = None,
+        return_exceptions: bool = False,
+        agent_key: Optional[str] = None,
+        response_schema: Optional[dict] = None,
+    ) -> List[Union[str, Exception]]:
+        """
+        Run several independent (system_message, user_message) calls concurrently.
+        :param message_pairs: (system_message, user_message) tuples.
+        :param temperature: sampling temperature for every call.
+        :param max_workers: concurrency cap, defaults to DEFAULT_MAX_CONCURRENCY.
+        :param return_exceptions: return failures in place instead of raising the first one.
+        :param agent_key: agent key used to route every call to a model tier.
+        :param response_schema: JSON schema every response is constrained to, where supported.
+        :return: Responses in the same order as `message_pairs`.
+        """
+        if not message_pairs:
+            return []
+
+        def _run(pair: Tuple[str, str]) -> Union[str, Exception]:
+            try:
+                return self.call_llm(
+                    pair[0],
+                    pair[1],
+                    temperature=temperature,
+                    agent_key=agent_key,
+                    response_schema=response_schema,
+                )
+            except Exception as e:
+                if return_exceptions:
+                    return e
+                raise
+
+        if len(message_pairs) == 1:
+            return [_run(message_pairs[0])]
+
+        workers = min(max_workers or DEFAULT_MAX_CONCURRENCY, len(message_pairs))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(_run, message_pairs))
+
+    def repair_json_output(self, raw: str, error: str = "") -> str:
+        """
+        One targeted repair call carrying only the malformed output.
+        :param raw: Model output that failed to parse.
+        :param error: Parser error or other description of the defect.
+        :return: The repaired JSON text, or "" when the call fails.
+        """
+        if not raw or not raw.strip() or len(raw) > MAX_REPAIR_INPUT_CHARS:
+            return ""
+        user_message = f"Malformed JSON:\n{raw}"
+        if error:
+            user_message += f"\n\nParser error: {error}"
+        try:
+            return self.call_llm(
+                agent_prompt.json_repair_prompt, user_message, agent_key="output_repair"
+            )
+        except Exception as e:
+            print(f"Warning: JSON repair call failed: {e}")
+            return ""
+
+    def parse_json_response(
+        self, raw: str, expect: Optional[type] = dict, schema: Optional[dict] = None
+    ) -> Any:
+        """
+        Parse JSON from a model response with deterministic fix-ups first and
+        at most one repair call, which also runs when the value fails `schema`.
+        :param raw: Model output.
+        :param expect: dict or list to require a top-level type, None for any.
+        :param schema: JSON schema the value should satisfy.
+        :return: The parsed value (the unrepaired one if repair does not help), or None.
+        """
+        parsed = extract_json(raw, expect, schema=schema)
+        errors = validate(parsed, schema) if parsed is not None and schema else []
+        if parsed is not None and not errors:
+            return parsed
+
+        repaired = extract_json(
+            self.repair_json_output(raw, "; ".join(errors[:5])), expect, schema=schema
+        )
+        if repaired is not None and (not schema or not validate(repaired, schema)):
+            return repaired
+        return parsed
+
     @staticmethod
     def remove_blank_lines(text: str) -> str:
         """
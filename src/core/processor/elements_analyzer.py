@@ -1,15 +1,59 @@
-import json
+import hashlib
+import math
 import re
-from typing import List
-from tqdm import tqdm
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
 from .basic_handler import BasicHandler
+from .method_selector import MethodSelector
+from ..utils.chunking import split_on_structure
+from ..utils.json_extract import extract_json
+from ..utils.token_budget import estimate_tokens
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 import agent_prompt
-from infrastructure.config.agent_mapping import get_all_agents, get_agent_info
+from infrastructure.config.agent_mapping import get_agent_info
+
+# Local selections at or above this confidence skip the LLM selection call.
+# Held out from the seed set, every cue-bearing seed prompt scores 0.42-0.83
+# with or without custom methods; below 0.4 the cut keeps a method the model
+# thinks is more likely wrong than right
+LOCAL_SELECTION_MIN_CONFIDENCE = 0.4
+
+# Prompts above this size are analyzed map-reduce style
+MAP_REDUCE_THRESHOLD_TOKENS = 6000
+CHUNK_TOKEN_TARGET = 3000
+MAX_PROMPT_CHUNKS = 8
+# Methods that read the source text/examples themselves and can analyze it piecewise;
+# the others only need the instructions and get a condensed prompt
+CHUNKED_METHODS = {"input_extract", "examples_extract"}
+# Consolidated mode sends every agent in one request while the request stays
+# under this size; methods it cannot cover get their own call
+CONSOLIDATED_MAX_INPUT_TOKENS = 6000
+
+# Agent outputs memoized by (model, agent instructions, prompt, feedback) hashes
+# and whether they came from a consolidated run
+AGENT_CACHE_SIZE = 512
+_AGENT_OUTPUT_CACHE: "OrderedDict[tuple, str]" = OrderedDict()
+_AGENT_OUTPUT_CACHE_LOCK = threading.Lock()
+
+# Words in feedback that clearly point at one analysis method
+FEEDBACK_METHOD_CUES = {
+    "anchoring_target": ["goal", "intent", "intention", "objective", "purpose", "目标", "意图"],
+    "activate_role": ["role", "persona", "identity", "expert", "角色", "身份"],
+    "disassembly_task": ["step", "subtask", "decompos", "breakdown", "break down", "步骤", "拆解"],
+    "expand_thinking": ["thinking", "framework", "brainstorm", "divergent", "convergent", "思维", "框架"],
+    "focus_subject": ["topic", "subject", "theme", "主题"],
+    "input_extract": ["source text", "input text", "original text", "原文", "输入"],
+    "examples_extract": ["example", "sample", "示例", "例子"],
+}
+
+
+def _digest(text: Optional[str]) -> str:
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
 
 
 class ElementsAnalyzer(BasicHandler):
@@ -20,7 +64,21 @@ class ElementsAnalyzer(BasicHandler):
         selected_methods: List[str] = None,
         custom_methods: dict = None,
         auto_select: bool = False,
+        previous_results: List = None,
+        consolidated: bool = False,
     ) -> List:
+        """
+        :param prompt: Prompt to analyze.
+        :param feedback: User feedback on a previous analysis round.
+        :param selected_methods: Method keys to run; all built-in methods when None.
+        :param custom_methods: Custom method definitions keyed by method key.
+        :param auto_select: Pick the methods automatically.
+        :param previous_results: Results of the previous round. With feedback, only the
+            methods the feedback touches are re-run and the rest are reused from here.
+        :param consolidated: Run the methods in one structured request instead of one
+            request each, falling back per method when that is not possible.
+        :return: One result dict per method.
+        """
 
         all_agents = {
             "anchoring_target": agent_prompt.anchoring_target,
@@ -68,15 +126,17 @@ class ElementsAnalyzer(BasicHandler):
                 print(f"Warning: Unknown analysis method '{method}' ignored.")
 
         analysis_results = []
-        user_message = f"The user's prompt：\n{prompt}"
-        if feedback:
-            user_message += f"\nThe supplementary information is:\n{feedback}"
-
-
-        for i, analysis_agent in enumerate(tqdm(analysis_agents)):
-            system_message = analysis_agent
-            analysis_result = self.call_llm(system_message, user_message)
+        analysis_outputs = self._run_agents_incrementally(
+            analysis_agents,
+            analysis_method_names,
+            prompt,
+            feedback,
+            custom_methods=custom_methods,
+            previous_results=previous_results,
+            consolidated=consolidated,
+        )
 
+        for i, analysis_result in enumerate(analysis_outputs):
             agent_key = analysis_method_names[i]
             if agent_key.startswith("custom_"):
                 custom_key = agent_key
@@ -113,14 +173,295 @@ class ElementsAnalyzer(BasicHandler):
 
         return analysis_results
 
-    def _auto_select_methods(
-        self, prompt: str, all_agents: dict, custom_methods: dict = None
+    @staticmethod
+    def _build_user_message(prompt: str, feedback: str = None) -> str:
+        user_message = f"The user's prompt：\n{prompt}"
+        if feedback:
+            user_message += f"\nThe supplementary information is:\n{feedback}"
+        return user_message
+
+    @staticmethod
+    def _split_prompt(prompt: str) -> List[str]:
+        prompt_tokens = estimate_tokens(prompt)
+        if prompt_tokens <= MAP_REDUCE_THRESHOLD_TOKENS:
+            return [prompt]
+        target = max(CHUNK_TOKEN_TARGET, math.ceil(prompt_tokens / MAX_PROMPT_CHUNKS))
+        return split_on_structure(prompt, target)
+
+    @staticmethod
+    def _condense_prompt(chunks: List[str]) -> str:
+        if len(chunks) <= 2:
+            return "\n\n".join(chunks)
+        omitted = sum(estimate_tokens(chunk) for chunk in chunks[1:-1])
+        return (
+            f"{chunks[0]}\n\n"
+            f"[... {len(chunks) - 2} middle part(s) of about {omitted} tokens omitted "
+            f"(source text or examples) ...]\n\n"
+            f"{chunks[-1]}"
+        )
+
+    def _run_consolidated(
+        self,
+        analysis_agents: List[str],
+        method_names: List[str],
+        user_message: str,
+    ) -> List[Optional[str]]:
+        """
+        One structured request for every agent, answered as a JSON object keyed
+        by method key.
+        :return: One analysis per agent; None where the request was over budget,
+            failed, or the reply lacked the method.
+        """
+        outputs: List[Optional[str]] = [None] * len(method_names)
+        system_message = agent_prompt.consolidated_analysis_prompt.format(
+            method_keys=", ".join(method_names),
+            method_sections="\n\n".join(
+                f"## Method key: {method}\n{agent}"
+                for agent, method in zip(analysis_agents, method_names)
+            ),
+        )
+        if (
+            estimate_tokens(system_message) + estimate_tokens(user_message)
+            > CONSOLIDATED_MAX_INPUT_TOKENS
+        ):
+            return outputs
+
+        schema = {
+            "type": "object",
+            "properties": {method: {"type": "string"} for method in method_names},
+            "required": list(method_names),
+            "additionalProperties": False,
+        }
+        try:
+            raw = self.call_llm(
+                system_message,
+                user_message,
+                agent_key="consolidated_analysis",
+                response_schema=schema,
+            )
+        except Exception as e:
+            print(f"Warning: Consolidated analysis failed: {e}. Running methods separately.")
+            return outputs
+        parsed = extract_json(raw, expect=dict, schema=schema)
+        if not isinstance(parsed, dict):
+            print("Warning: Consolidated analysis output unparseable. Running methods separately.")
+            return outputs
+        for i, method in enumerate(method_names):
+            value = parsed.get(method)
+            if isinstance(value, str) and value.strip():
+                outputs[i] = value
+        return outputs
+
+    def _run_agents(
+        self,
+        analysis_agents: List[str],
+        method_names: List[str],
+        prompt: str,
+        feedback: str = None,
+        consolidated: bool = False,
+    ) -> List[str]:
+        """
+        Run the analysis agents concurrently, or in one request when `consolidated`.
+        Oversized prompts are split on structure boundaries: CHUNKED_METHODS analyze
+        every chunk and merge the partial analyses in a reduce call, the other
+        methods analyze a condensed prompt.
+        :return: One analysis per agent, in order.
+        """
+        chunks = self._split_prompt(prompt)
+        if len(chunks) == 1:
+            user_message = self._build_user_message(prompt, feedback)
+            outputs: List[Optional[str]] = [None] * len(analysis_agents)
+            if consolidated and len(analysis_agents) > 1:
+                outputs = self._run_consolidated(
+                    analysis_agents, method_names, user_message
+                )
+            missing = [i for i, output in enumerate(outputs) if output is None]
+            fresh = self.call_llm_many(
+                [(analysis_agents[i], user_message) for i in missing]
+            )
+            for i, output in zip(missing, fresh):
+                outputs[i] = output
+            return outputs
+
+        condensed_message = self._build_user_message(
+            self._condense_prompt(chunks), feedback
+        )
+        chunk_messages = [
+            self._build_user_message(
+                f"(Part {i} of {len(chunks)}; the other parts are analyzed separately)\n{chunk}",
+                feedback,
+            )
+            for i, chunk in enumerate(chunks, start=1)
+        ]
+
+        # Map: one call per (agent, chunk) for chunked methods, one call otherwise
+        pairs = []
+        spans = []
+        for agent, method in zip(analysis_agents, method_names):
+            start = len(pairs)
+            if method in CHUNKED_METHODS:
+                pairs.extend((agent, message) for message in chunk_messages)
+            else:
+                pairs.append((agent, condensed_message))
+            spans.append((start, len(pairs)))
+        mapped = self.call_llm_many(pairs)
+
+        # Reduce: merge the partial analyses of each chunked method
+        outputs = [mapped[start] for start, _ in spans]
+        reduce_pairs = []
+        reduce_indexes = []
+        for index, (agent, (start, end)) in enumerate(zip(analysis_agents, spans)):
+            if end - start <= 1:
+                continue
+            partials = "\n\n".join(
+                f"## Part {i}\n{partial}"
+                for i, partial in enumerate(mapped[start:end], start=1)
+            )
+            reduce_pairs.append(
+                (
+                    agent_prompt.analysis_merge_prompt.format(
+                        analysis_instructions=agent
+                    ),
+                    f"Partial analyses:\n\n{partials}",
+                )
+            )
+            reduce_indexes.append(index)
+        for index, merged in zip(reduce_indexes, self.call_llm_many(reduce_pairs)):
+            outputs[index] = merged
+        return outputs
+
+    def _run_agents_incrementally(
+        self,
+        analysis_agents: List[str],
+        method_names: List[str],
+        prompt: str,
+        feedback: str = None,
+        *,
+        custom_methods: dict = None,
+        previous_results: List = None,
+        consolidated: bool = False,
     ) -> List[str]:
+        """
+        Reuse cached or previous outputs where possible and run only the remaining agents.
+        """
+        previous_outputs = {
+            item.get("agent_key"): item.get("content")
+            for item in previous_results or []
+            if isinstance(item, dict) and item.get("content")
+        }
+        affected = set(method_names)
+        if feedback and previous_outputs:
+            affected = set(
+                self._select_affected_methods(feedback, method_names, custom_methods)
+            )
+
+        model_name = (getattr(self.ai_server, "current_config", None) or {}).get(
+            "model_name", ""
+        )
+        outputs: List[Optional[str]] = [None] * len(method_names)
+        cache_keys: Dict[int, tuple] = {}
+        for i, (agent, method) in enumerate(zip(analysis_agents, method_names)):
+            if method not in affected and previous_outputs.get(method):
+                outputs[i] = previous_outputs[method]
+                continue
+            cache_key = (
+                _digest(model_name),
+                _digest(agent),
+                _digest(prompt),
+                _digest(feedback),
+                # Consolidated outputs are shorter; never serve one for the other
+                bool(consolidated),
+            )
+            with _AGENT_OUTPUT_CACHE_LOCK:
+                cached = _AGENT_OUTPUT_CACHE.get(cache_key)
+                if cached is not None:
+                    _AGENT_OUTPUT_CACHE.move_to_end(cache_key)
+            if cached is not None:
+                outputs[i] = cached
+            else:
+                cache_keys[i] = cache_key
+
+        pending = sorted(cache_keys)
+        if pending:
+            fresh = self._run_agents(
+                [analysis_agents[i] for i in pending],
+                [method_names[i] for i in pending],
+                prompt,
+                feedback,
+                consolidated=consolidated,
+            )
+            with _AGENT_OUTPUT_CACHE_LOCK:
+                for i, output in zip(pending, fresh):
+                    outputs[i] = output
+                    _AGENT_OUTPUT_CACHE[cache_keys[i]] = output
+                while len(_AGENT_OUTPUT_CACHE) > AGENT_CACHE_SIZE:
+                    _AGENT_OUTPUT_CACHE.popitem(last=False)
+        return outputs
 
-        agent_mapping = get_all_agents()
+    def _select_affected_methods(
+        self, feedback: str, method_names: List[str], custom_methods: dict = None
+    ) -> List[str]:
+        """
+        Decide which analysis methods a piece of feedback touches.
+        Explicit mentions (method key, label or cue word) are resolved locally;
+        otherwise one short LLM call decides. Falls back to every method.
+        """
+        lowered = feedback.lower()
+        method_descriptions = self._describe_methods(method_names, custom_methods)
+        mentioned = []
+        for method in method_names:
+            names = [method.lower(), method.replace("_", " ").lower()]
+            if custom_methods and method in custom_methods:
+                names.append(str(custom_methods[method].get("label", "")).lower())
+            else:
+                agent_info = get_agent_info(method)
+                if agent_info:
+                    names.append(agent_info["label"].lower())
+            names.extend(FEEDBACK_METHOD_CUES.get(method, []))
+            # Anchor ASCII names at a word start so "role" does not match "enrolled"
+            if any(
+                name
+                and re.search(r"(?<![a-z0-9])" + re.escape(name), lowered)
+                for name in names
+            ):
+                mentioned.append(method)
+        if mentioned:
+            return mentioned
+
+        methods_list = "\n".join(
+            f"- {key}: {desc}" for key, desc in method_descriptions.items()
+        )
+        relevance_prompt = f"""A user gave feedback on an analysis of their prompt. The analysis was produced by the methods below.
+Feedback:
+{feedback}
+
+Analysis Methods:
+{methods_list}
+
+Return ONLY the keys of the methods whose results the feedback affects, separated by commas, no explanations. Return ALL if it affects every method.
+
+Affected methods:"""
+        try:
+            response = self.call_llm(
+                system_message="You are an expert prompt analyst. Decide which analysis results a piece of user feedback affects.",
+                user_message=relevance_prompt,
+                agent_key="feedback_relevance",
+            )
+            affected = [m.strip() for m in response.split(",") if m.strip() in method_names]
+            if affected:
+                return affected
+        except Exception as e:
+            print(f"Warning: Feedback relevance check failed: {e}. Re-running all methods.")
+        return list(method_names)
+
+    def _describe_methods(
+        self, method_keys, custom_methods: dict = None
+    ) -> Dict[str, str]:
         method_descriptions = {}
 
-        for agent_key in all_agents.keys():
+        for agent_key in method_keys:
+            if custom_methods and agent_key in custom_methods:
+                continue
             agent_info = get_agent_info(agent_key)
             if agent_info:
                 method_descriptions[agent_key] = agent_info["description"]
@@ -142,6 +483,18 @@ class ElementsAnalyzer(BasicHandler):
             for key, method_info in custom_methods.items():
                 method_descriptions[key] = method_info["description"]
 
+        return method_descriptions
+
+    def _auto_select_methods(
+        self, prompt: str, all_agents: dict, custom_methods: dict = None
+    ) -> List[str]:
+
+        method_descriptions = self._describe_methods(all_agents.keys(), custom_methods)
+
+        local_methods, confidence = MethodSelector().select(prompt, method_descriptions)
+        if local_methods and confidence >= LOCAL_SELECTION_MIN_CONFIDENCE:
+            return local_methods
+
         methods_list = "\n".join(
             [f"- {key}: {desc}" for key, desc in method_descriptions.items()]
         )
@@ -166,6 +519,7 @@ Selected methods:"""
             response = self.call_llm(
                 system_message="You are an expert prompt analyst. Select the most appropriate analysis methods based on the given prompt.",
                 user_message=selection_prompt,
+                agent_key="select_analysis_methods",
             )
 
             selected_methods = [method.strip() for method in response.split(",")]
@@ -181,9 +535,9 @@ Selected methods:"""
 
             if not valid_methods:
                 print(
-                    "Warning: No valid methods selected by AI, using default methods."
+                    "Warning: No valid methods selected by AI, using local selection."
                 )
-                valid_methods = [
+                valid_methods = local_methods or [
                     "anchoring_target",
                     "activate_role",
                     "disassembly_task",
@@ -192,5 +546,5 @@ Selected methods:"""
             return valid_methods
 
         except Exception as e:
-            print(f"Error in auto-selection: {e}. Using default methods.")
-            return ["anchoring_target", "activate_role", "disassembly_task"]
+            print(f"Error in auto-selection: {e}. Using local selection.")
+            return local_methods or ["anchoring_target", "activate_role", "disassembly_task"]
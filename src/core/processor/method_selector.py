@@ -0,0 +1,288 @@
+import math
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..utils.similarity import stable_hash
+
+BUILT_IN_METHODS = [
+    "anchoring_target",
+    "activate_role",
+    "disassembly_task",
+    "expand_thinking",
+    "focus_subject",
+    "input_extract",
+    "examples_extract",
+]
+
+# Lexical cue groups; each group contributes one hit-count feature
+CUE_PATTERNS = {
+    "goal": r"\b(goal|objective|aim|purpose|want|need|so that|in order to|help me)\b",
+    "role": r"\b(act as|you are|role|persona|expert|assistant|advisor|specialist|teacher|tutor)\b",
+    "steps": r"\b(steps?|first|then|next|finally|process|workflow|plan|stages?|procedure)\b",
+    "creative": r"\b(ideas?|brainstorm|creative|innovative|strateg(y|ies)|explore|alternatives?|novel)\b",
+    "topic": r"\b(topic|theme|subject|about|regarding|focus|domain)\b",
+    "source": r"\b(translate|translation|summari[sz]e|polish|rewrite|proofread|paraphrase|following text|source text|paragraph|article|passage)\b",
+    "example": r"(\bexamples?\b|\be\.g\.|\bfor instance\b|\bsample\b|\binput\s*:|\boutput\s*:)",
+    "format": r"\b(format|json|table|markdown|bullet|list|words|length|sections?)\b",
+    "constraint": r"\b(must|should|do not|don't|never|avoid|only|strictly)\b",
+}
+_COMPILED_CUES = [re.compile(p, re.IGNORECASE) for p in CUE_PATTERNS.values()]
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = {
+    "the", "a", "an", "and", "or", "of", "to", "in", "for", "on", "with", "by",
+    "is", "are", "be", "that", "this", "it", "as", "from", "at", "into", "its",
+}
+
+HASH_DIM = 4096
+FEATURE_NAMES = [f"cue_{name}" for name in CUE_PATTERNS] + [
+    "log_length",
+    "line_count",
+    "quoted_block",
+    "labeled_lines",
+    "question_count",
+]
+
+# Tiny labelled corpus the linear model is fitted on at first use
+SEED_EXAMPLES: List[Tuple[str, List[str]]] = [
+    (
+        "Translate the following paragraph into formal English: \"我们明天开会讨论预算。\"",
+        ["anchoring_target", "input_extract", "focus_subject"],
+    ),
+    (
+        "Polish this article so it reads more professionally. Article: The product is good and people like it a lot.",
+        ["anchoring_target", "input_extract", "activate_role"],
+    ),
+    (
+        "Summarize the following passage in three bullet points.\n\n<long passage about climate policy>",
+        ["anchoring_target", "input_extract", "focus_subject"],
+    ),
+    (
+        "Rewrite customer emails in a friendly tone. Example 1: Input: Your order is late. Output: Sorry for the wait!\nExample 2: Input: Refund denied. Output: We understand your frustration...",
+        ["anchoring_target", "examples_extract", "activate_role", "input_extract"],
+    ),
+    (
+        "Classify tweets as positive or negative. Examples: 'love it' -> positive, 'worst day' -> negative.",
+        ["anchoring_target", "examples_extract", "disassembly_task"],
+    ),
+    (
+        "Create a system prompt for a customer service assistant that answers refund questions for an online shop.",
+        ["anchoring_target", "activate_role", "disassembly_task", "focus_subject"],
+    ),
+    (
+        "You are an experienced math tutor. Help high-school students solve algebra problems step by step without giving the final answer directly.",
+        ["activate_role", "disassembly_task", "anchoring_target", "focus_subject"],
+    ),
+    (
+        "Act as a legal advisor and explain the risks of signing a non-compete agreement.",
+        ["activate_role", "focus_subject", "anchoring_target"],
+    ),
+    (
+        "Brainstorm creative marketing ideas for launching a new eco-friendly water bottle.",
+        ["expand_thinking", "anchoring_target", "focus_subject", "activate_role"],
+    ),
+    (
+        "Suggest innovative strategies to improve employee engagement in remote teams.",
+        ["expand_thinking", "anchoring_target", "activate_role"],
+    ),
+    (
+        "Plan a three-day trip to Kyoto: first list attractions, then build a schedule, finally estimate the budget.",
+        ["disassembly_task", "anchoring_target", "expand_thinking"],
+    ),
+    (
+        "Design a workflow for reviewing pull requests, including the steps, checks and who approves each stage.",
+        ["disassembly_task", "activate_role", "anchoring_target"],
+    ),
+    (
+        "Write a blog post about the history of jazz music for beginners.",
+        ["focus_subject", "anchoring_target", "activate_role"],
+    ),
+    (
+        "Explain quantum entanglement to a ten-year-old.",
+        ["focus_subject", "activate_role", "anchoring_target"],
+    ),
+    (
+        "Generate a JSON list of product names and prices from the following text: Apples cost $3, pears cost $4.",
+        ["input_extract", "anchoring_target", "disassembly_task"],
+    ),
+    (
+        "Help me write a prompt that makes an AI assistant review code for security issues. It must only report high-severity problems and output a markdown table.",
+        ["anchoring_target", "activate_role", "disassembly_task", "focus_subject"],
+    ),
+]
+
+
+def _tokens(text: str) -> List[str]:
+    return [
+        t for t in _TOKEN_PATTERN.findall((text or "").lower()) if t not in _STOPWORDS
+    ]
+
+
+def hashed_bow(texts: Sequence[str], dim: int = HASH_DIM) -> np.ndarray:
+    """
+    L2-normalised hashed bag-of-words matrix, one row per text.
+    """
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for token in _tokens(text):
+            matrix[row, stable_hash(token) % dim] += 1.0
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def lexical_features(prompts: Sequence[str]) -> np.ndarray:
+    """
+    Cue-group and structural features, one row per prompt (see FEATURE_NAMES).
+    """
+    rows = []
+    for prompt in prompts:
+        prompt = prompt or ""
+        cues = [math.log1p(len(p.findall(prompt))) for p in _COMPILED_CUES]
+        lines = [line for line in prompt.splitlines() if line.strip()]
+        labeled = sum(1 for line in lines if re.match(r"^\s*[\w ]{1,30}:\s*\S", line))
+        quoted = bool(
+            re.search(r"\"[^\"]{40,}\"|“[^”]{20,}”|'''|\"\"\"|```", prompt)
+            or any(len(line) > 300 for line in lines)
+        )
+        rows.append(
+            cues
+            + [
+                math.log1p(len(_tokens(prompt))) / 6.0,
+                min(len(lines), 20) / 20.0,
+                1.0 if quoted else 0.0,
+                min(labeled, 10) / 10.0,
+                min(prompt.count("?"), 5) / 5.0,
+            ]
+        )
+    return np.asarray(rows, dtype=np.float32).reshape(len(prompts), len(FEATURE_NAMES))
+
+
+def has_method_cues(prompt: str) -> bool:
+    """
+    Whether the prompt matches any cue group; without one the model's scores
+    are just its prior.
+    """
+    return any(pattern.search(prompt or "") for pattern in _COMPILED_CUES)
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+class LinearMethodModel:
+    """
+    One-vs-rest logistic regression over lexical features plus the
+    prompt/description similarity, fitted with batch gradient descent.
+    """
+
+    def __init__(self, method_keys: Sequence[str] = BUILT_IN_METHODS):
+        self.method_keys = list(method_keys)
+        n_features = len(FEATURE_NAMES)
+        self.weights = np.zeros((n_features, len(self.method_keys)), dtype=np.float32)
+        self.bias = np.zeros(len(self.method_keys), dtype=np.float32)
+        # Shared weight on the description-similarity feature
+        self.similarity_weight = 4.0
+
+    def fit(
+        self,
+        examples: Sequence[Tuple[str, Sequence[str]]],
+        *,
+        epochs: int = 400,
+        learning_rate: float = 0.5,
+        l2: float = 0.01,
+    ) -> "LinearMethodModel":
+        prompts = [prompt for prompt, _ in examples]
+        x = lexical_features(prompts)
+        y = np.zeros((len(examples), len(self.method_keys)), dtype=np.float32)
+        for i, (_, labels) in enumerate(examples):
+            for label in labels:
+                if label in self.method_keys:
+                    y[i, self.method_keys.index(label)] = 1.0
+
+        n = max(len(examples), 1)
+        for _ in range(epochs):
+            p = _sigmoid(x @ self.weights + self.bias)
+            grad = p - y
+            self.weights -= learning_rate * ((x.T @ grad) / n + l2 * self.weights)
+            self.bias -= learning_rate * grad.mean(axis=0)
+        return self
+
+    def predict_proba(
+        self, prompt: str, similarities: Dict[str, float]
+    ) -> Dict[str, float]:
+        """
+        :param prompt: Prompt to analyze.
+        :param similarities: Prompt/description cosine similarity per method key.
+        :return: Probability that each method is useful for the prompt.
+        """
+        x = lexical_features([prompt])[0]
+        logits = x @ self.weights + self.bias
+        scores = {}
+        for key, similarity in similarities.items():
+            if key in self.method_keys:
+                logit = logits[self.method_keys.index(key)]
+            else:
+                # Custom methods have no trained weights; rely on similarity only
+                logit = -1.0
+            scores[key] = float(_sigmoid(logit + self.similarity_weight * similarity))
+        return scores
+
+
+@lru_cache(maxsize=1)
+def get_default_model() -> LinearMethodModel:
+    return LinearMethodModel().fit(SEED_EXAMPLES)
+
+
+class MethodSelector:
+    """
+    Local, LLM-free analysis-method selector.
+    """
+
+    def __init__(
+        self,
+        model: Optional[LinearMethodModel] = None,
+        *,
+        min_methods: int = 3,
+        max_methods: int = 5,
+    ):
+        self.model = model or get_default_model()
+        self.min_methods = min_methods
+        self.max_methods = max_methods
+
+    def score(self, prompt: str, method_descriptions: Dict[str, str]) -> Dict[str, float]:
+        keys = list(method_descriptions.keys())
+        if not keys:
+            return {}
+        vectors = hashed_bow([prompt] + [method_descriptions[k] for k in keys])
+        similarities = vectors[1:] @ vectors[0]
+        return self.model.predict_proba(
+            prompt, {k: float(s) for k, s in zip(keys, similarities)}
+        )
+
+    def select(
+        self, prompt: str, method_descriptions: Dict[str, str]
+    ) -> Tuple[List[str], float]:
+        """
+        :param prompt: Prompt to analyze.
+        :param method_descriptions: Description per candidate method key.
+        :return: (selected method keys, confidence in [0, 1]). The confidence is
+            the weakest keep/drop decision at the cut: the lowest selected
+            probability or one minus the highest rejected one, so it does not
+            fall as more methods are offered. Prompts without any method cue
+            get 0.
+        """
+        scores = self.score(prompt, method_descriptions)
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        if not ranked:
+            return [], 0.0
+
+        k = sum(1 for key in ranked if scores[key] >= 0.5)
+        k = max(min(k, self.max_methods), min(self.min_methods, len(ranked)))
+        selected = ranked[:k]
+        if not has_method_cues(prompt):
+            return selected, 0.0
+        best_rejected = scores[ranked[k]] if k < len(ranked) else 0.0
+        return selected, float(min(scores[selected[-1]], 1.0 - best_rejected))
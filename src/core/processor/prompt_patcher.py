@@ -0,0 +1,84 @@
+import json
+from typing import Iterable, Optional
+
+import sys
+import os
+
+from .basic_handler import BasicHandler
+from ..utils.section_patch import (
+    PatchError,
+    apply_section_edits,
+    find_section_title,
+    section_titles,
+)
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+import agent_prompt
+
+# Sections every patched prompt must keep when the previous prompt had them
+PROTECTED_SECTIONS = ("Task Objective",)
+
+
+class PromptPatcher(BasicHandler):
+    """Revise a structured prompt through a section-level edit script"""
+
+    def run(
+        self,
+        prompt: str,
+        feedback: str,
+        *,
+        context: Optional[str] = None,
+        required_sections: Iterable[str] = PROTECTED_SECTIONS,
+        temperature: float = 0.3,
+    ) -> Optional[str]:
+        """
+        Ask the model for section edits against `prompt` and apply them locally.
+        :param prompt: The previous generated or optimized prompt.
+        :param feedback: User feedback to address.
+        :param context: Extra guidance for the revision (e.g. the optimization prompt).
+        :param required_sections: Sections that must survive the patch if present.
+        :param temperature: sampling temperature.
+        :return: The patched prompt, or None when the caller should fully regenerate.
+        """
+        titles = section_titles(prompt)
+        if not prompt or not titles:
+            return None
+
+        user_message = (
+            f"Section titles:\n{json.dumps(titles, ensure_ascii=False)}\n\n"
+            f"Current prompt:\n{prompt}\n\n"
+        )
+        if context:
+            user_message += f"Revision guidelines:\n{context}\n\n"
+        user_message += f"User feedback:\n{feedback}\n"
+
+        try:
+            response = self.call_llm(
+                agent_prompt.section_patch_prompt,
+                user_message,
+                temperature=temperature,
+                response_schema=agent_prompt.section_patch_schema,
+            )
+        except Exception as e:
+            print(f"Warning: Section patch request failed: {e}")
+            return None
+
+        script = self.parse_json_response(
+            response, dict, schema=agent_prompt.section_patch_schema
+        )
+        if not script or script.get("regenerate"):
+            return None
+
+        protected = [
+            title
+            for title in (find_section_title(prompt, t) for t in required_sections)
+            if title
+        ]
+        try:
+            return apply_section_edits(
+                prompt, script.get("edits") or [], required_sections=protected
+            ).replace("```", "")
+        except PatchError as e:
+            print(f"Warning: Section patch rejected: {e}")
+            return None
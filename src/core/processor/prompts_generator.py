@@ -1,33 +1,71 @@
-import json
-from typing import List
-from .basic_handler import BasicHandler
-import sys
-import os
-
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-
-import agent_prompt
-
-
-class PromptGenerator(BasicHandler):
-    def run(self, analysis_results: List, prompt: str, feedback: str = None) -> str:
-        # Generating structured prompt
-
-        user_message = f"The user's prompt\n{prompt}\nThe analysis result of user's prompt\n：{str(analysis_results)}\n"
-        # If there is user feedback, add it to the message
-        if feedback:
-            if "The supplementary information" not in user_message:
-                user_message = (
-                    f"{user_message}\nThe supplementary information is:\n{feedback}"
-                )
-            else:
-                user_message = f"{user_message}\n{feedback}"
-
-        system_message = agent_prompt.structuring_prompt
-        response = self.call_llm(system_message, user_message).replace("```", "")
-
-        if "# Task Objective:" not in response:
-            raise ValueError(
-                "The generated prompt does not meet the requirements, missing critical parts"
-            )
-        return response
+import json
+import re
+from typing import List
+from .basic_handler import BasicHandler
+from ..utils.output_repair import missing_headings, normalize_headings
+from ..utils.token_budget import analysis_budget_for, compact_analysis
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+import agent_prompt
+
+
+class PromptGenerator(BasicHandler):
+    def run(self, analysis_results: List, prompt: str, feedback: str = None) -> str:
+        # Generating structured prompt
+
+        analysis_text = compact_analysis(
+            analysis_results,
+            original_prompt=prompt,
+            max_tokens=analysis_budget_for(self.ai_server),
+        )
+        user_message = f"The user's prompt\n{prompt}\nThe analysis result of user's prompt\n：{analysis_text}\n"
+        # If there is user feedback, add it to the message
+        if feedback:
+            if "The supplementary information" not in user_message:
+                user_message = (
+                    f"{user_message}\nThe supplementary information is:\n{feedback}"
+                )
+            else:
+                user_message = f"{user_message}\n{feedback}"
+
+        system_message = agent_prompt.structuring_prompt
+        response = self.finalize(self.call_llm(system_message, user_message), prompt)
+
+        if "# Task Objective:" not in response:
+            raise ValueError(
+                "The generated prompt does not meet the requirements, missing critical parts"
+            )
+        return response
+
+    def finalize(self, response: str, prompt: str) -> str:
+        """
+        Strip code fences from a raw generation and repair its heading structure.
+        """
+        return self._repair_structure(response.replace("```", ""), prompt)
+
+    def _repair_structure(self, response: str, prompt: str) -> str:
+        """
+        Normalize heading variants locally; if the Task Objective is still missing,
+        ask only for that line instead of regenerating the whole prompt.
+        """
+        response = normalize_headings(response)
+        if not missing_headings(response):
+            return response
+
+        try:
+            repaired = self.call_llm(
+                agent_prompt.task_objective_repair_prompt,
+                f"The user's original prompt:\n{prompt}\n\nStructured prompt:\n{response}",
+                agent_key="output_repair",
+            )
+        except Exception as e:
+            print(f"Warning: Task Objective repair failed: {e}")
+            return response
+
+        match = re.search(r"Task Objective\s*\**\s*[:：]\s*\**\s*(\S.*)", repaired, re.IGNORECASE)
+        if not match:
+            return response
+        return f"# Task Objective: {match.group(1).strip()}\n\n{response}"
@@ -4,15 +4,29 @@ import sys
 import os
 
 from .basic_handler import BasicHandler
+from ..utils.candidate_ranking import rank_candidates
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 import agent_prompt
 
+# Best-of-n sampling needs more diversity than the single-shot default
+CANDIDATE_TEMPERATURE = 0.8
+MAX_OPTIMIZATION_CANDIDATES = 8
+
 
 class PromptOptimizer(BasicHandler):
-    def _call(self, messages: List[Dict[str, str]], temperature: float) -> str:
-        response = self.ai_server.call(messages=messages, temperature=temperature)
+    def _call(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        agent_key: Optional[str] = None,
+    ) -> str:
+        response = self.ai_server.call(
+            messages=messages,
+            temperature=temperature,
+            **self.route_kwargs(agent_key),
+        )
         return response.strip().replace('"""', "")
 
     def optimize_prompt(
@@ -32,6 +46,44 @@ class PromptOptimizer(BasicHandler):
         optimized_prompt = self._call(messages, temperature=temperature)
         return optimized_prompt.replace("```", "")
 
+    def optimize_prompt_candidates(
+        self,
+        prompt: str,
+        optimization_system_prompt: str,
+        *,
+        n: int,
+        temperature: float = CANDIDATE_TEMPERATURE,
+    ) -> List[Dict[str, Any]]:
+        """
+        Sample n optimizations in one round-trip and rank them locally.
+        :param prompt: Prompt to optimize.
+        :param optimization_system_prompt: Optimization instructions.
+        :param n: Number of candidates to sample.
+        :param temperature: sampling temperature.
+        :return: [{"optimized_prompt", "score", "signals"}] best first.
+        """
+        messages = [
+            {"role": "system", "content": optimization_system_prompt},
+            {
+                "role": "user",
+                "content": f"Please optimize the following prompt:\n\n{prompt}",
+            },
+        ]
+        responses = self.ai_server.call_n(
+            messages,
+            min(n, MAX_OPTIMIZATION_CANDIDATES),
+            temperature=temperature,
+            **self.route_kwargs(None),
+        )
+        candidates = [
+            response.strip().replace('"""', "").replace("```", "")
+            for response in responses
+        ]
+        return [
+            {"optimized_prompt": candidate, "score": score, "signals": signals}
+            for candidate, score, signals in rank_candidates(candidates, prompt)
+        ]
+
     def generate_thinking(
         self,
         *,
@@ -49,7 +101,11 @@ class PromptOptimizer(BasicHandler):
                 ),
             },
         ]
-        return self._call(thinking_messages, temperature=temperature)
+        return self._call(
+            thinking_messages,
+            temperature=temperature,
+            agent_key="optimization_thinking",
+        )
 
     def optimize_prompt_with_feedback(
         self,
@@ -81,6 +137,7 @@ class PromptOptimizer(BasicHandler):
         feedback: Optional[str] = None,
         include_thinking: bool = True,
         temperature: float = 0.3,
+        n: int = 1,
     ) -> Union[Dict[str, Any], str]:
         if feedback:
             return self.optimize_prompt_with_feedback(
@@ -90,11 +147,19 @@ class PromptOptimizer(BasicHandler):
                 temperature=temperature,
             )
 
-        optimized_prompt = self.optimize_prompt(
-            prompt,
-            optimization_system_prompt,
-            temperature=temperature,
-        )
+        candidates = []
+        if n > 1:
+            candidates = self.optimize_prompt_candidates(
+                prompt, optimization_system_prompt, n=n
+            )
+        if candidates:
+            optimized_prompt = candidates[0]["optimized_prompt"]
+        else:
+            optimized_prompt = self.optimize_prompt(
+                prompt,
+                optimization_system_prompt,
+                temperature=temperature,
+            )
 
         thinking = (
             self.generate_thinking(
@@ -106,8 +171,11 @@ class PromptOptimizer(BasicHandler):
             else ""
         )
 
-        return {
+        result = {
             "optimized_prompt": optimized_prompt,
             "thinking": thinking,
             "original_prompt": prompt,
         }
+        if candidates:
+            result["candidates"] = candidates
+        return result
@@ -240,31 +240,17 @@ class StructureChecker(BasicHandler):
             + "\n\nDialogue History:\n"
             + str(dialogues_history)
         )
-        llm_response = self.call_llm(system_message, user_message).replace(
-            "```", ""
+        llm_response = self.call_llm(
+            system_message,
+            user_message,
+            agent_key="requirements_checklist",
+            response_schema=agent_prompt.requirements_checklist_schema,
+        ).replace("```", "")
+        parsed = self.parse_json_response(
+            llm_response, dict, schema=agent_prompt.requirements_checklist_schema
         )
-        parsed = self._extract_json_dict(llm_response)
         return parsed if parsed is not None else requirements_checklist
 
-    @staticmethod
-    def _extract_json_dict(text: str) -> Optional[Dict[str, Any]]:
-        try:
-            parsed = json.loads(text)
-            return parsed if isinstance(parsed, dict) else None
-        except Exception:
-            pass
-
-        start = text.find("{")
-        end = text.rfind("}")
-        if start < 0 or end < 0 or end <= start:
-            return None
-
-        try:
-            parsed = json.loads(text[start : end + 1])
-            return parsed if isinstance(parsed, dict) else None
-        except Exception:
-            return None
-
     def think_structure(
         self,
         initial_prompt: str = None,
@@ -302,7 +288,9 @@ class StructureChecker(BasicHandler):
             )
 
             # Get thinking analysis result
-            thinking_response = self.call_llm(system_message, user_message)
+            thinking_response = self.call_llm(
+                system_message, user_message, agent_key="thinking_structure"
+            )
 
             # Clean up result
             thinking_response = self.remove_blank_lines(thinking_response)
@@ -1,6 +1,41 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
 from .basic_handler import BasicHandler
 from .test_case_generator import TestCaseGenerator
-from typing import Dict, Any
+from ..utils.chat_history import (
+    SUMMARY_BLOCK_TURNS,
+    SUMMARY_MAX_TOKENS,
+    build_chat_messages,
+    fit_recent_turns,
+    group_turns,
+    local_summary,
+    summarized_turn_count,
+)
+from ..utils.response_variance import consistency_metrics
+from ..utils.token_budget import analysis_budget_for, estimate_tokens
+from typing import Dict, Any, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+import agent_prompt
+
+# Variance mode samples at a production-like temperature so noise is visible
+VARIANCE_TEMPERATURE = 0.7
+MAX_VARIANCE_SAMPLES = 10
+# Cumulative summaries keyed by (model, previous summary, block)
+HISTORY_SUMMARY_CACHE_SIZE = 256
+_HISTORY_SUMMARY_CACHE: "OrderedDict[tuple, str]" = OrderedDict()
+_HISTORY_SUMMARY_CACHE_LOCK = threading.Lock()
+
+
+def _digest(text: Optional[str]) -> str:
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
 
 
 class SystemPromptTester(BasicHandler):
@@ -92,3 +127,158 @@ class SystemPromptTester(BasicHandler):
         :return: Test results
         """
         return self.test_system_prompt(system_prompt, custom_user_message)
+
+    def test_with_history(
+        self,
+        system_prompt: str,
+        history: List[Dict[str, str]],
+        user_message: str,
+        token_budget: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Test system prompt with the earlier turns of the conversation
+        :param system_prompt: System prompt
+        :param history: Earlier {"role", "content"} messages, oldest first
+        :param user_message: New user message
+        :param token_budget: Token budget for the history; defaults to the model's analysis budget
+        :return: Test results, with how the history was windowed
+        """
+        budget = token_budget or analysis_budget_for(self.ai_server)
+        turns = group_turns(history)
+        summarized = summarized_turn_count(turns, budget)
+        summary = self._summarize_turns(turns[:summarized])
+        recent = fit_recent_turns(
+            turns[summarized:], budget - (SUMMARY_MAX_TOKENS if summary else 0)
+        )
+        messages = build_chat_messages(system_prompt, recent, user_message, summary)
+        history_info = {
+            "turns": len(turns),
+            "summarized_turns": summarized,
+            "window_turns": len(turns) - summarized,
+            "token_budget": budget,
+            "history_tokens": sum(
+                estimate_tokens(m["content"]) for m in messages[1:-1]
+            ),
+        }
+
+        started = time.monotonic()
+        try:
+            response = self.ai_server.call(
+                messages=messages, temperature=0, **self.route_kwargs(None)
+            )
+        except Exception as e:
+            return {
+                "system_prompt": system_prompt,
+                "test_case": user_message,
+                "response": f"Test failed: {str(e)}",
+                "history": history_info,
+                "success": False,
+                "error": str(e),
+            }
+        return {
+            "system_prompt": system_prompt,
+            "test_case": user_message,
+            "response": response.strip().replace('"""', ""),
+            "history": history_info,
+            "response_time_ms": int((time.monotonic() - started) * 1000),
+            "success": True,
+        }
+
+    def _summarize_turns(self, turns: List[List[Dict[str, str]]]) -> str:
+        """
+        Fold turns into a running summary one block at a time. Each block's
+        summary is cached, so a request only summarizes blocks that newly
+        left the window.
+        """
+        model_name = (getattr(self.ai_server, "current_config", None) or {}).get(
+            "model_name", ""
+        )
+        summary = ""
+        for start in range(0, len(turns), SUMMARY_BLOCK_TURNS):
+            block = turns[start : start + SUMMARY_BLOCK_TURNS]
+            cache_key = (
+                _digest(model_name),
+                _digest(summary),
+                _digest(json.dumps(block, ensure_ascii=False, sort_keys=True)),
+            )
+            with _HISTORY_SUMMARY_CACHE_LOCK:
+                cached = _HISTORY_SUMMARY_CACHE.get(cache_key)
+                if cached is not None:
+                    _HISTORY_SUMMARY_CACHE.move_to_end(cache_key)
+            if cached is not None:
+                summary = cached
+                continue
+
+            transcript = "\n".join(
+                f"{'User' if m['role'] == 'user' else 'Assistant'}: {m['content']}"
+                for turn in block
+                for m in turn
+            )
+            try:
+                summary = self.call_llm(
+                    agent_prompt.chat_history_summary_system_prompt,
+                    f"Existing summary:\n{summary or '(none)'}\n\n"
+                    f"New turns:\n{transcript}",
+                    agent_key="chat_history_summary",
+                )
+            except Exception as e:
+                print(f"Warning: History summary failed, using local summary: {e}")
+                return local_summary(turns)
+            with _HISTORY_SUMMARY_CACHE_LOCK:
+                _HISTORY_SUMMARY_CACHE[cache_key] = summary
+                while len(_HISTORY_SUMMARY_CACHE) > HISTORY_SUMMARY_CACHE_SIZE:
+                    _HISTORY_SUMMARY_CACHE.popitem(last=False)
+        return summary
+
+    def sample_responses(
+        self,
+        system_prompt: str,
+        user_message: str,
+        samples: int,
+        *,
+        temperature: float = VARIANCE_TEMPERATURE,
+    ) -> Dict[str, Any]:
+        """
+        Sample several responses to one message and measure how consistent they are
+        :param system_prompt: System prompt
+        :param user_message: User message
+        :param samples: Number of responses to sample
+        :param temperature: sampling temperature
+        :return: Test results with all samples and their consistency metrics
+        """
+        samples = max(1, min(samples, MAX_VARIANCE_SAMPLES))
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_message},
+        ]
+        started = time.monotonic()
+        try:
+            responses = [
+                response.strip().replace('"""', "")
+                for response in self.ai_server.call_n(
+                    messages,
+                    samples,
+                    temperature=temperature,
+                    **self.route_kwargs(None),
+                )
+            ]
+        except Exception as e:
+            return {
+                "system_prompt": system_prompt,
+                "test_case": user_message,
+                "response": f"Test failed: {str(e)}",
+                "samples": [],
+                "variance": None,
+                "success": False,
+                "error": str(e),
+            }
+
+        return {
+            "system_prompt": system_prompt,
+            "test_case": user_message,
+            "response": responses[0] if responses else "",
+            "samples": responses,
+            "variance": consistency_metrics(responses, system_prompt),
+            "response_time_ms": int((time.monotonic() - started) * 1000),
+            "success": bool(responses),
+        }
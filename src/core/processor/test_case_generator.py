@@ -1,5 +1,34 @@
+import math
+import re
+import sys
+import os
 from .basic_handler import BasicHandler
-from typing import List, Dict, Any
+from ..utils.json_extract import extract_json
+from ..utils.similarity import dedupe_near_duplicates
+from typing import List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+import agent_prompt
+
+# Maximum number of test cases requested in a single completion
+TEST_CASE_SHARD_SIZE = 8
+MAX_TEST_CASES = 100
+OVERSAMPLE_RATIO = 1.25
+DUPLICATE_THRESHOLD = 0.6
+TEST_CASE_TEMPERATURE = 0.8
+NUMBERED_LINE_PATTERN = re.compile(r"^\d+\s*[.)、:]\s*(.*)$")
+# Rotated across shards so concurrent batches cover different ground
+SHARD_FOCUS_AREAS = [
+    "typical, everyday requests for the core task",
+    "edge cases and unusual or incomplete inputs",
+    "requests that probe the constraints and prohibitions",
+    "requests that stress the required output format",
+    "ambiguous requests that need clarification",
+    "domain-specific, expert-level requests",
+    "off-topic or out-of-scope requests",
+    "multi-part or long, detailed requests",
+]
 
 
 class TestCaseGenerator(BasicHandler):
@@ -12,6 +41,7 @@ class TestCaseGenerator(BasicHandler):
         Generate a test case (user message) based on system prompt
         :param system_prompt: System prompt
         :return: Generated test case
+        :raises Exception: When generation fails or returns an empty message.
         """
 
         generator_system_message = """
@@ -29,71 +59,147 @@ Please return the generated user message directly without any explanations or ad
 
         user_message = f"Please generate a test case for the following system prompt:\n\n{system_prompt}"
 
-        try:
-            test_case = self.call_llm(generator_system_message, user_message)
-            return test_case.strip()
-        except Exception as e:
-            # If generation fails, return a generic test case
-            return "Please help me solve a problem."
+        test_case = (self.call_llm(generator_system_message, user_message) or "").strip()
+        if not test_case:
+            raise Exception("Test case generation returned an empty message")
+        return test_case
 
     def generate_multiple_test_cases(
         self, system_prompt: str, count: int = 3
     ) -> List[str]:
         """
-        Generate multiple test cases
+        Generate multiple test cases.
+        Large counts are split into shards that are generated concurrently,
+        and near-duplicate cases are removed locally.
         :param system_prompt: System prompt
         :param count: Number of test cases to generate
-        :return: List of test cases
+        :return: List of test cases; empty when generation failed
         """
+        count = max(1, min(int(count or 1), MAX_TEST_CASES))
+
+        # Over-request slightly so deduplication does not leave us short
+        requested = count if count <= 3 else math.ceil(count * OVERSAMPLE_RATIO)
+        shard_count = math.ceil(requested / TEST_CASE_SHARD_SIZE)
+        shard_sizes = [
+            requested // shard_count + (1 if i < requested % shard_count else 0)
+            for i in range(shard_count)
+        ]
+
+        message_pairs = [
+            self._build_shard_messages(
+                system_prompt,
+                size=size,
+                shard_index=i,
+                shard_count=shard_count,
+            )
+            for i, size in enumerate(shard_sizes)
+        ]
+        responses = self.call_llm_many(
+            message_pairs,
+            temperature=TEST_CASE_TEMPERATURE,
+            return_exceptions=True,
+            response_schema=agent_prompt.test_cases_schema,
+        )
+
+        candidates: List[str] = []
+        for response in responses:
+            if isinstance(response, Exception):
+                print(f"Warning: Test case shard failed: {response}")
+                continue
+            candidates.extend(self._parse_test_cases(response))
+
+        test_cases = dedupe_near_duplicates(
+            candidates, threshold=DUPLICATE_THRESHOLD
+        )
+
+        # One top-up round when shards failed or too many cases were duplicates
+        missing = count - len(test_cases)
+        if test_cases and missing > 0:
+            system_message, user_message = self._build_shard_messages(
+                system_prompt,
+                size=missing,
+                avoid=test_cases,
+            )
+            try:
+                response = self.call_llm(
+                    system_message,
+                    user_message,
+                    temperature=TEST_CASE_TEMPERATURE,
+                    response_schema=agent_prompt.test_cases_schema,
+                )
+                test_cases.extend(
+                    dedupe_near_duplicates(
+                        self._parse_test_cases(response),
+                        threshold=DUPLICATE_THRESHOLD,
+                        existing=test_cases,
+                    )
+                )
+            except Exception as e:
+                print(f"Warning: Test case top-up failed: {e}")
+
+        return test_cases[:count]
+
+    @staticmethod
+    def _build_shard_messages(
+        system_prompt: str,
+        *,
+        size: int,
+        shard_index: int = 0,
+        shard_count: int = 1,
+        avoid: Optional[List[str]] = None,
+    ) -> Tuple[str, str]:
+        focus = ""
+        if shard_count > 1:
+            focus = (
+                f"\nThis is batch {shard_index + 1} of {shard_count}. "
+                f"Concentrate on: {SHARD_FOCUS_AREAS[shard_index % len(SHARD_FOCUS_AREAS)]}.\n"
+            )
 
         generator_system_message = f"""
-You are a professional test case generator. Your task is to generate {count} different user messages to test the effectiveness of a given system prompt.
+You are a professional test case generator. Your task is to generate {size} different user messages to test the effectiveness of a given system prompt.
 
 Generation Rules:
 1. Analyze the role positioning, task requirements, and expected behavior of the system prompt
-2. Generate {count} user messages that can effectively trigger the system prompt's functionality
+2. Generate {size} user messages that can effectively trigger the system prompt's functionality
 3. Each test case should test different aspects or scenarios
 4. Test cases should be specific, practical problems or requests
 5. Avoid test cases that are too simple or too complex
 6. Ensure test cases can demonstrate the core capabilities of the system prompt
-
-Please return in the following format:
-1. [First test case]
-2. [Second test case]
-3. [Third test case]
+{focus}
+Output: Return ONLY valid JSON (no markdown, no code fences).
+Schema: {{"test_cases": [{{"message": "...", "aspect": "..."}}]}}
         """
 
-        user_message = f"Please generate {count} test cases for the following system prompt:\n\n{system_prompt}"
-
-        try:
-            response = self.call_llm(generator_system_message, user_message)
+        user_message = f"Please generate {size} test cases for the following system prompt:\n\n{system_prompt}"
+        if avoid:
+            existing = "\n".join(f"- {case}" for case in avoid)
+            user_message += (
+                "\n\nThe following test cases already exist. "
+                f"Do not repeat or paraphrase them:\n{existing}"
+            )
+        return generator_system_message, user_message
+
+    @staticmethod
+    def _parse_test_cases(response: str) -> List[str]:
+        """
+        Parse the JSON test case list, falling back to numbered lines.
+        """
+        text = response or ""
+        parsed = extract_json(text, schema=agent_prompt.test_cases_schema)
+        items = parsed.get("test_cases") if isinstance(parsed, dict) else parsed
+        if isinstance(items, list):
             test_cases = []
-            lines = response.strip().split("\n")
-            for line in lines:
-                line = line.strip()
-                if line and (
-                    line.startswith("1.")
-                    or line.startswith("2.")
-                    or line.startswith("3.")
-                ):
-                    test_case = line[2:].strip()
-                    if test_case:
-                        test_cases.append(test_case)
-
-            # If parsing fails, generate default test cases
-            if not test_cases:
-                test_cases = [
-                    "Please help me solve a problem.",
-                    "I need your advice.",
-                    "Please assist me with a task.",
-                ][:count]
-
-            return test_cases[:count]
-
-        except Exception as e:
-            # If generation fails, return generic test cases
-            return [
-                "Please help me solve a problem.",
-                "I need your advice.",
-                "Please assist me with a task.",
-            ][:count]
+            for item in items:
+                if isinstance(item, dict):
+                    item = item.get("message")
+                if isinstance(item, str) and item.strip():
+                    test_cases.append(item.strip())
+            if test_cases:
+                return test_cases
+
+        test_cases = []
+        for line in text.split("\n"):
+            match = NUMBERED_LINE_PATTERN.match(line.strip())
+            if match and match.group(1).strip():
+                test_cases.append(match.group(1).strip())
+        return test_cases
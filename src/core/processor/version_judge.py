@@ -0,0 +1,288 @@
+import hashlib
+import sys
+import os
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .basic_handler import BasicHandler
+from ..utils.json_extract import extract_json
+from ..utils.tournament import (
+    bradley_terry,
+    elo_ratings,
+    swiss_pairings,
+    swiss_rounds,
+)
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+import agent_prompt
+
+JUDGE_CACHE_SIZE = 4096
+RESPONSE_CACHE_SIZE = 2048
+MAX_JUDGE_RESPONSE_CHARS = 4000
+MAX_TOURNAMENT_VERSIONS = 64
+# Keyed by (version hash, test hash, model)
+_RESPONSE_CACHE: "OrderedDict[tuple, str]" = OrderedDict()
+# Keyed by (test hash, response hash A, response hash B, (judge model name, base URL))
+_JUDGMENT_CACHE: "OrderedDict[tuple, str]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def _digest(text: Optional[str]) -> str:
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+
+def _cache_get(cache: OrderedDict, key: tuple) -> Optional[str]:
+    with _CACHE_LOCK:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def _cache_put(cache: OrderedDict, key: tuple, value: str, limit: int) -> None:
+    with _CACHE_LOCK:
+        cache[key] = value
+        while len(cache) > limit:
+            cache.popitem(last=False)
+
+
+class VersionJudge(BasicHandler):
+    """
+    Ranks prompt versions with a Swiss tournament of pairwise LLM judgments
+    on a shared test set, scored with Bradley-Terry.
+    """
+
+    def rank_versions(
+        self, versions: Dict[int, str], test_cases: Sequence[str]
+    ) -> Dict[str, object]:
+        """
+        :param versions: version id -> prompt content.
+        :param test_cases: User messages every version is judged on.
+        :return: {"ranking": [...], "matches", "comparisons", "rounds", "judge_model",
+            "judge_base_url", "test_set_hash"}
+        """
+        version_ids = list(versions)[:MAX_TOURNAMENT_VERSIONS]
+        test_cases = [t for t in test_cases if t and t.strip()]
+        if len(version_ids) < 2 or not test_cases:
+            raise ValueError("At least two versions and one test case are required")
+
+        test_hashes = [_digest(t) for t in test_cases]
+        judge_model = self._model_identity(
+            self.route_kwargs("pairwise_judge").get("model_key")
+        )
+        responses = self._collect_responses(versions, version_ids, test_cases)
+
+        points: Dict[int, float] = defaultdict(float)
+        played: set = set()
+        byes: set = set()
+        outcomes: List[Tuple[int, int, float]] = []
+        records = {v: {"wins": 0, "losses": 0, "ties": 0} for v in version_ids}
+        matches = []
+        rounds = swiss_rounds(len(version_ids))
+
+        for round_number in range(1, rounds + 1):
+            # Stable order keeps pairings reproducible for equal scores
+            standings = sorted(
+                version_ids, key=lambda v: (-points[v], version_ids.index(v))
+            )
+            pairs, bye = swiss_pairings(standings, played, byes)
+            if bye is not None:
+                byes.add(bye)
+                points[bye] += 0.5
+
+            games = [(a, b, t) for a, b in pairs for t in range(len(test_cases))]
+            verdicts = self._judge_games(
+                games, responses, test_cases, test_hashes, judge_model
+            )
+            for (a, b), start in zip(pairs, range(0, len(games), len(test_cases))):
+                played.add(frozenset((a, b)))
+                match_score = 0.0
+                for game in range(start, start + len(test_cases)):
+                    score = verdicts[game]
+                    outcomes.append((a, b, score))
+                    match_score += score
+                    if score == 0.5:
+                        records[a]["ties"] += 1
+                        records[b]["ties"] += 1
+                    else:
+                        winner, loser = (a, b) if score == 1.0 else (b, a)
+                        records[winner]["wins"] += 1
+                        records[loser]["losses"] += 1
+                share = match_score / len(test_cases)
+                points[a] += share
+                points[b] += 1 - share
+                matches.append(
+                    {"round": round_number, "a": a, "b": b, "score_a": round(share, 4)}
+                )
+
+        strengths = bradley_terry(outcomes, version_ids)
+        ratings = elo_ratings(strengths)
+        ordered = sorted(version_ids, key=lambda v: -strengths[v])
+        ranking = [
+            {
+                "version_id": v,
+                "rank": position,
+                "rating": ratings[v],
+                "bt_strength": round(strengths[v], 4),
+                "matches": sum(1 for m in matches if v in (m["a"], m["b"])),
+                **records[v],
+            }
+            for position, v in enumerate(ordered, start=1)
+        ]
+        return {
+            "ranking": ranking,
+            "matches": matches,
+            "comparisons": len(outcomes),
+            "rounds": rounds,
+            "judge_model": judge_model[0],
+            "judge_base_url": judge_model[1],
+            "test_set_hash": _digest("\n".join(test_hashes)),
+        }
+
+    def _model_identity(self, model_key: Optional[str]) -> Tuple[str, str]:
+        """
+        The (model name, base URL) a models_config key resolves to, so cached
+        judgments follow the model itself rather than the config key naming it.
+        """
+        models_config = getattr(self.ai_server, "models_config", None) or {}
+        config = models_config.get(model_key) or getattr(
+            self.ai_server, "current_config", None
+        ) or {}
+        return config.get("model_name", ""), config.get("base_url", "")
+
+    def _collect_responses(
+        self, versions: Dict[int, str], version_ids: List[int], test_cases: Sequence[str]
+    ) -> Dict[Tuple[int, int], Optional[str]]:
+        """
+        Every version's response to every test case, reusing cached ones.
+        :return: (version id, test index) -> response, or None when it failed.
+        """
+        model = (getattr(self.ai_server, "current_config", None) or {}).get(
+            "model_name", ""
+        )
+        responses: Dict[Tuple[int, int], Optional[str]] = {}
+        pending: List[Tuple[int, int]] = []
+        for v in version_ids:
+            for t, test_case in enumerate(test_cases):
+                key = (_digest(versions[v]), _digest(test_case), model)
+                cached = _cache_get(_RESPONSE_CACHE, key)
+                if cached is not None:
+                    responses[(v, t)] = cached
+                else:
+                    pending.append((v, t))
+
+        fresh = self.call_llm_many(
+            [(versions[v], test_cases[t]) for v, t in pending],
+            return_exceptions=True,
+        )
+        for (v, t), output in zip(pending, fresh):
+            if isinstance(output, Exception):
+                # A failed response loses its games instead of aborting the run
+                print(f"Warning: Version {v} failed on test case {t}: {output}")
+                responses[(v, t)] = None
+                continue
+            responses[(v, t)] = output
+            _cache_put(
+                _RESPONSE_CACHE,
+                (_digest(versions[v]), _digest(test_cases[t]), model),
+                output,
+                RESPONSE_CACHE_SIZE,
+            )
+        return responses
+
+    def _judge_games(
+        self,
+        games: List[Tuple[int, int, int]],
+        responses: Dict[Tuple[int, int], Optional[str]],
+        test_cases: Sequence[str],
+        test_hashes: List[str],
+        judge_model: Tuple[str, str],
+    ) -> List[float]:
+        """
+        Judge (a, b, test index) games concurrently.
+        :return: Score of `a` per game: 1 win, 0.5 tie, 0 loss.
+        """
+        scores: List[Optional[float]] = [None] * len(games)
+        pending: List[int] = []
+        oriented: List[Tuple[int, int]] = []
+        keys: List[Optional[tuple]] = []
+        for i, (a, b, t) in enumerate(games):
+            # Alternate which version is shown first to offset position bias
+            first, second = (a, b) if int(test_hashes[t], 16) % 2 == 0 else (b, a)
+            oriented.append((first, second))
+            response_a, response_b = responses[(a, t)], responses[(b, t)]
+            if response_a is None or response_b is None:
+                # A failed response loses without a judge call; never cached
+                if response_a is None and response_b is None:
+                    scores[i] = 0.5
+                else:
+                    scores[i] = 0.0 if response_a is None else 1.0
+                keys.append(None)
+                continue
+            key = (
+                test_hashes[t],
+                _digest(responses[(first, t)]),
+                _digest(responses[(second, t)]),
+                judge_model,
+            )
+            keys.append(key)
+            cached = _cache_get(_JUDGMENT_CACHE, key)
+            if cached is not None:
+                scores[i] = self._score(cached, a, first)
+            else:
+                pending.append(i)
+
+        if pending:
+            raw = self.call_llm_many(
+                [
+                    (
+                        agent_prompt.pairwise_judge_system_prompt,
+                        self._judge_message(
+                            test_cases[games[i][2]],
+                            responses[(oriented[i][0], games[i][2])],
+                            responses[(oriented[i][1], games[i][2])],
+                        ),
+                    )
+                    for i in pending
+                ],
+                return_exceptions=True,
+                agent_key="pairwise_judge",
+                response_schema=agent_prompt.pairwise_judge_schema,
+            )
+            for i, output in zip(pending, raw):
+                a = games[i][0]
+                first, second = oriented[i]
+                winner = self._parse_winner(output)
+                if winner is None:
+                    print(f"Warning: Unusable judgment for versions {first}/{second}")
+                    scores[i] = 0.5
+                    continue
+                _cache_put(_JUDGMENT_CACHE, keys[i], winner, JUDGE_CACHE_SIZE)
+                scores[i] = self._score(winner, a, first)
+        return scores
+
+    @staticmethod
+    def _judge_message(test_case: str, response_a: str, response_b: str) -> str:
+        return (
+            f"User message:\n{test_case}\n\n"
+            f"=== Response A ===\n{response_a[:MAX_JUDGE_RESPONSE_CHARS]}\n\n"
+            f"=== Response B ===\n{response_b[:MAX_JUDGE_RESPONSE_CHARS]}\n"
+        )
+
+    @staticmethod
+    def _parse_winner(output) -> Optional[str]:
+        if isinstance(output, Exception):
+            return None
+        parsed = extract_json(output, expect=dict, schema=agent_prompt.pairwise_judge_schema)
+        winner = str((parsed or {}).get("winner", "")).strip()
+        if winner.upper() in ("A", "B"):
+            return winner.upper()
+        return "tie" if winner.lower() == "tie" else None
+
+    @staticmethod
+    def _score(winner: str, a: int, first: int) -> float:
+        if winner == "tie":
+            return 0.5
+        return 1.0 if (winner == "A") == (a == first) else 0.0
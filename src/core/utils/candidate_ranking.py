@@ -0,0 +1,109 @@
+import re
+from typing import Dict, List, Sequence, Tuple
+
+from .output_repair import missing_headings
+from .section_patch import section_key, section_titles
+from .similarity import dedupe_near_duplicates
+
+_PLACEHOLDER = re.compile(r"\{\{?\s*[\w.-]+\s*\}?\}|<[A-Z_]{2,}>|\$\{?\w+\}?")
+_CONSTRAINT_CUE = re.compile(
+    r"\b(must|never|always|only|do not|don't|should not|no more than|at most|at least|exactly|required?)\b"
+    r"|必须|不要|禁止|不得|只能|仅",
+    re.IGNORECASE,
+)
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Weights of the heuristic signals in the final score
+RANKING_WEIGHTS = {"sections": 0.35, "constraints": 0.4, "length": 0.25}
+# Length ratio (candidate / original) that is not penalized
+PREFERRED_LENGTH_RATIO = (0.8, 2.5)
+CONSTRAINT_OVERLAP = 0.5
+DUPLICATE_THRESHOLD = 0.9
+
+
+def _words(text: str) -> set:
+    return {w.lower() for w in _WORD.findall(text or "")}
+
+
+def constraint_lines(prompt: str) -> List[str]:
+    """
+    Lines of the prompt that state a hard rule (must/never/only/...).
+    """
+    return [
+        line.strip()
+        for line in (prompt or "").splitlines()
+        if line.strip() and _CONSTRAINT_CUE.search(line)
+    ]
+
+
+def section_coverage(candidate: str, original: str) -> float:
+    """
+    Fraction of the original's sections kept, halved when a required heading
+    the original had is lost; 1.0 when the original has no sections.
+    """
+    expected = {section_key(t) for t in section_titles(original)}
+    present = {section_key(t) for t in section_titles(candidate)}
+    required = set(missing_headings(candidate)) - set(missing_headings(original))
+    if not expected:
+        return 0.0 if required else 1.0
+    kept = len(expected & present) / len(expected)
+    return kept * (0.5 if required else 1.0)
+
+
+def constraint_preservation(candidate: str, original: str) -> float:
+    """
+    Fraction of the original's placeholders and rule lines still present.
+    A rule counts as kept when most of its words appear in the candidate.
+    """
+    candidate_words = _words(candidate)
+    placeholders = set(_PLACEHOLDER.findall(original or ""))
+    rules = constraint_lines(original)
+    if not placeholders and not rules:
+        return 1.0
+
+    kept = sum(1 for p in placeholders if p in candidate)
+    for rule in rules:
+        words = _words(rule)
+        if words and len(words & candidate_words) / len(words) >= CONSTRAINT_OVERLAP:
+            kept += 1
+    return kept / (len(placeholders) + len(rules))
+
+
+def length_score(candidate: str, original: str) -> float:
+    if not original:
+        return 1.0
+    ratio = len(candidate or "") / len(original)
+    low, high = PREFERRED_LENGTH_RATIO
+    if ratio < low:
+        return max(ratio / low, 0.0)
+    if ratio > high:
+        return max(high / ratio, 0.0)
+    return 1.0
+
+
+def score_candidate(candidate: str, original: str) -> Tuple[float, Dict[str, float]]:
+    """
+    :return: (weighted score in [0, 1], individual signals)
+    """
+    signals = {
+        "sections": section_coverage(candidate, original),
+        "constraints": constraint_preservation(candidate, original),
+        "length": length_score(candidate, original),
+    }
+    score = sum(RANKING_WEIGHTS[name] * value for name, value in signals.items())
+    return round(score, 4), {k: round(v, 4) for k, v in signals.items()}
+
+
+def rank_candidates(
+    candidates: Sequence[str], original: str
+) -> List[Tuple[str, float, Dict[str, float]]]:
+    """
+    Drop near-duplicate and empty candidates and order the rest by score.
+    Ties keep sampling order.
+    :return: [(candidate, score, signals)] best first
+    """
+    unique = dedupe_near_duplicates(
+        [c for c in candidates if c and c.strip()], threshold=DUPLICATE_THRESHOLD
+    )
+    scored = [(c, *score_candidate(c, original)) for c in unique]
+    return sorted(scored, key=lambda item: -item[1])
@@ -0,0 +1,122 @@
+from typing import Dict, List, Optional, Sequence
+
+from .token_budget import estimate_tokens
+
+# Older turns are summarized in whole blocks, so the window start (and the
+# summary in front of it) only moves every SUMMARY_BLOCK_TURNS turns
+SUMMARY_BLOCK_TURNS = 6
+SUMMARY_MAX_TOKENS = 400
+# Per-message overhead of the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+MIN_MESSAGE_TOKENS = 120
+SUMMARY_MESSAGE_PREFIX = "Summary of the earlier conversation:\n"
+
+
+def group_turns(history: Sequence[Dict[str, str]]) -> List[List[Dict[str, str]]]:
+    """
+    Split {"role", "content"} messages into turns, each starting at a user message.
+    """
+    turns: List[List[Dict[str, str]]] = []
+    for message in history:
+        if message["role"] == "user" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def turns_tokens(turns: Sequence[Sequence[Dict[str, str]]]) -> int:
+    return sum(
+        estimate_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS
+        for turn in turns
+        for m in turn
+    )
+
+
+def summarized_turn_count(
+    turns: Sequence[Sequence[Dict[str, str]]],
+    budget: int,
+    block: int = SUMMARY_BLOCK_TURNS,
+) -> int:
+    """
+    Number of leading turns to fold into the summary so the rest fits `budget`.
+    Prefers a multiple of `block`; falls back to turn granularity only when
+    the budget is too small for that. The latest turn is always kept.
+    """
+    if turns_tokens(turns) <= budget:
+        return 0
+    recent_budget = budget - SUMMARY_MAX_TOKENS
+    last = len(turns) - 1
+    count = 0
+    while count + block <= last:
+        count += block
+        if turns_tokens(turns[count:]) <= recent_budget:
+            return count
+    while count < last and turns_tokens(turns[count:]) > recent_budget:
+        count += 1
+    return count
+
+
+def _trim_middle(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # estimate_tokens counts >= 1 token per 4 characters
+    keep = max(max_tokens * 4 // 2, 1)
+    while keep > 1 and estimate_tokens(text[:keep] + text[-keep:]) > max_tokens:
+        keep //= 2
+    return f"{text[:keep]}\n[...]\n{text[-keep:]}"
+
+
+def fit_recent_turns(
+    turns: Sequence[Sequence[Dict[str, str]]], budget: int
+) -> List[Dict[str, str]]:
+    """
+    Flatten the kept turns, trimming the longest messages when they still do
+    not fit `budget` (e.g. a single huge answer).
+    """
+    messages = [dict(m) for turn in turns for m in turn]
+    overflow = turns_tokens([messages]) - budget
+    for message in sorted(messages, key=lambda m: -estimate_tokens(m["content"])):
+        if overflow <= 0:
+            break
+        size = estimate_tokens(message["content"])
+        target = max(size - overflow, MIN_MESSAGE_TOKENS)
+        if target < size:
+            message["content"] = _trim_middle(message["content"], target)
+            overflow -= size - estimate_tokens(message["content"])
+    return messages
+
+
+def local_summary(turns: Sequence[Sequence[Dict[str, str]]], max_tokens: int = SUMMARY_MAX_TOKENS) -> str:
+    """
+    Extractive fallback when no summary model call is available.
+    """
+    if not turns:
+        return ""
+    per_message = max(max_tokens // sum(len(turn) for turn in turns), 8)
+    lines = [
+        f"{'User' if m['role'] == 'user' else 'Assistant'}: "
+        f"{_trim_middle(' '.join(m['content'].split()), per_message)}"
+        for turn in turns
+        for m in turn
+    ]
+    return _trim_middle("\n".join(lines), max_tokens)
+
+
+def build_chat_messages(
+    system_prompt: str,
+    recent: Sequence[Dict[str, str]],
+    user_message: str,
+    summary: Optional[str] = None,
+) -> List[Dict[str, str]]:
+    """
+    System prompt first and unchanged, then the block summary, the recent
+    window and the new message, so consecutive requests share a prefix.
+    """
+    messages = [{"role": "system", "content": system_prompt}]
+    if summary:
+        messages.append(
+            {"role": "system", "content": SUMMARY_MESSAGE_PREFIX + summary}
+        )
+    messages.extend({"role": m["role"], "content": m["content"]} for m in recent)
+    messages.append({"role": "user", "content": user_message})
+    return messages
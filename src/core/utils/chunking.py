@@ -0,0 +1,135 @@
+import re
+from typing import List, Optional, Tuple
+
+from .token_budget import estimate_tokens
+
+_HEADING = re.compile(r"^\s*(#{1,6}\s|[A-Z][\w ]{0,40}:\s*$|(example|示例|例子)\s*\d*\s*[:：])", re.IGNORECASE)
+_FENCE = re.compile(r"^\s*(```|~~~)")
+# A sentence with its end punctuation, without leading whitespace
+_SENTENCE = re.compile(r"\S.*?(?:[.!?。！？]|$)", re.DOTALL)
+
+
+Span = Tuple[int, int]
+
+
+def _structural_blocks(text: str) -> List[Span]:
+    """
+    Split text into blocks at blank lines and headings, keeping fenced code together.
+    :return: (start, end) offsets of each block in `text`, blank lines excluded.
+    """
+    blocks: List[Span] = []
+    current: List[Span] = []
+    in_fence = False
+
+    def flush():
+        if current:
+            blocks.append((current[0][0], current[-1][1]))
+        current.clear()
+
+    offset = 0
+    for raw_line in text.splitlines(keepends=True):
+        line = raw_line.rstrip("\r\n")
+        span = (offset, offset + len(line))
+        offset += len(raw_line)
+        if _FENCE.match(line):
+            if not in_fence:
+                flush()
+            current.append(span)
+            in_fence = not in_fence
+            if not in_fence:
+                flush()
+            continue
+        if in_fence:
+            current.append(span)
+            continue
+        if not line.strip():
+            flush()
+            continue
+        if _HEADING.match(line):
+            flush()
+        current.append(span)
+    flush()
+    return blocks
+
+
+def _token_windows(text: str, start: int, end: int, max_tokens: int) -> List[Span]:
+    """
+    Consecutive windows of at most `max_tokens` (by estimate_tokens) over text[start:end].
+    """
+    max_tokens = max(max_tokens, 1)
+    windows: List[Span] = []
+    while start < end:
+        # estimate_tokens counts at most one token per character and at least
+        # one per four, so the window holds between max_tokens and 4x characters
+        low = min(start + max_tokens, end)
+        high = min(start + 4 * max_tokens, end)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if estimate_tokens(text[start:mid]) <= max_tokens:
+                low = mid
+            else:
+                high = mid - 1
+        windows.append((start, low))
+        start = low
+    return windows
+
+
+def _split_oversized(text: str, block: Span, max_tokens: int) -> List[Span]:
+    block_start, block_end = block
+    pieces = [
+        (block_start + m.start(), block_start + m.end())
+        for m in re.finditer(r"[^\r\n]*\S[^\r\n]*", text[block_start:block_end])
+    ]
+    if len(pieces) <= 1:
+        pieces = [
+            (block_start + m.start(), block_start + m.end())
+            for m in _SENTENCE.finditer(text[block_start:block_end])
+        ]
+
+    parts: List[Span] = []
+    for start, end in pieces:
+        if estimate_tokens(text[start:end]) <= max_tokens:
+            parts.append((start, end))
+        else:
+            # Last resort for a single huge sentence: token-sized windows
+            parts.extend(_token_windows(text, start, end, max_tokens))
+    return parts
+
+
+def split_on_structure(text: str, max_tokens: int) -> List[str]:
+    """
+    Split text into chunks of at most ~`max_tokens`, preferring heading,
+    paragraph and code-fence boundaries, then lines, then sentences.
+    Chunks are slices of `text`; only whitespace between chunks is dropped.
+    :param text: Text to split.
+    :param max_tokens: Target upper bound per chunk (see estimate_tokens).
+    :return: Chunks in original order; a single chunk when the text already fits.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    units: List[Span] = []
+    for block in _structural_blocks(text):
+        if estimate_tokens(text[block[0] : block[1]]) > max_tokens:
+            units.extend(_split_oversized(text, block, max_tokens))
+        else:
+            units.append(block)
+
+    chunks: List[str] = []
+    first: Optional[Span] = None
+    last: Optional[Span] = None
+    used = 0
+    for unit in units:
+        # A unit costs its own tokens plus the separator before it
+        cost = estimate_tokens(text[last[1] if first else unit[0] : unit[1]])
+        if first is not None and used + cost > max_tokens:
+            chunks.append(text[first[0] : last[1]])
+            first = None
+            cost = estimate_tokens(text[unit[0] : unit[1]])
+        if first is None:
+            first, used = unit, 0
+        last = unit
+        used += cost
+    if first is not None:
+        chunks.append(text[first[0] : last[1]])
+    return chunks
@@ -0,0 +1,210 @@
+import json
+import re
+from typing import Any, Iterator, List, Optional, Tuple
+
+from .json_schema import is_valid
+
+_OPENER = re.compile(r"[{\[]")
+# Characters the scanner has to look at inside a candidate / inside a string;
+# everything else is skipped by the regex engine
+_STRUCTURAL = re.compile(r'[{}\[\]"]')
+_STRING_END = re.compile(r'["\\]')
+_FENCE_INFO = re.compile(r"[a-zA-Z0-9_-]*[ \t]*")
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def iter_json_spans(text: str) -> Iterator[Tuple[int, int, bool]]:
+    """
+    Scan text once for top-level bracketed spans, tracking strings and escapes
+    so braces inside JSON strings do not count. Prose and code fences around
+    the spans are skipped. A span with a mismatched closer is abandoned and
+    scanning resumes at the next opener.
+    :param text: Raw model output.
+    :return: (start, end, complete) per span; an unterminated span at the end of
+        the text (e.g. a truncated generation) is yielded last with complete=False.
+    """
+    pos = 0
+    while True:
+        match = _OPENER.search(text, pos)
+        if not match:
+            return
+        start = match.start()
+        stack = [_CLOSERS[text[start]]]
+        i = start + 1
+        mismatched = truncated = False
+        while stack:
+            token = _STRUCTURAL.search(text, i)
+            if not token:
+                truncated = True
+                break
+            ch, i = token.group(), token.end()
+            if ch == '"':
+                # Jump to the closing quote, skipping escaped characters
+                while True:
+                    quote = _STRING_END.search(text, i)
+                    if not quote:
+                        truncated = True
+                        break
+                    i = quote.end()
+                    if quote.group() == '"':
+                        break
+                    i += 1
+                if truncated:
+                    break
+            elif ch in _CLOSERS:
+                stack.append(_CLOSERS[ch])
+            elif ch == stack[-1]:
+                stack.pop()
+            else:
+                mismatched = True
+                break
+
+        if not stack:
+            yield start, i, True
+            pos = i
+        elif mismatched:
+            pos = start + 1
+        else:
+            yield start, len(text), False
+            return
+
+
+def balance_brackets(text: str) -> str:
+    """
+    Close an unterminated string and any unclosed braces/brackets,
+    and drop closers that have no matching opener.
+    """
+    stack: List[str] = []
+    out: List[str] = []
+    in_string = False
+    escaped = False
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in _CLOSERS:
+            stack.append(_CLOSERS[ch])
+        elif ch in "}]":
+            if not stack or stack[-1] != ch:
+                continue
+            stack.pop()
+        out.append(ch)
+    if in_string:
+        out.append('"')
+    repaired = "".join(out).rstrip().rstrip(",")
+    return repaired + "".join(reversed(stack))
+
+
+def _loads(text: str) -> Any:
+    try:
+        return json.loads(text)
+    except Exception:
+        pass
+    try:
+        return json.loads(_TRAILING_COMMA.sub(r"\1", text))
+    except Exception:
+        return None
+
+
+def find_fence_block(text: str) -> Optional[Tuple[int, int, str]]:
+    """
+    The first ``` code block whose closing fence starts a line, found with
+    str.find rather than a lazy regex scan over the body.
+    :return: (start, end, body) or None.
+    """
+    opening = text.find("```")
+    if opening == -1:
+        return None
+    newline = text.find("\n", opening + 3)
+    if newline == -1 or not _FENCE_INFO.fullmatch(text, opening + 3, newline):
+        return None
+    closing = text.find("```", newline)
+    while closing != -1:
+        line_start = text.rfind("\n", newline, closing)
+        if line_start != -1 and not text[line_start + 1 : closing].strip(" \t"):
+            return opening, closing + 3, text[newline + 1 : line_start]
+        closing = text.find("```", closing + 3)
+    return None
+
+
+def _matches(value: Any, expect: Optional[type]) -> bool:
+    return value is not None and (expect is None or isinstance(value, expect))
+
+
+def iter_json_values(text: str, expect: Optional[type] = None) -> Iterator[Any]:
+    """
+    Yield every JSON value found in model output, in order of appearance.
+    Output that is exactly one JSON document, bare or in a single code fence,
+    is parsed once without scanning.
+    :param text: Raw model output.
+    :param expect: dict or list to only yield values of that top-level type.
+    """
+    if not text or not text.strip():
+        return
+    fenced = find_fence_block(text)
+    whole = fenced[2].strip() if fenced else text.strip()
+    skip = fenced[:2] if fenced else (0, 0)
+    if whole[:1] in _CLOSERS:
+        try:
+            value = json.loads(whole)
+        except Exception:
+            skip = (0, 0)
+        else:
+            if _matches(value, expect):
+                yield value
+            if not fenced:
+                return
+
+    for start, end, complete in iter_json_spans(text):
+        if skip[0] <= start < skip[1]:
+            continue
+        if expect is not None and text[start] != ("{" if expect is dict else "["):
+            continue
+        span = text[start:end]
+        value = _loads(span if complete else balance_brackets(span))
+        if _matches(value, expect):
+            yield value
+
+
+def extract_json(
+    text: str, expect: Optional[type] = None, schema: Optional[dict] = None
+) -> Any:
+    """
+    Extract the JSON value from model output: code fences, surrounding prose,
+    trailing commas, several candidate objects and truncated output are tolerated.
+    :param text: Raw model output.
+    :param expect: dict or list to require a specific top-level type.
+    :param schema: JSON schema used to choose between candidates; the first
+        conforming one wins, otherwise the first candidate is returned.
+    :return: The parsed value, or None when nothing usable was found.
+    """
+    stripped = (text or "").strip()
+    if stripped[:1] in _CLOSERS:
+        # A single JSON document is the only candidate; no selection needed
+        try:
+            value = json.loads(stripped)
+        except Exception:
+            pass
+        else:
+            return value if _matches(value, expect) else None
+
+    fallback = None
+    for value in iter_json_values(text, expect):
+        if not schema or is_valid(value, schema):
+            return value
+        if fallback is None:
+            fallback = value
+    return fallback
+
+
+def extract_all_json(text: str, expect: Optional[type] = None) -> List[Any]:
+    return list(iter_json_values(text, expect))
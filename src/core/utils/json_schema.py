@@ -0,0 +1,74 @@
+from typing import Any, List
+
+# Subset of JSON Schema used by the agent schemas in agent_prompt:
+# type, properties, required, additionalProperties (bool), items,
+# enum, minItems/maxItems, minLength/maxLength, minimum/maximum
+_TYPE_CHECKS = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+
+def validate(instance: Any, schema: dict, path: str = "$") -> List[str]:
+    """
+    Validate an instance against a JSON Schema subset.
+    :param instance: Parsed JSON value.
+    :param schema: Schema dict.
+    :param path: JSON path of `instance`, used in error messages.
+    :return: Human-readable errors; empty when the instance is valid.
+    """
+    if not schema:
+        return []
+
+    expected = schema.get("type")
+    if expected:
+        types = expected if isinstance(expected, list) else (expected,)
+        if not any(t not in _TYPE_CHECKS or _TYPE_CHECKS[t](instance) for t in types):
+            return [f"{path}: expected {'/'.join(types)}, got {type(instance).__name__}"]
+
+    errors: List[str] = []
+    if "enum" in schema and instance not in schema["enum"]:
+        errors.append(f"{path}: {instance!r} is not one of {schema['enum']}")
+
+    if isinstance(instance, dict):
+        properties = schema.get("properties", {})
+        for key in schema.get("required", []):
+            if key not in instance:
+                errors.append(f"{path}: missing required property '{key}'")
+        for key, value in instance.items():
+            if key in properties:
+                errors.extend(validate(value, properties[key], f"{path}.{key}"))
+            elif schema.get("additionalProperties") is False:
+                errors.append(f"{path}: unexpected property '{key}'")
+
+    elif isinstance(instance, list):
+        if "minItems" in schema and len(instance) < schema["minItems"]:
+            errors.append(f"{path}: fewer than {schema['minItems']} items")
+        if "maxItems" in schema and len(instance) > schema["maxItems"]:
+            errors.append(f"{path}: more than {schema['maxItems']} items")
+        if "items" in schema:
+            for i, item in enumerate(instance):
+                errors.extend(validate(item, schema["items"], f"{path}[{i}]"))
+
+    elif isinstance(instance, str):
+        if "minLength" in schema and len(instance) < schema["minLength"]:
+            errors.append(f"{path}: shorter than {schema['minLength']} characters")
+        if "maxLength" in schema and len(instance) > schema["maxLength"]:
+            errors.append(f"{path}: longer than {schema['maxLength']} characters")
+
+    elif _TYPE_CHECKS["number"](instance):
+        if "minimum" in schema and instance < schema["minimum"]:
+            errors.append(f"{path}: below minimum {schema['minimum']}")
+        if "maximum" in schema and instance > schema["maximum"]:
+            errors.append(f"{path}: above maximum {schema['maximum']}")
+
+    return errors
+
+
+def is_valid(instance: Any, schema: dict) -> bool:
+    return not validate(instance, schema)
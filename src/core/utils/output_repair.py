@@ -0,0 +1,36 @@
+import re
+from typing import Iterable, List
+
+# Headings the structuring prompt requires, in their canonical "# Title:" form
+REQUIRED_PROMPT_HEADINGS = ("Task Objective",)
+
+
+def normalize_headings(text: str, headings: Iterable[str] = REQUIRED_PROMPT_HEADINGS) -> str:
+    """
+    Rewrite common variants of the given headings to the canonical "# Title:" form,
+    e.g. "**Task Objective**:", "Task Objective：", "## Task objective".
+    A bare line starting with the words is left alone unless it carries a
+    heading marker, bold markup or a colon.
+    """
+    for heading in headings:
+        if f"# {heading}:" in text:
+            continue
+        words = r"\s+".join(re.escape(w) for w in heading.split())
+        pattern = re.compile(
+            rf"^[ \t]*(#{{1,6}}[ \t]*)?(\*\*|__)?[ \t]*{words}[ \t]*(?:\*\*|__)?[ \t]*([:：])?[ \t]*(?:\*\*|__)?[ \t]*",
+            re.IGNORECASE | re.MULTILINE,
+        )
+
+        for match in pattern.finditer(text):
+            if not any(match.group(i) for i in (1, 2, 3)):
+                continue
+            line_end = text.find("\n", match.end())
+            rest = text[match.end() : line_end if line_end >= 0 else len(text)]
+            canonical = f"# {heading}: " if rest.strip() else f"# {heading}:"
+            text = text[: match.start()] + canonical + text[match.end() :]
+            break
+    return text
+
+
+def missing_headings(text: str, headings: Iterable[str] = REQUIRED_PROMPT_HEADINGS) -> List[str]:
+    return [h for h in headings if f"# {h}:" not in (text or "")]
@@ -0,0 +1,192 @@
+import difflib
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+from .section_patch import section_key, split_sections
+from .similarity import jaccard, shingles
+
+_TOKEN = re.compile(r"\S+")
+# Words of unchanged text kept around each change
+DIFF_CONTEXT_WORDS = 4
+MAX_CHANGES_PER_SECTION = 12
+MAX_CHANGE_WORDS = 40
+MAX_SNIPPET_CHARS = 400
+PROMPT_DIFF_CACHE_SIZE = 256
+_PROMPT_DIFF_CACHE: "OrderedDict[Tuple[str, str], List[dict]]" = OrderedDict()
+_PROMPT_DIFF_CACHE_LOCK = threading.Lock()
+
+
+def _digest(text: Optional[str]) -> str:
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+
+def _clip(words: Sequence[str], limit: int = MAX_CHANGE_WORDS) -> str:
+    if len(words) <= limit:
+        return " ".join(words)
+    half = limit // 2
+    return " ".join(words[:half]) + " ... " + " ".join(words[-half:])
+
+
+def word_changes(left: str, right: str) -> List[dict]:
+    """
+    Word-level edits turning `left` into `right`, with a little context.
+    :return: [{"op": replace|delete|insert, "before", "after", "context"}]
+    """
+    a, b = _TOKEN.findall(left or ""), _TOKEN.findall(right or "")
+    changes = []
+    matcher = difflib.SequenceMatcher(a=a, b=b, autojunk=False)
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == "equal":
+            continue
+        changes.append(
+            {
+                "op": op,
+                "before": _clip(a[i1:i2]),
+                "after": _clip(b[j1:j2]),
+                "context": " ".join(a[max(0, i1 - DIFF_CONTEXT_WORDS) : i1]),
+            }
+        )
+    return changes
+
+
+def _section_diff(left: str, right: str) -> List[dict]:
+    left_sections = {section_key(s.title): s for s in split_sections(left)}
+    right_sections = {section_key(s.title): s for s in split_sections(right)}
+    order = list(left_sections) + [k for k in right_sections if k not in left_sections]
+
+    diff = []
+    for key in order:
+        l, r = left_sections.get(key), right_sections.get(key)
+        title = (l or r).title or "(preamble)"
+        if l is None:
+            diff.append({"section": title, "status": "added", "text": r.text})
+        elif r is None:
+            diff.append({"section": title, "status": "removed", "text": l.text})
+        elif l.text.strip() != r.text.strip():
+            changes = word_changes(l.text, r.text)
+            diff.append(
+                {
+                    "section": title,
+                    "status": "changed",
+                    "changes": changes[:MAX_CHANGES_PER_SECTION],
+                    "omitted_changes": max(len(changes) - MAX_CHANGES_PER_SECTION, 0),
+                }
+            )
+    return diff
+
+
+def prompt_diff(left: str, right: str) -> List[dict]:
+    """
+    Section-level diff of two prompts with word-level changes inside changed
+    sections. Unchanged sections are left out. Cached by content.
+    """
+    cache_key = (_digest(left), _digest(right))
+    with _PROMPT_DIFF_CACHE_LOCK:
+        cached = _PROMPT_DIFF_CACHE.get(cache_key)
+        if cached is not None:
+            _PROMPT_DIFF_CACHE.move_to_end(cache_key)
+            return cached
+    diff = _section_diff(left, right)
+    with _PROMPT_DIFF_CACHE_LOCK:
+        _PROMPT_DIFF_CACHE[cache_key] = diff
+        while len(_PROMPT_DIFF_CACHE) > PROMPT_DIFF_CACHE_SIZE:
+            _PROMPT_DIFF_CACHE.popitem(last=False)
+    return diff
+
+
+def _snippet(text: str) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= MAX_SNIPPET_CHARS else text[:MAX_SNIPPET_CHARS] + "..."
+
+
+def transcript_diff(
+    left_messages: Sequence[dict], right_messages: Sequence[dict]
+) -> List[dict]:
+    """
+    Pair the two transcripts turn by turn and describe where the assistant
+    replies diverge.
+    :param left_messages: [{"message_type", "content"}] in order.
+    :return: [{"turn", "user", "similarity", "left", "right", "first_divergence"}]
+    """
+
+    def _turns(messages: Sequence[dict]) -> List[Tuple[str, str]]:
+        turns: List[List[str]] = []
+        for m in messages:
+            content = m.get("content") or ""
+            if m.get("message_type") == "user":
+                turns.append([content, ""])
+                continue
+            if not turns:
+                turns.append(["", ""])
+            turns[-1][1] = (turns[-1][1] + "\n" + content).strip()
+        return [tuple(t) for t in turns]
+
+    left_turns, right_turns = _turns(left_messages), _turns(right_messages)
+    diff = []
+    for i in range(max(len(left_turns), len(right_turns))):
+        l_user, l_reply = left_turns[i] if i < len(left_turns) else ("", "")
+        r_user, r_reply = right_turns[i] if i < len(right_turns) else ("", "")
+        a, b = _TOKEN.findall(l_reply), _TOKEN.findall(r_reply)
+        prefix = 0
+        while prefix < min(len(a), len(b)) and a[prefix] == b[prefix]:
+            prefix += 1
+        diff.append(
+            {
+                "turn": i + 1,
+                "user": _snippet(l_user or r_user),
+                "same_user_message": l_user.strip() == r_user.strip(),
+                "similarity": round(jaccard(shingles(l_reply), shingles(r_reply)), 3),
+                "left_length": len(l_reply),
+                "right_length": len(r_reply),
+                "left": _snippet(" ".join(a[prefix:])) if a else "",
+                "right": _snippet(" ".join(b[prefix:])) if b else "",
+                "first_divergence": _snippet(" ".join(a[max(0, prefix - DIFF_CONTEXT_WORDS) : prefix])),
+            }
+        )
+    return diff
+
+
+def render_diff(prompt_changes: List[dict], transcript_changes: List[dict]) -> str:
+    """
+    Compact text form of the diffs for an LLM explanation request.
+    """
+    lines = ["## Prompt differences (left -> right)"]
+    if not prompt_changes:
+        lines.append("- The prompts are identical.")
+    for section in prompt_changes:
+        if section["status"] in ("added", "removed"):
+            lines.append(
+                f"- Section '{section['section']}' {section['status']}: "
+                f"{_snippet(section['text'])}"
+            )
+            continue
+        lines.append(f"- Section '{section['section']}' changed:")
+        for change in section["changes"]:
+            context = f" (after \"...{change['context']}\")" if change["context"] else ""
+            if change["op"] == "insert":
+                lines.append(f"  + inserted \"{change['after']}\"{context}")
+            elif change["op"] == "delete":
+                lines.append(f"  - removed \"{change['before']}\"{context}")
+            else:
+                lines.append(
+                    f"  ~ \"{change['before']}\" -> \"{change['after']}\"{context}"
+                )
+        if section.get("omitted_changes"):
+            lines.append(f"  ({section['omitted_changes']} smaller changes omitted)")
+
+    lines.append("")
+    lines.append("## Response differences (left vs right)")
+    for turn in transcript_changes:
+        header = f"- Turn {turn['turn']}: similarity {turn['similarity']}, length {turn['left_length']} vs {turn['right_length']}"
+        if not turn["same_user_message"]:
+            header += " (different user messages)"
+        lines.append(header)
+        lines.append(f"  User: {turn['user']}")
+        if turn["first_divergence"]:
+            lines.append(f"  Both replies start alike up to: \"...{turn['first_divergence']}\"")
+        lines.append(f"  Left continues: {turn['left'] or '(no reply)'}")
+        lines.append(f"  Right continues: {turn['right'] or '(no reply)'}")
+    return "\n".join(lines)
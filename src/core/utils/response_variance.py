@@ -0,0 +1,91 @@
+import re
+import statistics
+from collections import Counter
+from itertools import combinations
+from typing import Dict, List, Optional, Sequence
+
+from .json_extract import extract_json
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_JSON_REQUEST = re.compile(r"\bjson\b", re.IGNORECASE)
+_HEADING = re.compile(r"^\s*#{1,6}\s", re.MULTILINE)
+_BULLET = re.compile(r"^\s*[-*•]\s", re.MULTILINE)
+_NUMBERED = re.compile(r"^\s*\d+[.)]\s", re.MULTILINE)
+
+
+def _words(text: str) -> set:
+    return {w.lower() for w in _WORD.findall(text or "")}
+
+
+def format_signature(text: str) -> tuple:
+    """
+    Coarse shape of a response: (json, headings, bullets, numbered list, code fence).
+    """
+    text = text or ""
+    stripped = text.strip()
+    return (
+        stripped[:1] in "{[" and extract_json(stripped) is not None,
+        bool(_HEADING.search(text)),
+        bool(_BULLET.search(text)),
+        bool(_NUMBERED.search(text)),
+        "```" in text,
+    )
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def consistency_metrics(
+    samples: Sequence[str], system_prompt: Optional[str] = None
+) -> Dict[str, Optional[float]]:
+    """
+    Local consistency metrics over responses sampled for the same message.
+    :param samples: Responses for one (version, message) pair.
+    :param system_prompt: Used to decide whether JSON output is required.
+    :return: length spread, pairwise lexical overlap, format agreement, JSON
+        compliance (None unless the prompt asks for JSON) and an overall
+        consistency score in [0, 1].
+    """
+    samples = [s or "" for s in samples]
+    lengths = [len(s) for s in samples]
+    mean_length = statistics.fmean(lengths) if lengths else 0.0
+    length_stdev = statistics.pstdev(lengths) if len(lengths) > 1 else 0.0
+    length_cv = length_stdev / mean_length if mean_length else 0.0
+
+    word_sets = [_words(s) for s in samples]
+    overlaps = [_jaccard(a, b) for a, b in combinations(word_sets, 2)]
+    mean_overlap = statistics.fmean(overlaps) if overlaps else 1.0
+
+    shapes = [format_signature(s) for s in samples]
+    signatures = Counter(shapes)
+    format_agreement = (
+        signatures.most_common(1)[0][1] / len(samples) if samples else 1.0
+    )
+
+    json_compliance = None
+    if system_prompt and _JSON_REQUEST.search(system_prompt):
+        # Strict: the response itself must be JSON, not prose around it
+        json_compliance = (
+            sum(1 for shape in shapes if shape[0]) / len(samples) if samples else 0.0
+        )
+
+    parts: List[float] = [1 - min(length_cv, 1.0), mean_overlap, format_agreement]
+    if json_compliance is not None:
+        parts.append(json_compliance)
+
+    return {
+        "sample_count": len(samples),
+        "mean_length": round(mean_length, 1),
+        "length_stdev": round(length_stdev, 1),
+        "length_cv": round(length_cv, 4),
+        "mean_lexical_overlap": round(mean_overlap, 4),
+        "min_lexical_overlap": round(min(overlaps), 4) if overlaps else 1.0,
+        "format_agreement": round(format_agreement, 4),
+        "json_compliance": (
+            round(json_compliance, 4) if json_compliance is not None else None
+        ),
+        "consistency": round(statistics.fmean(parts), 4),
+    }
@@ -0,0 +1,161 @@
+import re
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*$")
+PATCH_OPERATIONS = ("replace", "delete", "insert_after", "append")
+
+
+class PatchError(ValueError):
+    """Raised when an edit script cannot be applied cleanly."""
+
+    pass
+
+
+@dataclass
+class Section:
+    title: str
+    text: str
+
+
+def section_key(title: str) -> str:
+    """
+    Normalize a heading for matching: "# Task Objective: Write..." -> "task objective".
+    """
+    title = re.sub(r"^#+\s*", "", title or "")
+    title = re.split(r"[:：]", title, maxsplit=1)[0]
+    return " ".join(title.lower().split())
+
+
+def split_sections(prompt: str) -> List[Section]:
+    """
+    Split a prompt into its top-level heading sections.
+    The top level is the shallowest heading level used; deeper headings stay
+    inside their section. Text before the first heading is a section titled "".
+    """
+    lines = (prompt or "").splitlines()
+    in_fence = False
+    heading_levels = []
+    for line in lines:
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+            continue
+        match = None if in_fence else _HEADING.match(line)
+        if match:
+            heading_levels.append(len(match.group(1)))
+    if not heading_levels:
+        return [Section(title="", text=prompt or "")]
+    top_level = min(heading_levels)
+
+    sections: List[Section] = []
+    current_title, current_lines = "", []
+    in_fence = False
+    for line in lines:
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        match = None if in_fence else _HEADING.match(line)
+        if match and len(match.group(1)) == top_level:
+            if current_title or any(l.strip() for l in current_lines):
+                sections.append(Section(current_title, "\n".join(current_lines).strip("\n")))
+            current_title, current_lines = match.group(2), [line]
+        else:
+            current_lines.append(line)
+    if current_title or any(l.strip() for l in current_lines):
+        sections.append(Section(current_title, "\n".join(current_lines).strip("\n")))
+    return sections
+
+
+def _find_section(sections: List[Section], title: str) -> int:
+    key = section_key(title)
+    if not key:
+        raise PatchError("Edit is missing its section title")
+    exact = [i for i, s in enumerate(sections) if section_key(s.title) == key]
+    if len(exact) == 1:
+        return exact[0]
+    prefixed = [i for i, s in enumerate(sections) if section_key(s.title).startswith(key)]
+    if len(exact) > 1 or len(prefixed) != 1:
+        raise PatchError(f"Section '{title}' not found or ambiguous")
+    return prefixed[0]
+
+
+def apply_section_edits(
+    prompt: str,
+    edits: Iterable[dict],
+    *,
+    required_sections: Iterable[str] = (),
+) -> str:
+    """
+    Apply a section-level edit script to a prompt.
+    :param prompt: The previous prompt.
+    :param edits: [{"op": replace|delete|insert_after|append, "section": title, "content": markdown}]
+    :param required_sections: Section titles that must still exist afterwards.
+    :return: The patched prompt.
+    :raises PatchError: When an edit is malformed, targets an unknown section,
+        or the result fails validation.
+    """
+    sections = split_sections(prompt)
+    edits = list(edits or [])
+    if not edits:
+        raise PatchError("Edit script is empty")
+
+    for edit in edits:
+        if not isinstance(edit, dict):
+            raise PatchError("Edit must be an object")
+        op = edit.get("op")
+        content = (edit.get("content") or "").strip("\n")
+        if op not in PATCH_OPERATIONS:
+            raise PatchError(f"Unknown edit operation '{op}'")
+        if op in ("replace", "insert_after", "append") and not content.strip():
+            raise PatchError(f"Edit '{op}' has no content")
+
+        if op == "append":
+            sections.append(Section(_title_of(content), content))
+            continue
+
+        index = _find_section(sections, edit.get("section") or "")
+        if op == "delete":
+            sections.pop(index)
+        elif op == "insert_after":
+            sections.insert(index + 1, Section(_title_of(content), content))
+        else:
+            original = sections[index]
+            if not _HEADING.match(content.splitlines()[0]) and original.title:
+                # Body-only replacement: keep the original heading, replacing any
+                # inline value such as "# Role Setting: Writer"
+                heading = original.text.splitlines()[0]
+                inline = re.match(r"^(.*?[:：])\s*\S", heading)
+                if inline:
+                    content = f"{inline.group(1)} {content.lstrip()}"
+                else:
+                    content = f"{heading}\n{content}"
+            sections[index] = Section(_title_of(content) or original.title, content)
+
+    patched = "\n\n".join(s.text for s in sections if s.text.strip())
+    if not patched.strip():
+        raise PatchError("Patched prompt is empty")
+    present = {section_key(s.title) for s in sections}
+    missing = [t for t in required_sections if section_key(t) not in present]
+    if missing:
+        raise PatchError(f"Patched prompt lost required sections: {missing}")
+    return patched
+
+
+def _title_of(content: str) -> str:
+    first_line = content.strip("\n").splitlines()[0] if content.strip() else ""
+    match = _HEADING.match(first_line)
+    return match.group(2) if match else ""
+
+
+def section_titles(prompt: str) -> List[str]:
+    return [s.title for s in split_sections(prompt) if s.title]
+
+
+def find_section_title(prompt: str, title: str) -> Optional[str]:
+    """
+    Return the prompt's own heading for `title` (e.g. "Task Objective"), or None.
+    """
+    key = section_key(title)
+    for s in split_sections(prompt):
+        if s.title and section_key(s.title) == key:
+            return s.title
+    return None
@@ -0,0 +1,179 @@
+import hashlib
+import random
+import re
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Lowercase the text and collapse punctuation and whitespace.
+    :param text: Raw text.
+    :return: Normalized text.
+    """
+    if not text:
+        return ""
+    return " ".join(_TOKEN_PATTERN.findall(text.lower()))
+
+
+def stable_hash(value: str) -> int:
+    """
+    Process-independent 32-bit hash (Python's hash() is salted per process).
+    """
+    digest = hashlib.blake2b(value.encode("utf-8"), digest_size=4).digest()
+    return int.from_bytes(digest, "little")
+
+
+def shingles(text: str, size: int = 3) -> Set[str]:
+    """
+    Word-level k-shingles of the normalized text.
+    Texts shorter than `size` words yield a single shingle.
+    """
+    tokens = normalize_text(text).split()
+    if not tokens:
+        return set()
+    if len(tokens) <= size:
+        return {" ".join(tokens)}
+    return {" ".join(tokens[i : i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """
+    MinHash signatures over shingle sets, using universal hashing
+    (a * x + b) mod p with a fixed seed so signatures are comparable across runs.
+    """
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        self.num_perm = num_perm
+        rng = random.Random(seed)
+        self._params = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, features: Iterable[str]) -> Tuple[int, ...]:
+        hashed = [stable_hash(f) for f in features]
+        if not hashed:
+            return tuple([_MAX_HASH] * self.num_perm)
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashed)
+            for a, b in self._params
+        )
+
+    def text_signature(self, text: str, shingle_size: int = 3) -> Tuple[int, ...]:
+        return self.signature(shingles(text, shingle_size))
+
+    @staticmethod
+    def similarity(sig_a: Sequence[int], sig_b: Sequence[int]) -> float:
+        """Estimated Jaccard similarity of two signatures."""
+        if not sig_a or len(sig_a) != len(sig_b):
+            return 0.0
+        return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+class MinHashLSH:
+    """
+    Banded locality-sensitive hashing index over MinHash signatures.
+    Candidates returned by `query` still need to be verified with
+    `MinHasher.similarity`.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm must be divisible by bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets: List[Dict[Tuple[int, ...], Set[Hashable]]] = [
+            {} for _ in range(bands)
+        ]
+        self._signatures: Dict[Hashable, Tuple[int, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _band_keys(self, signature: Sequence[int]):
+        for band in range(self.bands):
+            start = band * self.rows
+            yield band, tuple(signature[start : start + self.rows])
+
+    def insert(self, key: Hashable, signature: Sequence[int]) -> None:
+        signature = tuple(signature)
+        self._signatures[key] = signature
+        for band, band_key in self._band_keys(signature):
+            self._buckets[band].setdefault(band_key, set()).add(key)
+
+    def remove(self, key: Hashable) -> None:
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for band, band_key in self._band_keys(signature):
+            bucket = self._buckets[band].get(band_key)
+            if bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band][band_key]
+
+    def query(self, signature: Sequence[int]) -> Set[Hashable]:
+        candidates: Set[Hashable] = set()
+        for band, band_key in self._band_keys(signature):
+            candidates.update(self._buckets[band].get(band_key, ()))
+        return candidates
+
+    def best_match(
+        self, signature: Sequence[int], threshold: float
+    ) -> Tuple[Optional[Hashable], float]:
+        """
+        Return the indexed key most similar to `signature` at or above `threshold`.
+        :return: (key, similarity), or (None, 0.0) when nothing qualifies.
+        """
+        best_key, best_score = None, 0.0
+        for key in self.query(signature):
+            score = MinHasher.similarity(signature, self._signatures[key])
+            if score >= threshold and score > best_score:
+                best_key, best_score = key, score
+        return best_key, best_score
+
+
+def dedupe_near_duplicates(
+    texts: Sequence[str],
+    *,
+    threshold: float = 0.6,
+    existing: Sequence[str] = (),
+    num_perm: int = 64,
+    bands: int = 16,
+) -> List[str]:
+    """
+    Drop texts whose estimated Jaccard similarity to an earlier text
+    (or to any of `existing`) reaches `threshold`. Order is preserved.
+    :param texts: Candidate texts.
+    :param threshold: Similarity at which two texts count as duplicates.
+    :param existing: Already-accepted texts the candidates must also differ from.
+    :return: The first occurrence of every near-duplicate cluster.
+    """
+    hasher = MinHasher(num_perm=num_perm)
+    index = MinHashLSH(num_perm=num_perm, bands=bands)
+    for i, text in enumerate(existing):
+        index.insert(("existing", i), hasher.text_signature(text))
+
+    kept: List[str] = []
+    for text in texts:
+        if not text or not text.strip():
+            continue
+        signature = hasher.text_signature(text)
+        match, _ = index.best_match(signature, threshold)
+        if match is not None:
+            continue
+        index.insert(("kept", len(kept)), signature)
+        kept.append(text)
+    return kept
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# ASCII words plus single CJK characters, so Chinese descriptions still match
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[一-鿿]")
+_STOPWORDS = {
+    "the", "a", "an", "and", "or", "of", "to", "in", "for", "on", "with", "by",
+    "is", "are", "be", "that", "this", "it", "as", "from", "at", "your", "you",
+    "prompt", "template",
+}
+# Name and category are short but precise, so they are repeated to weigh more
+FIELD_WEIGHTS = {"name": 3, "category": 2, "description": 1}
+INDEX_CACHE_SIZE = 32
+# Score added per unit of prior (e.g. similarity of past work that used a template)
+PRIOR_WEIGHT = 0.3
+
+_INDEX_CACHE: "OrderedDict[str, TfidfTemplateIndex]" = OrderedDict()
+_INDEX_CACHE_LOCK = threading.Lock()
+
+
+def tokenize(text: str) -> List[str]:
+    return [
+        t for t in _TOKEN_PATTERN.findall((text or "").lower()) if t not in _STOPWORDS
+    ]
+
+
+def _template_document(template: dict) -> List[str]:
+    tokens: List[str] = []
+    for field, weight in FIELD_WEIGHTS.items():
+        value = template.get(field) or ""
+        if field == "name":
+            value = f"{value} {(template.get('template_key') or '').replace('_', ' ')}"
+        tokens.extend(tokenize(str(value)) * weight)
+    return tokens
+
+
+def templates_fingerprint(templates: Sequence[dict]) -> str:
+    """
+    Hash of the indexed fields; changes whenever a template is added,
+    removed or edited, which invalidates the cached index.
+    """
+    payload = sorted(
+        (
+            str(t.get("template_key") or ""),
+            str(t.get("name") or ""),
+            str(t.get("description") or ""),
+            str(t.get("category") or ""),
+        )
+        for t in templates
+    )
+    return hashlib.sha1(
+        json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+class TfidfTemplateIndex:
+    """
+    TF-IDF index over template name, description and category.
+    """
+
+    def __init__(self, templates: Sequence[dict]):
+        self.keys: List[str] = []
+        documents: List[Counter] = []
+        for template in templates:
+            key = template.get("template_key")
+            if not key:
+                continue
+            self.keys.append(key)
+            documents.append(Counter(_template_document(template)))
+
+        n_docs = len(documents)
+        df: Counter = Counter()
+        for doc in documents:
+            df.update(doc.keys())
+        self.idf = {
+            term: math.log((1 + n_docs) / (1 + count)) + 1.0 for term, count in df.items()
+        }
+        self.vectors = [self._weigh(doc) for doc in documents]
+
+    def _weigh(self, counts: Counter) -> Dict[str, float]:
+        vector = {
+            term: (1.0 + math.log(tf)) * self.idf[term]
+            for term, tf in counts.items()
+            if term in self.idf
+        }
+        norm = math.sqrt(sum(v * v for v in vector.values()))
+        if norm == 0:
+            return {}
+        return {term: v / norm for term, v in vector.items()}
+
+    def rank(self, query: str) -> List[Tuple[str, float]]:
+        """
+        :param query: Free text to match templates against.
+        :return: (template_key, cosine score) pairs, best first.
+        """
+        query_vector = self._weigh(Counter(tokenize(query)))
+        scores = []
+        for key, vector in zip(self.keys, self.vectors):
+            if len(vector) < len(query_vector):
+                score = sum(w * query_vector.get(t, 0.0) for t, w in vector.items())
+            else:
+                score = sum(w * vector.get(t, 0.0) for t, w in query_vector.items())
+            scores.append((key, score))
+        scores.sort(key=lambda item: item[1], reverse=True)
+        return scores
+
+
+def get_template_index(templates: Sequence[dict]) -> TfidfTemplateIndex:
+    """
+    Return the cached index for this exact template set, building it on first use.
+    """
+    fingerprint = templates_fingerprint(templates)
+    with _INDEX_CACHE_LOCK:
+        index = _INDEX_CACHE.get(fingerprint)
+        if index is not None:
+            _INDEX_CACHE.move_to_end(fingerprint)
+            return index
+
+    index = TfidfTemplateIndex(templates)
+    with _INDEX_CACHE_LOCK:
+        _INDEX_CACHE[fingerprint] = index
+        while len(_INDEX_CACHE) > INDEX_CACHE_SIZE:
+            _INDEX_CACHE.popitem(last=False)
+    return index
+
+
+def analysis_text(analysis_results: Any) -> str:
+    """
+    Flatten analysis results (list of agent dicts, dict or plain text) into text.
+    """
+    if not analysis_results:
+        return ""
+    if isinstance(analysis_results, str):
+        return analysis_results
+    if isinstance(analysis_results, dict):
+        return "\n".join(analysis_text(v) for v in analysis_results.values())
+    if isinstance(analysis_results, (list, tuple)):
+        parts = []
+        for item in analysis_results:
+            if isinstance(item, dict) and "content" in item:
+                parts.append(str(item.get("content") or ""))
+            else:
+                parts.append(analysis_text(item))
+        return "\n".join(parts)
+    return str(analysis_results)
+
+
+def rank_templates(
+    templates: Sequence[dict],
+    *,
+    original_prompt: str,
+    analysis_results: Any = None,
+    feedback: Optional[str] = None,
+    prior: Optional[Dict[str, float]] = None,
+) -> List[Tuple[str, float]]:
+    """
+    Rank candidate templates against the prompt, its analysis and any feedback.
+    The prompt and feedback are repeated so they outweigh long analysis text.
+    :param prior: template_key -> 0..1 evidence from elsewhere, added with PRIOR_WEIGHT.
+    """
+    query = "\n".join(
+        [original_prompt or ""] * 2
+        + [feedback or ""] * 2
+        + [analysis_text(analysis_results)]
+    )
+    ranking = get_template_index(templates).rank(query)
+    if not prior:
+        return ranking
+    ranking = [(key, score + PRIOR_WEIGHT * prior.get(key, 0.0)) for key, score in ranking]
+    ranking.sort(key=lambda item: item[1], reverse=True)
+    return ranking
@@ -0,0 +1,190 @@
+import json
+import math
+import re
+from typing import Any, Dict, List, Optional
+
+_CJK_PATTERN = re.compile(r"[一-鿿　-〿＀-￯]")
+_WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?。！？；;])\s+")
+_STRUCTURAL_LINE = re.compile(r"^\s*(#{1,6}\s|[-*•]\s|\d+[.)]\s|\*\*[^*]+\*\*)")
+
+DEFAULT_ANALYSIS_TOKEN_BUDGET = 6000
+# Token budget for analysis results embedded in a single request, by model-name prefix.
+# The longest matching prefix wins; a per-user setting overrides the table.
+ANALYSIS_TOKEN_BUDGETS: Dict[str, int] = {
+    "gpt-3.5": 4000,
+    "gpt-4": 3000,
+    "gpt-4-turbo": 12000,
+    "gpt-4o": 12000,
+    "gpt-4.1": 16000,
+    "gpt-5": 16000,
+    "o1": 12000,
+    "o3": 12000,
+    "claude": 16000,
+    "gemini": 16000,
+    "deepseek": 8000,
+    "qwen": 8000,
+    "glm": 8000,
+    "moonshot": 8000,
+}
+MIN_ITEM_TOKENS = 80
+# Lines shorter than this are never treated as quotes or cross-item duplicates
+MIN_DEDUPE_CHARS = 30
+QUOTED_PROMPT_MARKER = "(quoted from the original prompt)"
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Local token estimate: one token per CJK character, ~4 characters per token otherwise.
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    rest = len(text) - cjk
+    return cjk + math.ceil(rest / 4)
+
+
+def analysis_budget_for_model(model_name: str, override: Optional[int] = None) -> int:
+    if override:
+        return int(override)
+    name = (model_name or "").lower().rsplit("/", 1)[-1]
+    best = None
+    for prefix in ANALYSIS_TOKEN_BUDGETS:
+        if name.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return ANALYSIS_TOKEN_BUDGETS[best] if best else DEFAULT_ANALYSIS_TOKEN_BUDGET
+
+
+def analysis_budget_for(ai_services: Any) -> int:
+    """
+    Analysis token budget for the model currently configured on an AIServices instance.
+    """
+    config = getattr(ai_services, "current_config", None) or {}
+    return analysis_budget_for_model(
+        config.get("model_name", ""), config.get("analysis_token_budget")
+    )
+
+
+def _normalize(text: str) -> str:
+    return " ".join(_WORD_PATTERN.findall(text.lower()))
+
+
+def _analysis_items(analysis_results: Any) -> List[Dict[str, str]]:
+    if isinstance(analysis_results, str):
+        try:
+            analysis_results = json.loads(analysis_results)
+        except Exception:
+            return [{"method": "analysis", "content": analysis_results}]
+    if isinstance(analysis_results, dict):
+        if "content" in analysis_results:
+            analysis_results = [analysis_results]
+        else:
+            analysis_results = [
+                {"agent_name": key, "content": value}
+                for key, value in analysis_results.items()
+            ]
+
+    items = []
+    for item in analysis_results or []:
+        if isinstance(item, dict):
+            method = item.get("agent_name") or item.get("agent_key") or "analysis"
+            content = item.get("content")
+        else:
+            method, content = "analysis", item
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False)
+        items.append({"method": str(method), "content": content.strip()})
+    return items
+
+
+def _drop_quoted_lines(items: List[Dict[str, str]], original_prompt: str) -> None:
+    """
+    Remove lines that restate the original prompt or repeat an earlier item.
+    """
+    normalized_prompt = _normalize(original_prompt or "")
+    seen = set()
+    for item in items:
+        kept: List[str] = []
+        for line in item["content"].splitlines():
+            normalized = _normalize(line)
+            if len(normalized) >= MIN_DEDUPE_CHARS:
+                if normalized in normalized_prompt:
+                    if not kept or kept[-1] != QUOTED_PROMPT_MARKER:
+                        kept.append(QUOTED_PROMPT_MARKER)
+                    continue
+                if normalized in seen:
+                    continue
+                seen.add(normalized)
+            if line.strip() or (kept and kept[-1].strip()):
+                kept.append(line.rstrip())
+        item["content"] = "\n".join(kept).strip()
+
+
+def _extract(content: str, max_tokens: int, prompt_terms: set) -> str:
+    """
+    Keep the highest-scoring lines/sentences within `max_tokens`, in original order.
+    Headings and list items, lines sharing terms with the prompt and early
+    lines score higher.
+    """
+    units: List[str] = []
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        if estimate_tokens(line) > 60 and not _STRUCTURAL_LINE.match(line):
+            units.extend(s for s in _SENTENCE_SPLIT.split(line.strip()) if s)
+        else:
+            units.append(line.rstrip())
+
+    scored = []
+    seen = set()
+    for position, unit in enumerate(units):
+        normalized = _normalize(unit)
+        if normalized in seen:
+            continue
+        seen.add(normalized)
+        terms = set(_WORD_PATTERN.findall(unit.lower()))
+        overlap = len(terms & prompt_terms) / (len(terms) or 1)
+        score = overlap + 1.0 / (1.0 + 0.1 * position)
+        if _STRUCTURAL_LINE.match(unit):
+            score += 1.0
+        scored.append((score, position, unit))
+
+    chosen = set()
+    used = 0
+    for _, position, unit in sorted(scored, key=lambda s: s[0], reverse=True):
+        cost = estimate_tokens(unit) + 1
+        if used + cost > max_tokens:
+            continue
+        chosen.add(position)
+        used += cost
+    return "\n".join(unit for _, position, unit in scored if position in chosen)
+
+
+def compact_analysis(
+    analysis_results: Any,
+    *,
+    original_prompt: str = "",
+    max_tokens: int = DEFAULT_ANALYSIS_TOKEN_BUDGET,
+) -> str:
+    """
+    Render analysis results as compact JSON that fits within `max_tokens`.
+    :param analysis_results: Agent results (list of dicts, dict, or JSON/plain text).
+    :param original_prompt: The analyzed prompt, used to drop verbatim quotes of it.
+    :param max_tokens: Token budget for the rendered analysis.
+    :return: JSON list of {"method", "content"} objects.
+    """
+    items = [item for item in _analysis_items(analysis_results) if item["content"]]
+    _drop_quoted_lines(items, original_prompt)
+
+    total = sum(estimate_tokens(item["content"]) for item in items)
+    if total > max_tokens and items:
+        prompt_terms = set(_WORD_PATTERN.findall((original_prompt or "").lower()))
+        # Per-item overhead of the JSON wrapper and method name
+        available = max(max_tokens - 12 * len(items), MIN_ITEM_TOKENS)
+        for item in items:
+            share = estimate_tokens(item["content"]) / total
+            allowance = max(int(available * share), MIN_ITEM_TOKENS)
+            if estimate_tokens(item["content"]) > allowance:
+                item["content"] = _extract(item["content"], allowance, prompt_terms)
+
+    return json.dumps(items, ensure_ascii=False, separators=(",", ":"))
@@ -0,0 +1,104 @@
+import math
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+# Elo scale used to report Bradley-Terry strengths
+ELO_BASE = 1500
+ELO_SCALE = 400
+BT_MAX_ITERATIONS = 200
+BT_TOLERANCE = 1e-6
+# Virtual ties against an average opponent; keeps unbeaten players finite
+BT_PRIOR_GAMES = 1.0
+
+
+def swiss_rounds(player_count: int) -> int:
+    """
+    Rounds needed for a stable Swiss ranking: ceil(log2 n) + 1.
+    """
+    if player_count < 2:
+        return 0
+    return math.ceil(math.log2(player_count)) + 1
+
+
+def swiss_pairings(
+    standings: List[Hashable],
+    played: Set[frozenset],
+    byes: Optional[Set[Hashable]] = None,
+) -> Tuple[List[Tuple[Hashable, Hashable]], Optional[Hashable]]:
+    """
+    Pair players for the next Swiss round.
+    :param standings: Players ordered best first.
+    :param played: frozensets of pairs that already met.
+    :param byes: Players that already had a bye.
+    :return: (pairs, player with a bye or None)
+    """
+    remaining = list(standings)
+    bye = None
+    if len(remaining) % 2:
+        byes = byes or set()
+        # Lowest-ranked player without a bye sits out
+        for player in reversed(remaining):
+            if player not in byes:
+                bye = player
+                break
+        bye = bye if bye is not None else remaining[-1]
+        remaining.remove(bye)
+
+    pairs: List[Tuple[Hashable, Hashable]] = []
+    while remaining:
+        first = remaining.pop(0)
+        # Closest-ranked opponent not met yet; a rematch only if unavoidable
+        index = next(
+            (i for i, p in enumerate(remaining) if frozenset((first, p)) not in played),
+            0,
+        )
+        pairs.append((first, remaining.pop(index)))
+    return pairs, bye
+
+
+def bradley_terry(
+    outcomes: Iterable[Tuple[Hashable, Hashable, float]],
+    players: Iterable[Hashable],
+) -> Dict[Hashable, float]:
+    """
+    Fit Bradley-Terry strengths with the MM algorithm.
+    :param outcomes: (a, b, score of a) per game; 1 win, 0.5 tie, 0 loss.
+    :param players: Every player, including ones without games.
+    :return: Strengths normalized to a geometric mean of 1.
+    """
+    players = list(players)
+    wins: Dict[Hashable, float] = defaultdict(float)
+    games: Dict[Tuple[Hashable, Hashable], float] = defaultdict(float)
+    for a, b, score in outcomes:
+        wins[a] += score
+        wins[b] += 1 - score
+        games[(a, b)] += 1
+        games[(b, a)] += 1
+
+    opponents: Dict[Hashable, List[Tuple[Hashable, float]]] = defaultdict(list)
+    for (a, b), count in games.items():
+        opponents[a].append((b, count))
+
+    strength = {p: 1.0 for p in players}
+    for _ in range(BT_MAX_ITERATIONS):
+        updated = {}
+        for p in players:
+            # Prior: BT_PRIOR_GAMES ties against an opponent of strength 1
+            numerator = wins[p] + BT_PRIOR_GAMES / 2
+            denominator = BT_PRIOR_GAMES / (strength[p] + 1.0) + sum(
+                count / (strength[p] + strength[q]) for q, count in opponents[p]
+            )
+            updated[p] = numerator / denominator
+        log_mean = sum(math.log(v) for v in updated.values()) / len(updated)
+        updated = {p: v / math.exp(log_mean) for p, v in updated.items()}
+        converged = max(abs(updated[p] - strength[p]) for p in players) < BT_TOLERANCE
+        strength = updated
+        if converged:
+            break
+    return strength
+
+
+def elo_ratings(strengths: Dict[Hashable, float]) -> Dict[Hashable, float]:
+    return {
+        p: round(ELO_BASE + ELO_SCALE * math.log10(s), 1) for p, s in strengths.items()
+    }
@@ -0,0 +1,187 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process deployments only
+    fcntl = None
+
+INITIAL_CAPACITY = 1024
+_STATE_FILE = "state.json"
+_VECTORS_FILE = "vectors.f32"
+_KEYS_FILE = "keys.i64"
+_OWNERS_FILE = "owners.i64"
+
+
+class MemmapVectorStore:
+    """
+    Append-only matrix of L2-normalised float32 rows in memory-mapped files,
+    with an integer key and owner per row. Several processes may share the
+    directory: appends take a file lock, and readers remap when the row count
+    in state.json changes.
+    """
+
+    def __init__(self, directory: str, dim: int):
+        self.directory = directory
+        self.dim = dim
+        self._lock = threading.RLock()
+        self._state_mtime: Optional[float] = None
+        self._state = {"dim": dim, "count": 0, "capacity": 0, "cursor": 0}
+        self._vectors: Optional[np.memmap] = None
+        self._keys: Optional[np.memmap] = None
+        self._owners: Optional[np.memmap] = None
+        self._key_set: set = set()
+        os.makedirs(directory, exist_ok=True)
+        self.refresh()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self._path("index.lock"), "a+") as handle:
+            if fcntl:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _map(self, name: str, dtype, shape: Tuple[int, ...]) -> np.memmap:
+        path = self._path(name)
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(path, "ab") as handle:
+            if handle.tell() < size:
+                handle.truncate(size)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _load_state(self) -> dict:
+        try:
+            with open(self._path(_STATE_FILE), "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {"dim": self.dim, "count": 0, "capacity": 0, "cursor": 0}
+        if state.get("dim") != self.dim:
+            # Vectorizer changed: start over, the caller re-indexes from cursor 0
+            return {"dim": self.dim, "count": 0, "capacity": 0, "cursor": 0}
+        return state
+
+    def _write_state(self) -> None:
+        path = self._path(_STATE_FILE)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._state, f)
+        os.replace(tmp, path)
+        self._state_mtime = os.path.getmtime(path)
+
+    def refresh(self) -> None:
+        """
+        Remap if another process appended rows since the last look.
+        """
+        try:
+            mtime = os.path.getmtime(self._path(_STATE_FILE))
+        except OSError:
+            mtime = None
+        with self._lock:
+            if mtime is not None and mtime == self._state_mtime:
+                return
+            self._state_mtime = mtime
+            self._state = self._load_state()
+            self._remap(self._state["capacity"])
+            count = self._state["count"]
+            self._key_set = set(self._keys[:count].tolist()) if count else set()
+
+    def _remap(self, capacity: int) -> None:
+        self._vectors = self._keys = self._owners = None
+        if capacity:
+            self._vectors = self._map(_VECTORS_FILE, np.float32, (capacity, self.dim))
+            self._keys = self._map(_KEYS_FILE, np.int64, (capacity,))
+            self._owners = self._map(_OWNERS_FILE, np.int64, (capacity,))
+
+    @property
+    def cursor(self) -> int:
+        """Caller-defined high-water mark saved with the rows (e.g. last row id)."""
+        return int(self._state.get("cursor", 0))
+
+    def __len__(self) -> int:
+        return int(self._state["count"])
+
+    def append(
+        self,
+        keys: Sequence[int],
+        owners: Sequence[int],
+        vectors: np.ndarray,
+        cursor: Optional[int] = None,
+    ) -> int:
+        """
+        :param vectors: (n, dim) L2-normalised rows; rows whose key is already stored are skipped.
+        :param cursor: New high-water mark to store with the rows.
+        :return: Number of rows added.
+        """
+        with self._file_lock():
+            self._state_mtime = None
+            self.refresh()
+            with self._lock:
+                fresh = [i for i, key in enumerate(keys) if int(key) not in self._key_set]
+                count = self._state["count"]
+                needed = count + len(fresh)
+                capacity = self._state["capacity"]
+                if needed > capacity:
+                    capacity = max(capacity, INITIAL_CAPACITY)
+                    while capacity < needed:
+                        capacity *= 2
+                    self._remap(capacity)
+                    self._state["capacity"] = capacity
+                if fresh:
+                    rows = slice(count, needed)
+                    self._vectors[rows] = np.asarray(vectors, dtype=np.float32)[fresh]
+                    self._keys[rows] = np.asarray(keys, dtype=np.int64)[fresh]
+                    self._owners[rows] = np.asarray(owners, dtype=np.int64)[fresh]
+                    for memmap in (self._vectors, self._keys, self._owners):
+                        memmap.flush()
+                    self._key_set.update(int(keys[i]) for i in fresh)
+                # The count is published last, so readers never see unwritten rows
+                self._state["count"] = needed
+                if cursor is not None:
+                    self._state["cursor"] = max(self.cursor, int(cursor))
+                self._write_state()
+                return len(fresh)
+
+    def search(
+        self,
+        vector: np.ndarray,
+        *,
+        owner: Optional[int] = None,
+        k: int = 10,
+        exclude_keys: Iterable[int] = (),
+    ) -> List[Tuple[int, float]]:
+        """
+        Cosine similarity of `vector` against every row, optionally only the
+        rows of one owner.
+        :return: [(key, score)] best first, at most `k`.
+        """
+        with self._lock:
+            count = self._state["count"]
+            if not count or k <= 0:
+                return []
+            scores = self._vectors[:count] @ np.asarray(vector, dtype=np.float32)
+            keys = np.asarray(self._keys[:count])
+            mask = np.ones(count, dtype=bool)
+            if owner is not None:
+                mask &= np.asarray(self._owners[:count]) == owner
+            excluded = list(exclude_keys)
+            if excluded:
+                mask &= ~np.isin(keys, excluded)
+        scores = np.where(mask, scores, -np.inf)
+        k = min(k, int(mask.sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(keys[i]), float(scores[i])) for i in top]
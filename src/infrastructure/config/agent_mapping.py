@@ -227,6 +227,42 @@ CATEGORY_AGENTS = {
 }
 
 
+# 模型分级：strong 为用户配置的主模型，fast 为可选的快速廉价模型
+MODEL_TIERS = {
+    "strong": {"max_tokens": None},
+    "fast": {"max_tokens": 1024},
+}
+DEFAULT_MODEL_TIER = "strong"
+
+# Agent 路由表：未列出的 Agent 使用 strong 且不限制 max_tokens
+AGENT_MODEL_ROUTING = {
+    "thinking_structure": {"tier": "fast", "max_tokens": 800},
+    "optimization_thinking": {"tier": "fast", "max_tokens": 800},
+    "requirements_checklist": {"tier": "fast", "max_tokens": 1500},
+    "select_analysis_methods": {"tier": "fast", "max_tokens": 100},
+    "feedback_relevance": {"tier": "fast", "max_tokens": 100},
+    "template_selector": {"tier": "fast", "max_tokens": 200},
+    "validation_prompt_suggestions": {"tier": "fast", "max_tokens": 600},
+    "validation_prompt_suggestions_batch": {"tier": "fast", "max_tokens": 2000},
+    "output_repair": {"tier": "fast", "max_tokens": 1500},
+    "pairwise_judge": {"tier": "strong", "max_tokens": 200},
+    "chat_history_summary": {"tier": "fast", "max_tokens": 500},
+}
+
+
+def get_agent_route(agent_key: str) -> dict:
+    """
+    Resolve the model tier and max_tokens budget for an agent.
+    :return: {"tier": ..., "max_tokens": ...}; max_tokens may be None (no cap).
+    """
+    route = AGENT_MODEL_ROUTING.get(agent_key, {})
+    tier = route.get("tier", DEFAULT_MODEL_TIER)
+    if tier not in MODEL_TIERS:
+        tier = DEFAULT_MODEL_TIER
+    max_tokens = route.get("max_tokens", MODEL_TIERS[tier]["max_tokens"])
+    return {"tier": tier, "max_tokens": max_tokens}
+
+
 def get_agent_info(agent_key: str) -> dict:
     return AGENT_MAPPING.get(agent_key, {})
 
@@ -1,5 +1,7 @@
 import json
-from typing import Any, Dict
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 import requests
 import urllib3
 from src.api.database_api import DatabaseManager
@@ -18,10 +20,39 @@ DEFAULT_USER_AGENT = (
 )
 
 
+# models_config keys backing each model tier (see agent_mapping.MODEL_TIERS)
+FAST_MODEL_KEY = "fast_model"
+TIER_MODEL_KEYS = {"strong": "database_model", "fast": FAST_MODEL_KEY}
+
+# Structured-output modes in order of preference. Support is probed lazily on
+# the first schema-constrained call and remembered per (base_url, model_name).
+STRUCTURED_OUTPUT_MODES = ("json_schema", "json_object", "none")
+# Status codes endpoints use to reject an unsupported request parameter
+UNSUPPORTED_PARAMETER_STATUS_CODES = (400, 404, 415, 422)
+# An error only counts as a response_format rejection when its body names it;
+# context-length or bad-input errors must not downgrade the endpoint
+RESPONSE_FORMAT_ERROR_PATTERN = re.compile(
+    r"response_format|json_schema|json_object|structured output", re.IGNORECASE
+)
+# Likewise for `n`: the body must name the parameter, e.g. "'n' is not
+# supported", "n must be 1" or "only n=1"
+MULTI_CHOICE_ERROR_PATTERN = re.compile(
+    r"""['"`]n['"`]|\bn\s*(?:=|>|must\b|is\b|should\b|parameter\b)|\bparameter:?\s+n\b"""
+    r"|multiple choices|number of (?:choices|completions)",
+    re.IGNORECASE,
+)
+_structured_output_support: Dict[Tuple[str, str], str] = {}
+# Whether an endpoint honours `n` (several choices per request), found on first use
+_multi_choice_support: Dict[Tuple[str, str], bool] = {}
+MAX_FANOUT_WORKERS = 8
+
+
 class AIServiceError(Exception):
     """Custom exception class for AI service errors"""
 
-    pass
+    def __init__(self, message: str = "", status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
 
 
 class AIServices:
@@ -56,7 +87,9 @@ class AIServices:
                 "SELECT setting_key, setting_value FROM user_settings "
                 "WHERE user_id = %s "
                 "AND setting_key IN "
-                "('modelApiUrl', 'modelApiKey', 'modelName')"
+                "('modelApiUrl', 'modelApiKey', 'modelName', "
+                "'analysisTokenBudget', 'fastModelName', 'fastModelApiUrl', "
+                "'fastModelApiKey')"
             )
             settings_rows = self.db.execute_query(query, (self.user_id,))
 
@@ -84,6 +117,33 @@ class AIServices:
                         "response_path": "choices[0].message.content",
                     }
                 }
+                # Optional override of the per-model analysis token budget; a
+                # bad value is ignored rather than discarding the whole config
+                if settings.get("analysisTokenBudget"):
+                    try:
+                        db_config["database_model"]["analysis_token_budget"] = int(
+                            settings["analysisTokenBudget"]
+                        )
+                    except (TypeError, ValueError):
+                        print(
+                            "Warning: Ignoring invalid analysisTokenBudget "
+                            f"{settings['analysisTokenBudget']!r}"
+                        )
+                # Optional fast tier for auxiliary agents; reuses the main
+                # endpoint and key unless its own are configured
+                if settings.get("fastModelName"):
+                    fast_url = (
+                        settings.get("fastModelApiUrl") or settings["modelApiUrl"]
+                    ).rstrip("/")
+                    if not fast_url.endswith("/v1"):
+                        fast_url += "/v1"
+                    db_config[FAST_MODEL_KEY] = {
+                        **db_config["database_model"],
+                        "api_key": settings.get("fastModelApiKey")
+                        or settings["modelApiKey"],
+                        "base_url": fast_url,
+                        "model_name": settings["fastModelName"],
+                    }
                 return db_config
 
         except Exception as e:
@@ -136,10 +196,42 @@ class AIServices:
         self.current_model = model_name
         self.current_config = config
 
+    def register_model(self, model_key: str, **overrides) -> str:
+        """
+        Register a model that reuses the current endpoint and key unless
+        overridden, e.g. `register_model("replay_target", model_name="...")`.
+        :return: The model key, usable as `model_key` in call().
+        """
+        self.models_config[model_key] = {
+            **self.current_config,
+            **{k: v for k, v in overrides.items() if v},
+        }
+        return model_key
+
+    def model_for_tier(self, tier: str) -> str:
+        """
+        Model key serving a tier; falls back to the current model when
+        the tier has no model configured.
+        """
+        model_key = TIER_MODEL_KEYS.get(tier)
+        if model_key and model_key in self.models_config:
+            return model_key
+        return self.current_model
+
+    def has_tier_model(self, tier: str) -> bool:
+        """
+        Whether the tier is served by its own configured model rather than
+        falling back to the current one.
+        """
+        return TIER_MODEL_KEYS.get(tier) in self.models_config
+
     def call(
         self,
         messages: list,
         temperature: float = 0.3,
+        model_key: Optional[str] = None,
+        response_schema: Optional[Dict] = None,
+        schema_name: str = "response",
         **kwargs,
     ) -> str:
         """
@@ -147,6 +239,9 @@ class AIServices:
         :param messages: Message list in format
             [{"role": "user", "content": "..."}]
         :param temperature: Generation temperature parameter
+        :param model_key: Configured model to use instead of the current one
+        :param response_schema: JSON schema to constrain the output to, where supported
+        :param schema_name: Name sent with the schema
         :return: Text content from API response
         """
         if not self.current_model:
@@ -154,12 +249,39 @@ class AIServices:
                 "No model selected, please set model using set_model() first"
             )
 
+        if response_schema is not None and "response_format" not in kwargs:
+            return self._call_structured(
+                messages,
+                temperature,
+                model_key=model_key,
+                response_schema=response_schema,
+                schema_name=schema_name,
+                **kwargs,
+            )
+
+        response_data, config = self._send(messages, temperature, model_key, **kwargs)
+        return self._parse_response(response_data, config)
+
+    def _send(
+        self,
+        messages: list,
+        temperature: float,
+        model_key: Optional[str] = None,
+        **kwargs,
+    ) -> Tuple[Dict, Dict]:
+        """
+        Post a chat completion request, retrying SSL and connection failures.
+        :return: (response JSON, config of the model that served it)
+        """
+        model_key = model_key if model_key in self.models_config else self.current_model
+        config = self.models_config.get(model_key, self.current_config)
+
         try:
             # Construct request parameters
-            base_url = self.current_config["base_url"]
-            endpoint = self.current_config["endpoint"]
+            base_url = config["base_url"]
+            endpoint = config["endpoint"]
             url = f"{base_url}{endpoint}"
-            api_key = self.current_config["api_key"].strip()
+            api_key = config["api_key"].strip()
             headers = {
                 "Authorization": f"Bearer {api_key}",
                 "Content-Type": "application/json",
@@ -167,7 +289,7 @@ class AIServices:
             }
 
             payload = {
-                "model": self.current_config["model_name"],
+                "model": config["model_name"],
                 "messages": messages,
                 "temperature": temperature,
                 **kwargs,
@@ -178,7 +300,7 @@ class AIServices:
             for attempt in range(max_retries):
                 print(
                     f"[AI_SERVICES_QUERY] Attempt {attempt + 1} to call model "
-                    f"\n{self.current_model}, the messages: {messages}"
+                    f"\n{model_key}, the messages: {messages}"
                 )
                 try:
                     # Add SSL verification settings and timeout
@@ -194,8 +316,7 @@ class AIServices:
                         f"\n[AI_SERVICES_RESPONSE] Response: {response.json()['choices'][0]['message']['content']}"
                     )
 
-                    # Parse response
-                    return self._parse_response(response.json())
+                    return response.json(), config
 
                 except requests.exceptions.SSLError as ssl_e:
                     if attempt < max_retries - 1:
@@ -210,7 +331,7 @@ class AIServices:
                                 verify=False,
                             )
                             response.raise_for_status()
-                            return self._parse_response(response.json())
+                            return response.json(), config
                         except Exception as fallback_e:
                             detail = (
                                 "SSL connection failed after "
@@ -238,13 +359,149 @@ class AIServices:
 
         except requests.exceptions.HTTPError as e:
             error_msg = f"{e.response.status_code} Error: {e.response.text}"
-            raise AIServiceError(f"API request failed: {error_msg}")
+            raise AIServiceError(
+                f"API request failed: {error_msg}",
+                status_code=e.response.status_code,
+            )
         except requests.exceptions.RequestException as e:
             raise AIServiceError(f"Network error: {str(e)}")
 
-    def _parse_response(self, response_data: Dict) -> str:
+    def _call_structured(
+        self,
+        messages: list,
+        temperature: float,
+        *,
+        model_key: Optional[str],
+        response_schema: Dict,
+        schema_name: str,
+        **kwargs,
+    ) -> str:
+        """
+        Call with the strongest structured-output mode the endpoint accepts,
+        stepping down json_schema -> json_object -> plain when it rejects one.
+        """
+        model_key = model_key if model_key in self.models_config else self.current_model
+        config = self.models_config.get(model_key, self.current_config)
+        endpoint = (config.get("base_url", ""), config.get("model_name", ""))
+
+        known_mode = _structured_output_support.get(endpoint)
+        modes = (
+            STRUCTURED_OUTPUT_MODES[STRUCTURED_OUTPUT_MODES.index(known_mode) :]
+            if known_mode
+            else STRUCTURED_OUTPUT_MODES
+        )
+        for mode in modes:
+            request_kwargs = dict(kwargs)
+            if mode == "json_schema":
+                request_kwargs["response_format"] = {
+                    "type": "json_schema",
+                    "json_schema": {
+                        "name": schema_name,
+                        "schema": response_schema,
+                        "strict": False,
+                    },
+                }
+            elif mode == "json_object":
+                request_kwargs["response_format"] = {"type": "json_object"}
+
+            try:
+                result = self.call(
+                    messages, temperature, model_key=model_key, **request_kwargs
+                )
+            except AIServiceError as e:
+                if (
+                    mode != "none"
+                    and e.status_code in UNSUPPORTED_PARAMETER_STATUS_CODES
+                    and RESPONSE_FORMAT_ERROR_PATTERN.search(str(e))
+                ):
+                    print(
+                        f"Warning: {endpoint[1]} rejected response_format "
+                        f"'{mode}', falling back."
+                    )
+                    continue
+                raise
+            _structured_output_support[endpoint] = mode
+            return result
+
+    def call_n(
+        self,
+        messages: list,
+        n: int,
+        temperature: float = 0.7,
+        model_key: Optional[str] = None,
+        **kwargs,
+    ) -> List[str]:
+        """
+        Sample n completions, in one request via `n` where the endpoint supports
+        it and otherwise (or for any shortfall) through concurrent single calls.
+        :param messages: Message list
+        :param n: Number of completions wanted
+        :param temperature: Generation temperature parameter
+        :param model_key: Configured model to use instead of the current one
+        :return: Up to n texts; fewer only if some fallback calls failed
+        """
+        if n <= 1:
+            return [self.call(messages, temperature, model_key=model_key, **kwargs)]
+
+        config = self.models_config.get(
+            model_key if model_key in self.models_config else self.current_model,
+            self.current_config,
+        )
+        endpoint = (config.get("base_url", ""), config.get("model_name", ""))
+
+        texts: List[str] = []
+        if _multi_choice_support.get(endpoint, True):
+            try:
+                response_data, config = self._send(
+                    messages, temperature, model_key, n=n, **kwargs
+                )
+                for index in range(len(response_data.get("choices") or [])):
+                    try:
+                        texts.append(self._parse_response(response_data, config, index))
+                    except AIServiceError:
+                        continue
+                _multi_choice_support[endpoint] = len(texts) > 1
+            except AIServiceError as e:
+                if (
+                    e.status_code not in UNSUPPORTED_PARAMETER_STATUS_CODES
+                    or not MULTI_CHOICE_ERROR_PATTERN.search(str(e))
+                ):
+                    raise
+                _multi_choice_support[endpoint] = False
+
+        missing = n - len(texts)
+        if missing > 0:
+            with ThreadPoolExecutor(max_workers=min(missing, MAX_FANOUT_WORKERS)) as executor:
+                futures = [
+                    executor.submit(
+                        self.call, messages, temperature, model_key=model_key, **kwargs
+                    )
+                    for _ in range(missing)
+                ]
+                errors = []
+                for future in futures:
+                    try:
+                        texts.append(future.result())
+                    except Exception as e:
+                        errors.append(e)
+            if not texts and errors:
+                raise errors[0]
+        return texts[:n]
+
+    def structured_output_mode(self, model_key: Optional[str] = None) -> Optional[str]:
+        """Structured-output mode found for a model, or None if not probed yet"""
+        config = self.models_config.get(model_key or self.current_model, {})
+        return _structured_output_support.get(
+            (config.get("base_url", ""), config.get("model_name", ""))
+        )
+
+    def _parse_response(
+        self, response_data: Dict, config: Optional[Dict] = None, choice_index: int = 0
+    ) -> str:
         """Parse result based configured response path"""
-        path = self.current_config["response_path"]
+        path = (config or self.current_config)["response_path"]
+        if choice_index:
+            path = path.replace("[0]", f"[{choice_index}]", 1)
         keys = path.replace("[", ".[").split(".")
 
         current = response_data